@@ -1,7 +1,7 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
-from app.services.user_service import UserService
+from app.services.user_service import UserService, get_user_service as get_shared_user_service
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -10,8 +10,8 @@ logger = setup_logger(__name__)
 security = HTTPBearer()
 
 def get_user_service() -> UserService:
-    """Dependency to get UserService instance"""
-    return UserService()
+    """Dependency to get the shared UserService instance"""
+    return get_shared_user_service()
 
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -7,6 +7,9 @@ class Settings(BaseSettings):
     # OpenAI Configuration
     openai_api_key: str = ""
 
+    # LLM Configuration
+    llm_model: str = "gpt-4o-mini"
+
     # Langchain Configuration
     langchain_tracing_v2: str = "true"
     langchain_api_key: str = ""
@@ -15,14 +18,99 @@ class Settings(BaseSettings):
     # Vector Store Configuration
     chroma_persist_directory: str = "./chroma_db"
     chroma_collection_name: str = "document_collection"
+    vector_store_cache_size: int = 256  # open per-user collections kept in memory
+
+    # Hybrid Retrieval Configuration (BM25 keyword index in SQLite FTS5)
+    hybrid_search_enabled: bool = True
+    fts_db_name: str = "rag_fts.db"  # relative names live next to sqlite_db_name
+    hybrid_fetch_k: int = 10  # candidates per search before fusion
+    rrf_k: int = 60
+
+    # Embedding Provider Configuration ("openai", "local" or "hashing")
+    embedding_provider: str = "openai"
+    openai_embedding_model: str = "text-embedding-ada-002"
+    openai_embedding_check_ctx_length: bool = True  # splits long inputs with tiktoken; off for OpenAI-compatible servers
+    local_embedding_model_path: str = ""  # directory of a sentence-transformers model
+    local_embedding_batch_size: int = 32
+    local_embedding_workers: int = 1
+    hashing_embedding_dimensions: int = 384
+
+    # Embedding Cache Configuration
+    embedding_cache_enabled: bool = True
+    embedding_cache_db_name: str = "embedding_cache.db"
+    embedding_cache_max_entries: int = 200000
+    embedding_cache_touch_interval_seconds: float = 3600.0  # hits refresh LAST_USED_AT at most this often
+    embedding_cache_count_interval_seconds: float = 60.0
+
+    # Embedding Ingestion Configuration
+    embedding_batch_size: int = 64
+    embedding_concurrency: int = 4
+    embedding_max_retries: int = 5
+    embedding_backoff_base_seconds: float = 0.5
+    embedding_backoff_max_seconds: float = 20.0
 
     # Database Configuration
     sqlite_db_name: str = "rag_app.db"
+    sqlite_pool_size: int = 8
+    sqlite_pool_timeout_seconds: float = 30.0
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_statement_cache_size: int = 128
 
     # Document Processing Configuration
     chunk_size: int = 1000
     chunk_overlap: int = 200
     similarity_search_k: int = 3
+    document_parse_workers: int = -1  # -1: one per CPU core, 0: parse in a thread instead of a process pool
+    pdf_pages_per_parse_task: int = 20
+
+    # Upload Configuration
+    max_upload_size_bytes: int = 100 * 1024 * 1024  # 0 disables the limit
+    upload_chunk_size_bytes: int = 1024 * 1024
+    upload_multipart_overhead_bytes: int = 64 * 1024  # allowance for multipart framing on top of the file size
+
+    # Background Ingestion Configuration
+    upload_staging_directory: str = "./uploads"
+    ingestion_workers: int = 2
+    ingestion_queue_max_size: int = 100
+    ingestion_job_lease_seconds: int = 300  # a running job not updated for this long is requeued
+
+    # Chat History Configuration (token budgets per prompt)
+    rewrite_history_token_budget: int = 1000
+    answer_history_token_budget: int = 3000
+    history_max_turns: int = 50
+
+    # Conversation Log Write-Behind Configuration (opt-in)
+    conversation_log_write_behind: bool = False
+    conversation_log_flush_interval_ms: int = 200
+    conversation_log_flush_rows: int = 100  # flush early once this many turns are pending
+    conversation_log_max_pending: int = 10000  # log() waits for a flush at this depth; the oldest turns are dropped if writes keep failing
+
+    # Session Summary Configuration
+    session_summary_enabled: bool = True
+    session_summary_recent_turns: int = 6  # newest turns always sent verbatim
+    session_summary_batch_turns: int = 4  # older turns folded into the summary per update
+    session_summary_max_words: int = 250
+
+    # Reranking Configuration (opt-in: "term_overlap" or "cross_encoder")
+    reranker: str = "none"
+    reranker_model_path: str = ""  # local sentence-transformers cross-encoder directory
+    rerank_fetch_k: int = 20  # candidates retrieved for reranking
+    rerank_top_n: int = 3  # chunks kept for the prompt
+    rerank_batch_size: int = 32
+
+    # Question Rewrite Configuration
+    rewrite_skip_standalone: bool = False  # heuristic; short follow-ups can look standalone
+    rewrite_standalone_min_words: int = 6
+    rewrite_cache_size: int = 1024
+    rewrite_cache_ttl_seconds: int = 900
+    rewrite_cache_history_messages: int = 4
+
+    # Answer Cache Configuration (opt-in)
+    answer_cache_enabled: bool = False
+    answer_cache_similarity_threshold: float = 0.95
+    answer_cache_max_entries_per_user: int = 256
+    answer_cache_ttl_seconds: int = 3600
+    answer_cache_stats_log_interval: int = 100
 
     # API Configuration
     api_title: str = "RAG FastAPI Application"
@@ -32,6 +120,11 @@ class Settings(BaseSettings):
     # Authentication Configuration
     secret_key: str = secrets.token_urlsafe(32)
     access_token_expire_minutes: int = 30
+    user_cache_size: int = 10000
+    user_cache_ttl_seconds: int = 60  # bounds staleness across worker processes
+    bcrypt_rounds: int = 12  # existing hashes are upgraded on the next login
+    password_hash_workers: int = 2
+    password_hash_max_pending: int = 32
 
     class Config:
         env_file = ".env"
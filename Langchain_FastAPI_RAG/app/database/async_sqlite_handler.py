@@ -0,0 +1,191 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from app.config.settings import settings
+from app.database.sqlite_handler import SQLiteHandler
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_db_executor: Optional[ThreadPoolExecutor] = None
+_db_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Threads dedicated to SQLite work, one per pooled connection"""
+    global _db_executor
+    with _db_executor_lock:
+        if _db_executor is None:
+            _db_executor = ThreadPoolExecutor(max_workers=settings.sqlite_pool_size, thread_name_prefix="sqlite")
+        return _db_executor
+
+
+def shutdown_db_executor():
+    """Stop the SQLite threads after queued calls finish"""
+    global _db_executor
+    with _db_executor_lock:
+        if _db_executor is not None:
+            _db_executor.shutdown(wait=True)
+            _db_executor = None
+
+
+class AsyncSQLiteHandler:
+    """Awaitable counterpart of SQLiteHandler
+
+    Every method runs the matching SQLiteHandler method on the SQLite
+    threads, so calls never block the event loop and never queue behind
+    LLM or vector store work in the default executor. The executor has as
+    many threads as the connection pool has connections.
+    """
+
+    def __init__(self, db_handler: Optional[SQLiteHandler] = None):
+        self.db_handler = db_handler or SQLiteHandler()
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Run a blocking function that uses the database on the SQLite threads"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_db_executor(), lambda: func(*args, **kwargs))
+
+    # Conversation log methods
+    async def insert_conversation_log(self, session_id: str, user_id: int, user_query: str, gpt_response: str,
+                                      model: str) -> bool:
+        """Insert conversation log - user_id is mandatory"""
+        return await self.run(self.db_handler.insert_conversation_log, session_id, user_id, user_query,
+                              gpt_response, model)
+
+    async def insert_conversation_logs(self, logs: List[Dict]) -> bool:
+        """Insert several conversation logs in one transaction"""
+        return await self.run(self.db_handler.insert_conversation_logs, logs)
+
+    async def get_chat_history(self, session_id: str, user_id: int, token_budget: Optional[int] = None,
+                               max_turns: Optional[int] = None, after_id: int = 0) -> List[Dict]:
+        """Get chat history for a session and user - user_id is mandatory"""
+        return await self.run(self.db_handler.get_chat_history, session_id, user_id, token_budget, max_turns,
+                              after_id)
+
+    # Document metadata methods
+    async def insert_document_metadata(self, document_id: str, user_id: int, filename: str, file_type: str,
+                                       chunk_count: int, content_hash: Optional[str] = None) -> bool:
+        """Insert document metadata - user_id is mandatory"""
+        return await self.run(self.db_handler.insert_document_metadata, document_id, user_id, filename,
+                              file_type, chunk_count, content_hash)
+
+    async def get_document_list(self, user_id: int, limit: int = 10, offset: int = 0) -> List[Dict]:
+        """Get list of documents for a specific user - user_id is mandatory"""
+        return await self.run(self.db_handler.get_document_list, user_id, limit, offset)
+
+    async def get_document_page(self, user_id: int, limit: int, offset: int = 0,
+                                after: Optional[Tuple[str, int]] = None) -> Tuple[List[Dict], int]:
+        """Documents of a user, newest first, and the user's document count"""
+        return await self.run(self.db_handler.get_document_page, user_id, limit, offset, after)
+
+    async def get_document_metadata(self, document_id: str, user_id: int) -> Optional[Dict]:
+        """Get metadata of a single document for a specific user"""
+        return await self.run(self.db_handler.get_document_metadata, document_id, user_id)
+
+    async def get_document_by_hash(self, user_id: int, content_hash: str) -> Optional[Dict]:
+        """Get a user's document with the given content hash"""
+        return await self.run(self.db_handler.get_document_by_hash, user_id, content_hash)
+
+    async def delete_document_metadata(self, document_id: str, user_id: int) -> bool:
+        """Delete document metadata for a specific user - user_id is mandatory"""
+        return await self.run(self.db_handler.delete_document_metadata, document_id, user_id)
+
+    async def get_total_document_count(self, user_id: int) -> int:
+        """Get total count of documents for a specific user - user_id is mandatory"""
+        return await self.run(self.db_handler.get_total_document_count, user_id)
+
+    async def get_document_owners(self) -> Dict[str, int]:
+        """Map every document ID to the ID of the user that owns it"""
+        return await self.run(self.db_handler.get_document_owners)
+
+    # Session summary methods
+    async def get_session_summary(self, session_id: str, user_id: int) -> Optional[Dict]:
+        """Get the rolling summary of a session"""
+        return await self.run(self.db_handler.get_session_summary, session_id, user_id)
+
+    async def get_turns_to_summarize(self, session_id: str, user_id: int, after_id: int,
+                                     keep_recent: int) -> List[Dict]:
+        """Turns after after_id, oldest first, except the keep_recent newest turns of the session"""
+        return await self.run(self.db_handler.get_turns_to_summarize, session_id, user_id, after_id,
+                              keep_recent)
+
+    async def save_session_summary(self, session_id: str, user_id: int, summary: str,
+                                   summarized_through_id: int, previous_through_id: int) -> bool:
+        """Store a session summary unless another update got there first"""
+        return await self.run(self.db_handler.save_session_summary, session_id, user_id, summary,
+                              summarized_through_id, previous_through_id)
+
+    # User management methods
+    async def create_user(self, username: str, email: str, password_hash: str) -> Optional[int]:
+        """Create a new user"""
+        return await self.run(self.db_handler.create_user, username, email, password_hash)
+
+    async def get_user_by_username(self, username: str) -> Optional[Dict]:
+        """Get user by username"""
+        return await self.run(self.db_handler.get_user_by_username, username)
+
+    async def get_user_by_email(self, email: str) -> Optional[Dict]:
+        """Get user by email"""
+        return await self.run(self.db_handler.get_user_by_email, email)
+
+    async def get_user_by_id(self, user_id: int) -> Optional[Dict]:
+        """Get user by ID"""
+        return await self.run(self.db_handler.get_user_by_id, user_id)
+
+    async def store_reset_token(self, user_id: int, reset_token: str) -> bool:
+        """Store password reset token"""
+        return await self.run(self.db_handler.store_reset_token, user_id, reset_token)
+
+    async def verify_reset_token(self, user_id: int, token: str) -> bool:
+        """Verify if reset token exists and is valid (within 1 hour)"""
+        return await self.run(self.db_handler.verify_reset_token, user_id, token)
+
+    async def delete_reset_token(self, user_id: int, token: str) -> bool:
+        """Delete used reset token"""
+        return await self.run(self.db_handler.delete_reset_token, user_id, token)
+
+    async def update_user_password(self, user_id: int, password_hash: str) -> bool:
+        """Update user password"""
+        return await self.run(self.db_handler.update_user_password, user_id, password_hash)
+
+    async def set_user_active(self, user_id: int, is_active: bool) -> bool:
+        """Activate or deactivate a user"""
+        return await self.run(self.db_handler.set_user_active, user_id, is_active)
+
+    # Ingestion job methods
+    async def create_ingestion_job(self, job_id: str, user_id: int, filename: str, file_path: str,
+                                   content_hash: str, status: str = 'queued',
+                                   document_id: Optional[str] = None) -> bool:
+        """Create an ingestion job"""
+        return await self.run(self.db_handler.create_ingestion_job, job_id, user_id, filename, file_path,
+                              content_hash, status, document_id)
+
+    async def update_ingestion_job(self, job_id: str, **fields) -> bool:
+        """Update status and progress counters of an ingestion job"""
+        return await self.run(self.db_handler.update_ingestion_job, job_id, **fields)
+
+    async def get_ingestion_job(self, job_id: str, user_id: Optional[int] = None) -> Optional[Dict]:
+        """Get an ingestion job, optionally restricted to its owner"""
+        return await self.run(self.db_handler.get_ingestion_job, job_id, user_id)
+
+    async def claim_ingestion_job(self, job_id: str) -> Optional[int]:
+        """Atomically move a queued job to running; returns its attempt number, or None if another worker has it"""
+        return await self.run(self.db_handler.claim_ingestion_job, job_id)
+
+    async def heartbeat_ingestion_job(self, job_id: str, attempt: int) -> bool:
+        """Extend the lease of a running job; False once the attempt is no longer the current one"""
+        return await self.run(self.db_handler.heartbeat_ingestion_job, job_id, attempt)
+
+    async def release_ingestion_job(self, job_id: str, attempt: int) -> bool:
+        """Return a running job to the queue, e.g. when its worker is stopped"""
+        return await self.run(self.db_handler.release_ingestion_job, job_id, attempt)
+
+    async def requeue_stale_ingestion_jobs(self, lease_seconds: int) -> int:
+        """Requeue running jobs whose lease expired, i.e. not updated for lease_seconds"""
+        return await self.run(self.db_handler.requeue_stale_ingestion_jobs, lease_seconds)
+
+    async def get_unfinished_ingestion_jobs(self) -> List[Dict]:
+        """Get queued or running ingestion jobs, oldest first"""
+        return await self.run(self.db_handler.get_unfinished_ingestion_jobs)
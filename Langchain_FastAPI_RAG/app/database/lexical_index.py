@@ -0,0 +1,124 @@
+import json
+import os
+import re
+import threading
+from typing import List, Optional, Set
+from langchain_core.documents import Document
+from app.config.settings import settings
+from app.database.sqlite_handler import PooledConnection, get_connection_pool
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Words plus joined identifiers such as part numbers (XJ-2041) and error codes (E.1234)
+QUERY_TERM_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+MAX_QUERY_TERMS = 32
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """FTS5 query matching any term of a free-text question
+
+    Every term is quoted, so FTS5 operators in user input are searched as
+    text and identifiers become phrases of their parts (xj 2041).
+    """
+    terms = list(dict.fromkeys(term.lower() for term in QUERY_TERM_PATTERN.findall(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return ' OR '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+class LexicalIndex:
+    """BM25 keyword index of document chunks in SQLite FTS5
+
+    Lives in its own database file next to the application database, with
+    one FTS5 table per user like the per-user vector collections.
+    """
+
+    def __init__(self, db_name: Optional[str] = None):
+        self.db_name = db_name or os.path.join(os.path.dirname(settings.sqlite_db_name), settings.fts_db_name)
+        self._pool = get_connection_pool(self.db_name)
+        self._tables: Set[int] = set()
+        self._tables_lock = threading.Lock()
+
+    def table_name(self, user_id: int) -> str:
+        """FTS5 table holding a user's chunks"""
+        return f"CHUNKS_FTS_USER_{int(user_id)}"
+
+    def add_documents(self, documents: List[Document], document_id: str, user_id: int) -> bool:
+        """Index the chunks of a document"""
+        try:
+            with self._get_connection() as conn:
+                self._ensure_table(conn, user_id)
+                conn.executemany(
+                    f'INSERT INTO {self.table_name(user_id)} (CONTENT, DOCUMENT_ID, METADATA) VALUES (?, ?, ?)',
+                    [(doc.page_content, document_id, json.dumps(doc.metadata)) for doc in documents]
+                )
+                conn.commit()
+                logger.info(f"Indexed {len(documents)} chunks of document {document_id} for keyword search")
+                return True
+
+        except Exception as e:
+            logger.error(f"Error indexing chunks for keyword search: {str(e)}")
+            return False
+
+    def delete_documents(self, document_id: str, user_id: int) -> bool:
+        """Remove the chunks of a document"""
+        try:
+            with self._get_connection() as conn:
+                self._ensure_table(conn, user_id)
+                conn.execute(f'DELETE FROM {self.table_name(user_id)} WHERE DOCUMENT_ID = ?', (document_id,))
+                conn.commit()
+                return True
+
+        except Exception as e:
+            logger.error(f"Error removing chunks from keyword index: {str(e)}")
+            return False
+
+    def has_documents(self, user_id: int) -> bool:
+        """Whether any chunk of the user is indexed"""
+        try:
+            with self._get_connection() as conn:
+                self._ensure_table(conn, user_id)
+                return conn.execute(f'SELECT 1 FROM {self.table_name(user_id)} LIMIT 1').fetchone() is not None
+
+        except Exception as e:
+            logger.error(f"Error reading keyword index: {str(e)}")
+            return False
+
+    def search(self, query: str, user_id: int, k: int) -> List[Document]:
+        """Best k chunks of the user by BM25 score"""
+        match_query = build_match_query(query)
+        if match_query is None:
+            return []
+
+        try:
+            with self._get_connection() as conn:
+                self._ensure_table(conn, user_id)
+                rows = conn.execute(
+                    f'SELECT CONTENT, METADATA FROM {self.table_name(user_id)} WHERE {self.table_name(user_id)} MATCH ? '
+                    'ORDER BY rank LIMIT ?',
+                    (match_query, k)
+                ).fetchall()
+                return [Document(page_content=row['CONTENT'], metadata=json.loads(row['METADATA'])) for row in rows]
+
+        except Exception as e:
+            logger.error(f"Error performing keyword search: {str(e)}")
+            return []
+
+    def _get_connection(self) -> PooledConnection:
+        return self._pool.acquire()
+
+    def _ensure_table(self, conn: PooledConnection, user_id: int):
+        with self._tables_lock:
+            if user_id in self._tables:
+                return
+            conn.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS {self.table_name(user_id)} USING fts5(
+                    CONTENT,
+                    DOCUMENT_ID UNINDEXED,
+                    METADATA UNINDEXED,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            ''')
+            conn.commit()
+            self._tables.add(user_id)
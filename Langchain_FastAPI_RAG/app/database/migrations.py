@@ -0,0 +1,140 @@
+import sqlite3
+from typing import List, Tuple
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Ordered schema migrations: (version, description, statements). Applied
+# versions are recorded in SCHEMA_VERSION; never edit a released migration,
+# append a new one instead.
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (
+        1,
+        "Index chat history lookups by session, user and time",
+        [
+            'CREATE INDEX IF NOT EXISTS IDX_APPLICATION_LOGS_SESSION_USER_CREATED '
+            'ON APPLICATION_LOGS (SESSION_ID, USER_ID, CREATED_AT)'
+        ]
+    ),
+    (
+        2,
+        "Covering index for the per-user document list",
+        [
+            'CREATE INDEX IF NOT EXISTS IDX_DOCUMENTS_USER_UPLOADED '
+            'ON DOCUMENTS (USER_ID, UPLOAD_TIMESTAMP, DOCUMENT_ID, FILENAME, FILE_TYPE, CHUNK_COUNT, CONTENT_HASH)'
+        ]
+    ),
+    (
+        3,
+        "Store the token count of each conversation turn",
+        [
+            'ALTER TABLE APPLICATION_LOGS ADD COLUMN TOKEN_COUNT INTEGER'
+        ]
+    ),
+    (
+        4,
+        "Rolling conversation summaries per session",
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS SESSION_SUMMARIES (
+                SESSION_ID TEXT NOT NULL,
+                USER_ID INTEGER NOT NULL,
+                SUMMARY TEXT NOT NULL,
+                SUMMARIZED_THROUGH_ID INTEGER NOT NULL,
+                CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UPDATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (SESSION_ID, USER_ID),
+                FOREIGN KEY (USER_ID) REFERENCES USERS (ID) ON DELETE CASCADE
+            )
+            '''
+        ]
+    ),
+    (
+        5,
+        "Keyset index and maintained per-user document counts",
+        [
+            # ID is the rowid, so the index is ordered by (UPLOAD_TIMESTAMP, ID) within a user
+            'CREATE INDEX IF NOT EXISTS IDX_DOCUMENTS_USER_UPLOADED_ID ON DOCUMENTS (USER_ID, UPLOAD_TIMESTAMP, ID)',
+            '''
+            CREATE TABLE IF NOT EXISTS USER_DOCUMENT_COUNTS (
+                USER_ID INTEGER PRIMARY KEY,
+                DOCUMENT_COUNT INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            '''
+            INSERT OR REPLACE INTO USER_DOCUMENT_COUNTS (USER_ID, DOCUMENT_COUNT)
+            SELECT USER_ID, COUNT(*) FROM DOCUMENTS GROUP BY USER_ID
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS TRG_DOCUMENTS_COUNT_INSERT AFTER INSERT ON DOCUMENTS
+            BEGIN
+                INSERT INTO USER_DOCUMENT_COUNTS (USER_ID, DOCUMENT_COUNT) VALUES (NEW.USER_ID, 1)
+                ON CONFLICT (USER_ID) DO UPDATE SET DOCUMENT_COUNT = DOCUMENT_COUNT + 1;
+            END
+            ''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS TRG_DOCUMENTS_COUNT_DELETE AFTER DELETE ON DOCUMENTS
+            BEGIN
+                UPDATE USER_DOCUMENT_COUNTS SET DOCUMENT_COUNT = DOCUMENT_COUNT - 1 WHERE USER_ID = OLD.USER_ID;
+            END
+            '''
+        ]
+    ),
+    (
+        6,
+        "Count ingestion attempts so a reclaimed job knows it was interrupted",
+        [
+            'ALTER TABLE INGESTION_JOBS ADD COLUMN ATTEMPTS INTEGER NOT NULL DEFAULT 0',
+            # Jobs running during the upgrade were started once already
+            "UPDATE INGESTION_JOBS SET ATTEMPTS = 1 WHERE STATUS = 'running'",
+            'CREATE INDEX IF NOT EXISTS IDX_INGESTION_JOBS_STATUS_UPDATED ON INGESTION_JOBS (STATUS, UPDATED_AT)'
+        ]
+    ),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Highest applied migration version, 0 for a database without migrations"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS SCHEMA_VERSION (
+            VERSION INTEGER PRIMARY KEY,
+            DESCRIPTION TEXT NOT NULL,
+            APPLIED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    return conn.execute('SELECT COALESCE(MAX(VERSION), 0) FROM SCHEMA_VERSION').fetchone()[0]
+
+
+def apply_migrations(conn: sqlite3.Connection) -> int:
+    """Apply pending migrations in order, each in its own transaction
+
+    The write lock is taken before the version is read, so processes
+    starting at the same time apply every migration exactly once.
+    Returns the resulting schema version.
+    """
+    version = get_schema_version(conn)
+    for migration_version, description, statements in MIGRATIONS:
+        if migration_version <= version:
+            continue
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have applied it while we waited for the lock
+            if get_schema_version(conn) >= migration_version:
+                conn.rollback()
+                continue
+
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(
+                'INSERT INTO SCHEMA_VERSION (VERSION, DESCRIPTION) VALUES (?, ?)',
+                (migration_version, description)
+            )
+            conn.commit()
+            logger.info(f"Applied schema migration {migration_version}: {description}")
+
+        except Exception:
+            conn.rollback()
+            raise
+
+    return max(version, get_schema_version(conn))
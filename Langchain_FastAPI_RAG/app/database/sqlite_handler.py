@@ -1,233 +1,593 @@
+import os
+import queue
 import sqlite3
+import threading
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from app.config.settings import settings
+from app.database.migrations import apply_migrations
+from app.utils.tokens import CHARS_PER_TOKEN, count_tokens
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Updatable INGESTION_JOBS columns by keyword name
+INGESTION_JOB_COLUMNS = {
+    'status': 'STATUS',
+    'pages_parsed': 'PAGES_PARSED',
+    'total_chunks': 'TOTAL_CHUNKS',
+    'chunks_embedded': 'CHUNKS_EMBEDDED',
+    'chunks_written': 'CHUNKS_WRITTEN',
+    'document_id': 'DOCUMENT_ID',
+    'error_message': 'ERROR_MESSAGE'
+}
+
+class PooledConnection:
+    """A pooled sqlite3 connection; close() hands it back to the pool"""
+
+    def __init__(self, pool: 'SQLiteConnectionPool', conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self) -> 'PooledConnection':
+        return self
+
+    def __exit__(self, *exc_info):
+        # Unlike sqlite3.Connection, leaving the block does not commit; it returns the connection
+        self.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+
+class SQLiteConnectionPool:
+    """Bounded pool of long-lived connections to one database file
+
+    Connections are opened lazily, up to max_size, in WAL mode with
+    synchronous=NORMAL and a busy timeout, so readers never wait for a
+    writer. Each connection keeps its own prepared statement cache.
+    """
+
+    def __init__(self, db_name: str, max_size: int, timeout_seconds: float):
+        self.db_name = db_name
+        self.max_size = max_size
+        self.timeout_seconds = timeout_seconds
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def acquire(self) -> PooledConnection:
+        """Borrow a connection, waiting up to timeout_seconds when all are in use"""
+        if not self._slots.acquire(timeout=self.timeout_seconds):
+            raise sqlite3.OperationalError(f"Timed out waiting for a connection to {self.db_name}")
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = self._connect()
+            except Exception:
+                self._slots.release()
+                raise
+        return PooledConnection(self, conn)
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection, discarding whatever its borrower left uncommitted"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Dropping broken connection to {self.db_name}: {str(e)}")
+            conn.close()
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        """Close idle connections (borrowed ones are closed when returned later)"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=settings.sqlite_busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=settings.sqlite_statement_cache_size
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout = {int(settings.sqlite_busy_timeout_ms)}')
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+
+_connection_pools: Dict[str, SQLiteConnectionPool] = {}
+_connection_pools_lock = threading.Lock()
+
+
+def get_connection_pool(db_name: str) -> SQLiteConnectionPool:
+    """Shared connection pool of a database file"""
+    with _connection_pools_lock:
+        pool = _connection_pools.get(db_name)
+        if pool is None:
+            pool = SQLiteConnectionPool(db_name, settings.sqlite_pool_size, settings.sqlite_pool_timeout_seconds)
+            _connection_pools[db_name] = pool
+        return pool
+
+
+def close_connection_pools():
+    """Close the idle connections of every pool"""
+    with _connection_pools_lock:
+        for pool in _connection_pools.values():
+            pool.close_all()
+
+
+_initialized_databases = set()
+_initialized_databases_lock = threading.Lock()
+
+
 class SQLiteHandler:
     def __init__(self):
         self.db_name = settings.sqlite_db_name
-        self._init_database()
+        self._pool = get_connection_pool(self.db_name)
 
-    def _get_connection(self) -> sqlite3.Connection:
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_name)
-        conn.row_factory = sqlite3.Row
-        return conn
+        # Schema setup and migrations run once per database file and process
+        with _initialized_databases_lock:
+            db_path = os.path.abspath(self.db_name)
+            if db_path not in _initialized_databases:
+                self._init_database()
+                _initialized_databases.add(db_path)
+
+    def _get_connection(self) -> PooledConnection:
+        """Borrow a pooled database connection; leaving its with block returns it to the pool"""
+        return self._pool.acquire()
 
     def _init_database(self):
         """Initialize database tables - clean slate approach"""
         try:
-            conn = self._get_connection()
-
-            # Drop existing tables to start fresh
-            # conn.execute('DROP TABLE IF EXISTS APPLICATION_LOGS')
-            # conn.execute('DROP TABLE IF EXISTS DOCUMENTS')
-            # Keep USERS table if it exists
-
-            # Users table
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS USERS (
-                    ID INTEGER PRIMARY KEY AUTOINCREMENT,
-                    USERNAME TEXT UNIQUE NOT NULL,
-                    EMAIL TEXT UNIQUE NOT NULL,
-                    PASSWORD_HASH TEXT NOT NULL,
-                    CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    IS_ACTIVE BOOLEAN DEFAULT 1
-                )
-            ''')
-
-            # Application logs table (with mandatory user_id foreign key)
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS APPLICATION_LOGS (
-                    ID INTEGER PRIMARY KEY AUTOINCREMENT,
-                    SESSION_ID TEXT NOT NULL,
-                    USER_ID INTEGER NOT NULL,
-                    USER_QUERY TEXT NOT NULL,
-                    GPT_RESPONSE TEXT NOT NULL,
-                    MODEL TEXT NOT NULL,
-                    CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (USER_ID) REFERENCES USERS (ID) ON DELETE CASCADE
-                )
-            ''')
-
-            # Document metadata table (with mandatory user_id foreign key)
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS DOCUMENTS (
-                    ID INTEGER PRIMARY KEY AUTOINCREMENT,
-                    DOCUMENT_ID TEXT UNIQUE NOT NULL,
-                    USER_ID INTEGER NOT NULL,
-                    FILENAME TEXT NOT NULL,
-                    FILE_TYPE TEXT NOT NULL,
-                    UPLOAD_TIMESTAMP TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    CHUNK_COUNT INTEGER DEFAULT 0,
-                    FOREIGN KEY (USER_ID) REFERENCES USERS (ID) ON DELETE CASCADE
-                )
-            ''')
-
-            # Create reset tokens table if not exists
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS RESET_TOKENS (
-                    ID INTEGER PRIMARY KEY AUTOINCREMENT,
-                    USER_ID INTEGER NOT NULL,
-                    TOKEN TEXT NOT NULL,
-                    CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (USER_ID) REFERENCES USERS (ID) ON DELETE CASCADE
+            with self._get_connection() as conn:
+                # Drop existing tables to start fresh
+                # conn.execute('DROP TABLE IF EXISTS APPLICATION_LOGS')
+                # conn.execute('DROP TABLE IF EXISTS DOCUMENTS')
+                # Keep USERS table if it exists
+
+                # Users table
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS USERS (
+                        ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                        USERNAME TEXT UNIQUE NOT NULL,
+                        EMAIL TEXT UNIQUE NOT NULL,
+                        PASSWORD_HASH TEXT NOT NULL,
+                        CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        IS_ACTIVE BOOLEAN DEFAULT 1
+                    )
+                ''')
+
+                # Application logs table (with mandatory user_id foreign key)
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS APPLICATION_LOGS (
+                        ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                        SESSION_ID TEXT NOT NULL,
+                        USER_ID INTEGER NOT NULL,
+                        USER_QUERY TEXT NOT NULL,
+                        GPT_RESPONSE TEXT NOT NULL,
+                        MODEL TEXT NOT NULL,
+                        CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (USER_ID) REFERENCES USERS (ID) ON DELETE CASCADE
+                    )
+                ''')
+
+                # Document metadata table (with mandatory user_id foreign key)
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS DOCUMENTS (
+                        ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                        DOCUMENT_ID TEXT UNIQUE NOT NULL,
+                        USER_ID INTEGER NOT NULL,
+                        FILENAME TEXT NOT NULL,
+                        FILE_TYPE TEXT NOT NULL,
+                        UPLOAD_TIMESTAMP TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        CHUNK_COUNT INTEGER DEFAULT 0,
+                        CONTENT_HASH TEXT,
+                        FOREIGN KEY (USER_ID) REFERENCES USERS (ID) ON DELETE CASCADE
+                    )
+                ''')
+
+                # Databases created before upload dedup lack the content hash column
+                self._ensure_column(conn, 'DOCUMENTS', 'CONTENT_HASH', 'TEXT')
+                conn.execute(
+                    'CREATE UNIQUE INDEX IF NOT EXISTS IDX_DOCUMENTS_USER_CONTENT_HASH ON DOCUMENTS (USER_ID, CONTENT_HASH)'
                 )
-            ''')
 
-            conn.commit()
-            logger.info("Database initialized successfully with clean schema")
+                # Create reset tokens table if not exists
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS RESET_TOKENS (
+                        ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                        USER_ID INTEGER NOT NULL,
+                        TOKEN TEXT NOT NULL,
+                        CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (USER_ID) REFERENCES USERS (ID) ON DELETE CASCADE
+                    )
+                ''')
+
+                # Background ingestion jobs, kept so queued uploads survive a restart
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS INGESTION_JOBS (
+                        ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                        JOB_ID TEXT UNIQUE NOT NULL,
+                        USER_ID INTEGER NOT NULL,
+                        FILENAME TEXT NOT NULL,
+                        FILE_PATH TEXT NOT NULL,
+                        CONTENT_HASH TEXT NOT NULL,
+                        STATUS TEXT NOT NULL DEFAULT 'queued',
+                        PAGES_PARSED INTEGER DEFAULT 0,
+                        TOTAL_CHUNKS INTEGER DEFAULT 0,
+                        CHUNKS_EMBEDDED INTEGER DEFAULT 0,
+                        CHUNKS_WRITTEN INTEGER DEFAULT 0,
+                        DOCUMENT_ID TEXT,
+                        ERROR_MESSAGE TEXT,
+                        CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        UPDATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (USER_ID) REFERENCES USERS (ID) ON DELETE CASCADE
+                    )
+                ''')
+
+                conn.commit()
+
+                # Indexes and later schema changes are versioned migrations
+                version = apply_migrations(conn)
+                logger.info(f"Database initialized successfully at schema version {version}")
 
         except Exception as e:
             logger.error(f"Error initializing database: {str(e)}")
             raise
-        finally:
-            conn.close()
+
+    def _ensure_column(self, conn: sqlite3.Connection, table: str, column: str, definition: str):
+        """Add a column to an existing table if it is missing"""
+        columns = [row['name'] for row in conn.execute(f'PRAGMA table_info({table})')]
+        if column not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+            logger.info(f"Added column {column} to {table}")
 
     def insert_conversation_log(self, session_id: str, user_id: int, user_query: str, 
                               gpt_response: str, model: str) -> bool:
         """Insert conversation log - user_id is mandatory"""
         try:
-            conn = self._get_connection()
-            conn.execute(
-                'INSERT INTO APPLICATION_LOGS (SESSION_ID, USER_ID, USER_QUERY, GPT_RESPONSE, MODEL) VALUES (?, ?, ?, ?, ?)',
-                (session_id, user_id, user_query, gpt_response, model)
-            )
-            conn.commit()
-            logger.info(f"Conversation log inserted for session: {session_id}, user: {user_id}")
-            return True
+            token_count = count_tokens(user_query) + count_tokens(gpt_response)
+            with self._get_connection() as conn:
+                conn.execute(
+                    'INSERT INTO APPLICATION_LOGS (SESSION_ID, USER_ID, USER_QUERY, GPT_RESPONSE, MODEL, TOKEN_COUNT) VALUES (?, ?, ?, ?, ?, ?)',
+                    (session_id, user_id, user_query, gpt_response, model, token_count)
+                )
+                conn.commit()
+                logger.info(f"Conversation log inserted for session: {session_id}, user: {user_id}")
+                return True
 
         except Exception as e:
             logger.error(f"Error inserting conversation log: {str(e)}")
             return False
-        finally:
-            conn.close()
 
-    def get_chat_history(self, session_id: str, user_id: int) -> List[Dict]:
-        """Get chat history for a session and user - user_id is mandatory"""
+    def insert_conversation_logs(self, logs: List[Dict]) -> bool:
+        """Insert several conversation logs in one transaction
+
+        Each log has session_id, user_id, user_query, gpt_response, model,
+        token_count and created_at keys. Nothing is written if any insert fails.
+        """
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                'SELECT USER_QUERY, GPT_RESPONSE FROM APPLICATION_LOGS WHERE SESSION_ID = ? AND USER_ID = ? ORDER BY CREATED_AT',
-                (session_id, user_id)
-            )
+            with self._get_connection() as conn:
+                conn.executemany(
+                    'INSERT INTO APPLICATION_LOGS (SESSION_ID, USER_ID, USER_QUERY, GPT_RESPONSE, MODEL, TOKEN_COUNT, CREATED_AT) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [(log['session_id'], log['user_id'], log['user_query'], log['gpt_response'], log['model'],
+                      log['token_count'], log['created_at']) for log in logs]
+                )
+                conn.commit()
+                logger.info(f"Inserted {len(logs)} conversation logs")
+                return True
+
+        except Exception as e:
+            logger.error(f"Error inserting conversation logs: {str(e)}")
+            return False
 
-            messages = []
-            for row in cursor.fetchall():
-                messages.extend([
-                    {"role": "human", "content": row['USER_QUERY']},
-                    {"role": "ai", "content": row['GPT_RESPONSE']}
-                ])
+    def get_chat_history(self, session_id: str, user_id: int, token_budget: Optional[int] = None,
+                         max_turns: Optional[int] = None, after_id: int = 0) -> List[Dict]:
+        """Get chat history for a session and user - user_id is mandatory
 
-            logger.info(f"Retrieved {len(messages)} messages for session: {session_id}, user: {user_id}")
-            return messages
+        With a token_budget only the most recent turns whose combined token
+        count fits the budget are returned (oldest first), and at most
+        max_turns of them. The window is selected in SQL, newest first.
+        Turns with an ID up to after_id (already summarized) are skipped.
+        """
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                if token_budget is None and max_turns is None:
+                    cursor.execute(
+                        'SELECT USER_QUERY, GPT_RESPONSE FROM APPLICATION_LOGS WHERE SESSION_ID = ? AND USER_ID = ? AND ID > ? ORDER BY CREATED_AT',
+                        (session_id, user_id, after_id)
+                    )
+                else:
+                    # Turns logged before token counts were stored are estimated from their length
+                    cursor.execute(f'''
+                        SELECT USER_QUERY, GPT_RESPONSE FROM (
+                            SELECT ID, CREATED_AT, USER_QUERY, GPT_RESPONSE,
+                                   SUM(COALESCE(TOKEN_COUNT, (LENGTH(USER_QUERY) + LENGTH(GPT_RESPONSE)) / {CHARS_PER_TOKEN} + 1))
+                                       OVER (ORDER BY CREATED_AT DESC, ID DESC) AS RUNNING_TOKENS
+                            FROM APPLICATION_LOGS
+                            WHERE SESSION_ID = ? AND USER_ID = ? AND ID > ?
+                            ORDER BY CREATED_AT DESC, ID DESC
+                            LIMIT ?
+                        )
+                        WHERE ? IS NULL OR RUNNING_TOKENS <= ?
+                        ORDER BY CREATED_AT, ID
+                    ''', (session_id, user_id, after_id, -1 if max_turns is None else max_turns,
+                          token_budget, token_budget))
+
+                messages = []
+                for row in cursor.fetchall():
+                    messages.extend([
+                        {"role": "human", "content": row['USER_QUERY']},
+                        {"role": "ai", "content": row['GPT_RESPONSE']}
+                    ])
+
+                logger.info(f"Retrieved {len(messages)} messages for session: {session_id}, user: {user_id}")
+                return messages
 
         except Exception as e:
             logger.error(f"Error retrieving chat history: {str(e)}")
             return []
-        finally:
-            conn.close()
 
     def insert_document_metadata(self, document_id: str, user_id: int, filename: str, 
-                                file_type: str, chunk_count: int) -> bool:
+                                file_type: str, chunk_count: int, content_hash: Optional[str] = None) -> bool:
         """Insert document metadata - user_id is mandatory"""
         try:
-            conn = self._get_connection()
-            conn.execute(
-                'INSERT INTO DOCUMENTS (DOCUMENT_ID, USER_ID, FILENAME, FILE_TYPE, CHUNK_COUNT) VALUES (?, ?, ?, ?, ?)',
-                (document_id, user_id, filename, file_type, chunk_count)
-            )
-            conn.commit()
-            logger.info(f"Document metadata inserted: {filename} for user: {user_id}")
-            return True
+            with self._get_connection() as conn:
+                conn.execute(
+                    'INSERT INTO DOCUMENTS (DOCUMENT_ID, USER_ID, FILENAME, FILE_TYPE, CHUNK_COUNT, CONTENT_HASH) VALUES (?, ?, ?, ?, ?, ?)',
+                    (document_id, user_id, filename, file_type, chunk_count, content_hash)
+                )
+                conn.commit()
+                logger.info(f"Document metadata inserted: {filename} for user: {user_id}")
+                return True
 
         except Exception as e:
             logger.error(f"Error inserting document metadata: {str(e)}")
             return False
-        finally:
-            conn.close()
 
     def get_document_list(self, user_id: int, limit: int = 10, offset: int = 0) -> List[Dict]:
         """Get list of documents for a specific user - user_id is mandatory"""
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                'SELECT * FROM DOCUMENTS WHERE USER_ID = ? ORDER BY UPLOAD_TIMESTAMP DESC LIMIT ? OFFSET ?',
-                (user_id, limit, offset)
-            )
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'SELECT * FROM DOCUMENTS WHERE USER_ID = ? ORDER BY UPLOAD_TIMESTAMP DESC LIMIT ? OFFSET ?',
+                    (user_id, limit, offset)
+                )
 
-            documents = [dict(row) for row in cursor.fetchall()]
-            logger.info(f"Retrieved {len(documents)} documents for user: {user_id}")
-            return documents
+                documents = [dict(row) for row in cursor.fetchall()]
+                logger.info(f"Retrieved {len(documents)} documents for user: {user_id}")
+                return documents
 
         except Exception as e:
             logger.error(f"Error retrieving document list: {str(e)}")
             return []
-        finally:
-            conn.close()
+
+    def get_document_page(self, user_id: int, limit: int, offset: int = 0,
+                          after: Optional[Tuple[str, int]] = None) -> Tuple[List[Dict], int]:
+        """Documents of a user, newest first, and the user's document count
+
+        With after = (UPLOAD_TIMESTAMP, ID) of the last document of the
+        previous page, the page starts right after it (keyset pagination)
+        and offset should be 0. The count is read from USER_DOCUMENT_COUNTS
+        in the same statement.
+        """
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                keyset = 'AND (UPLOAD_TIMESTAMP, ID) < (?, ?)' if after else ''
+                cursor.execute(f'''
+                    SELECT *, (SELECT DOCUMENT_COUNT FROM USER_DOCUMENT_COUNTS WHERE USER_ID = ?) AS TOTAL_COUNT
+                    FROM DOCUMENTS
+                    WHERE USER_ID = ? {keyset}
+                    ORDER BY UPLOAD_TIMESTAMP DESC, ID DESC
+                    LIMIT ? OFFSET ?
+                ''', (user_id, user_id, *(after or ()), limit, offset))
+
+                documents = [dict(row) for row in cursor.fetchall()]
+                if documents:
+                    total_count = documents[0]['TOTAL_COUNT'] or 0
+                else:
+                    # Past the last page
+                    row = cursor.execute(
+                        'SELECT DOCUMENT_COUNT FROM USER_DOCUMENT_COUNTS WHERE USER_ID = ?', (user_id,)
+                    ).fetchone()
+                    total_count = row['DOCUMENT_COUNT'] if row else 0
+
+                logger.info(f"Retrieved {len(documents)} of {total_count} documents for user: {user_id}")
+                return documents, total_count
+
+        except Exception as e:
+            logger.error(f"Error retrieving document page: {str(e)}")
+            return [], 0
+
+    def get_document_metadata(self, document_id: str, user_id: int) -> Optional[Dict]:
+        """Get metadata of a single document for a specific user"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'SELECT * FROM DOCUMENTS WHERE DOCUMENT_ID = ? AND USER_ID = ?',
+                    (document_id, user_id)
+                )
+                row = cursor.fetchone()
+
+                if row:
+                    return dict(row)
+                return None
+
+        except Exception as e:
+            logger.error(f"Error retrieving document metadata: {str(e)}")
+            return None
+
+    def get_document_by_hash(self, user_id: int, content_hash: str) -> Optional[Dict]:
+        """Get a user's document with the given content hash"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'SELECT * FROM DOCUMENTS WHERE USER_ID = ? AND CONTENT_HASH = ?',
+                    (user_id, content_hash)
+                )
+                row = cursor.fetchone()
+
+                if row:
+                    return dict(row)
+                return None
+
+        except Exception as e:
+            logger.error(f"Error retrieving document by content hash: {str(e)}")
+            return None
 
     def delete_document_metadata(self, document_id: str, user_id: int) -> bool:
         """Delete document metadata for a specific user - user_id is mandatory"""
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
             
-            # Only delete documents that belong to the specific user
-            cursor.execute(
-                'DELETE FROM DOCUMENTS WHERE DOCUMENT_ID = ? AND USER_ID = ?',
-                (document_id, user_id)
-            )
+                # Only delete documents that belong to the specific user
+                cursor.execute(
+                    'DELETE FROM DOCUMENTS WHERE DOCUMENT_ID = ? AND USER_ID = ?',
+                    (document_id, user_id)
+                )
             
-            conn.commit()
+                conn.commit()
             
-            if cursor.rowcount > 0:
-                logger.info(f"Document {document_id} deleted successfully for user: {user_id}")
-                return True
-            else:
-                logger.warning(f"Document {document_id} not found for user: {user_id}")
-                return False
+                if cursor.rowcount > 0:
+                    logger.info(f"Document {document_id} deleted successfully for user: {user_id}")
+                    return True
+                else:
+                    logger.warning(f"Document {document_id} not found for user: {user_id}")
+                    return False
 
         except Exception as e:
             logger.error(f"Error deleting document metadata: {str(e)}")
             return False
-        finally:
-            conn.close()
 
     def get_total_document_count(self, user_id: int) -> int:
         """Get total count of documents for a specific user - user_id is mandatory"""
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
             
-            cursor.execute('SELECT COUNT(*) as count FROM DOCUMENTS WHERE USER_ID = ?', (user_id,))
-            result = cursor.fetchone()
-            return result['count'] if result else 0
+                # Maintained by the DOCUMENTS triggers
+                cursor.execute('SELECT DOCUMENT_COUNT FROM USER_DOCUMENT_COUNTS WHERE USER_ID = ?', (user_id,))
+                result = cursor.fetchone()
+                return result['DOCUMENT_COUNT'] if result else 0
 
         except Exception as e:
             logger.error(f"Error getting document count: {str(e)}")
             return 0
-        finally:
-            conn.close()
+
+    def get_document_owners(self) -> Dict[str, int]:
+        """Map every document ID to the ID of the user that owns it"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT DOCUMENT_ID, USER_ID FROM DOCUMENTS')
+                return {row['DOCUMENT_ID']: row['USER_ID'] for row in cursor.fetchall()}
+
+        except Exception as e:
+            logger.error(f"Error retrieving document owners: {str(e)}")
+            return {}
+
+    # Session summary methods
+    def get_session_summary(self, session_id: str, user_id: int) -> Optional[Dict]:
+        """Get the rolling summary of a session"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'SELECT * FROM SESSION_SUMMARIES WHERE SESSION_ID = ? AND USER_ID = ?',
+                    (session_id, user_id)
+                )
+                row = cursor.fetchone()
+
+                if row:
+                    return dict(row)
+                return None
+
+        except Exception as e:
+            logger.error(f"Error retrieving session summary: {str(e)}")
+            return None
+
+    def get_turns_to_summarize(self, session_id: str, user_id: int, after_id: int, keep_recent: int) -> List[Dict]:
+        """Turns after after_id, oldest first, except the keep_recent newest turns of the session"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT ID, USER_QUERY, GPT_RESPONSE FROM APPLICATION_LOGS
+                    WHERE SESSION_ID = ? AND USER_ID = ? AND ID > ? AND ID NOT IN (
+                        SELECT ID FROM APPLICATION_LOGS
+                        WHERE SESSION_ID = ? AND USER_ID = ?
+                        ORDER BY CREATED_AT DESC, ID DESC
+                        LIMIT ?
+                    )
+                    ORDER BY CREATED_AT, ID
+                ''', (session_id, user_id, after_id, session_id, user_id, keep_recent))
+                return [dict(row) for row in cursor.fetchall()]
+
+        except Exception as e:
+            logger.error(f"Error retrieving turns to summarize: {str(e)}")
+            return []
+
+    def save_session_summary(self, session_id: str, user_id: int, summary: str,
+                             summarized_through_id: int, previous_through_id: int) -> bool:
+        """Store a session summary unless another update got there first
+
+        The write only succeeds while the stored summary still covers turns
+        up to previous_through_id (0 for a session without a summary).
+        """
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                if previous_through_id == 0:
+                    cursor.execute(
+                        'INSERT OR IGNORE INTO SESSION_SUMMARIES (SESSION_ID, USER_ID, SUMMARY, SUMMARIZED_THROUGH_ID) VALUES (?, ?, ?, ?)',
+                        (session_id, user_id, summary, summarized_through_id)
+                    )
+                else:
+                    cursor.execute('''
+                        UPDATE SESSION_SUMMARIES
+                        SET SUMMARY = ?, SUMMARIZED_THROUGH_ID = ?, UPDATED_AT = CURRENT_TIMESTAMP
+                        WHERE SESSION_ID = ? AND USER_ID = ? AND SUMMARIZED_THROUGH_ID = ?
+                    ''', (summary, summarized_through_id, session_id, user_id, previous_through_id))
+                conn.commit()
+                return cursor.rowcount > 0
+
+        except Exception as e:
+            logger.error(f"Error saving session summary: {str(e)}")
+            return False
 
     # User management methods
     def create_user(self, username: str, email: str, password_hash: str) -> Optional[int]:
         """Create a new user"""
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT INTO USERS (USERNAME, EMAIL, PASSWORD_HASH) VALUES (?, ?, ?)',
-                (username, email, password_hash)
-            )
-            user_id = cursor.lastrowid
-            conn.commit()
-            logger.info(f"User created: {username} with ID: {user_id}")
-            return user_id
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'INSERT INTO USERS (USERNAME, EMAIL, PASSWORD_HASH) VALUES (?, ?, ?)',
+                    (username, email, password_hash)
+                )
+                user_id = cursor.lastrowid
+                conn.commit()
+                logger.info(f"User created: {username} with ID: {user_id}")
+                return user_id
 
         except sqlite3.IntegrityError as e:
             logger.error(f"User creation failed - integrity error: {str(e)}")
@@ -235,144 +595,289 @@ class SQLiteHandler:
         except Exception as e:
             logger.error(f"Error creating user: {str(e)}")
             return None
-        finally:
-            conn.close()
 
     def get_user_by_username(self, username: str) -> Optional[Dict]:
         """Get user by username"""
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM USERS WHERE USERNAME = ? AND IS_ACTIVE = 1', (username,))
-            row = cursor.fetchone()
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM USERS WHERE USERNAME = ? AND IS_ACTIVE = 1', (username,))
+                row = cursor.fetchone()
             
-            if row:
-                return dict(row)
-            return None
+                if row:
+                    return dict(row)
+                return None
 
         except Exception as e:
             logger.error(f"Error retrieving user by username: {str(e)}")
             return None
-        finally:
-            conn.close()
 
     def get_user_by_email(self, email: str) -> Optional[Dict]:
         """Get user by email"""
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM USERS WHERE EMAIL = ? AND IS_ACTIVE = 1', (email,))
-            row = cursor.fetchone()
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM USERS WHERE EMAIL = ? AND IS_ACTIVE = 1', (email,))
+                row = cursor.fetchone()
             
-            if row:
-                return dict(row)
-            return None
+                if row:
+                    return dict(row)
+                return None
 
         except Exception as e:
             logger.error(f"Error retrieving user by email: {str(e)}")
             return None
-        finally:
-            conn.close()
 
     def get_user_by_id(self, user_id: int) -> Optional[Dict]:
         """Get user by ID"""
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM USERS WHERE ID = ? AND IS_ACTIVE = 1', (user_id,))
-            row = cursor.fetchone()
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM USERS WHERE ID = ? AND IS_ACTIVE = 1', (user_id,))
+                row = cursor.fetchone()
             
-            if row:
-                return dict(row)
-            return None
+                if row:
+                    return dict(row)
+                return None
 
         except Exception as e:
             logger.error(f"Error retrieving user by ID: {str(e)}")
             return None
-        finally:
-            conn.close()
 
     def store_reset_token(self, user_id: int, reset_token: str) -> bool:
         """Store password reset token"""
         try:
-            conn = self._get_connection()
+            with self._get_connection() as conn:
             
-            # Delete any existing tokens for this user
-            conn.execute('DELETE FROM RESET_TOKENS WHERE USER_ID = ?', (user_id,))
+                # Delete any existing tokens for this user
+                conn.execute('DELETE FROM RESET_TOKENS WHERE USER_ID = ?', (user_id,))
             
-            # Insert new token
-            conn.execute(
-                'INSERT INTO RESET_TOKENS (USER_ID, TOKEN) VALUES (?, ?)',
-                (user_id, reset_token)
-            )
-            conn.commit()
-            logger.info(f"Reset token stored for user ID: {user_id}")
-            return True
+                # Insert new token
+                conn.execute(
+                    'INSERT INTO RESET_TOKENS (USER_ID, TOKEN) VALUES (?, ?)',
+                    (user_id, reset_token)
+                )
+                conn.commit()
+                logger.info(f"Reset token stored for user ID: {user_id}")
+                return True
 
         except Exception as e:
             logger.error(f"Error storing reset token: {str(e)}")
             return False
-        finally:
-            conn.close()
 
     def verify_reset_token(self, user_id: int, token: str) -> bool:
         """Verify if reset token exists and is valid (within 1 hour)"""
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM RESET_TOKENS 
-                WHERE USER_ID = ? AND TOKEN = ? 
-                AND datetime(CREATED_AT, '+1 hour') > datetime('now')
-            ''', (user_id, token))
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT * FROM RESET_TOKENS 
+                    WHERE USER_ID = ? AND TOKEN = ? 
+                    AND datetime(CREATED_AT, '+1 hour') > datetime('now')
+                ''', (user_id, token))
             
-            result = cursor.fetchone()
-            return result is not None
+                result = cursor.fetchone()
+                return result is not None
 
         except Exception as e:
             logger.error(f"Error verifying reset token: {str(e)}")
             return False
-        finally:
-            conn.close()
 
     def delete_reset_token(self, user_id: int, token: str) -> bool:
         """Delete used reset token"""
         try:
-            conn = self._get_connection()
-            conn.execute(
-                'DELETE FROM RESET_TOKENS WHERE USER_ID = ? AND TOKEN = ?',
-                (user_id, token)
-            )
-            conn.commit()
-            logger.info(f"Reset token deleted for user ID: {user_id}")
-            return True
+            with self._get_connection() as conn:
+                conn.execute(
+                    'DELETE FROM RESET_TOKENS WHERE USER_ID = ? AND TOKEN = ?',
+                    (user_id, token)
+                )
+                conn.commit()
+                logger.info(f"Reset token deleted for user ID: {user_id}")
+                return True
 
         except Exception as e:
             logger.error(f"Error deleting reset token: {str(e)}")
             return False
-        finally:
-            conn.close()
 
     def update_user_password(self, user_id: int, password_hash: str) -> bool:
         """Update user password"""
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                'UPDATE USERS SET PASSWORD_HASH = ? WHERE ID = ?',
-                (password_hash, user_id)
-            )
-            conn.commit()
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'UPDATE USERS SET PASSWORD_HASH = ? WHERE ID = ?',
+                    (password_hash, user_id)
+                )
+                conn.commit()
             
-            if cursor.rowcount > 0:
-                logger.info(f"Password updated for user ID: {user_id}")
-                return True
-            else:
-                logger.warning(f"User ID {user_id} not found for password update")
-                return False
+                if cursor.rowcount > 0:
+                    logger.info(f"Password updated for user ID: {user_id}")
+                    return True
+                else:
+                    logger.warning(f"User ID {user_id} not found for password update")
+                    return False
 
         except Exception as e:
             logger.error(f"Error updating user password: {str(e)}")
             return False
-        finally:
-            conn.close()
+
+    def set_user_active(self, user_id: int, is_active: bool) -> bool:
+        """Activate or deactivate a user"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'UPDATE USERS SET IS_ACTIVE = ? WHERE ID = ?',
+                    (1 if is_active else 0, user_id)
+                )
+                conn.commit()
+
+                if cursor.rowcount > 0:
+                    logger.info(f"User ID {user_id} {'activated' if is_active else 'deactivated'}")
+                    return True
+                else:
+                    logger.warning(f"User ID {user_id} not found for activation change")
+                    return False
+
+        except Exception as e:
+            logger.error(f"Error changing user activation: {str(e)}")
+            return False
+
+    # Ingestion job methods
+    def create_ingestion_job(self, job_id: str, user_id: int, filename: str, file_path: str,
+                             content_hash: str, status: str = 'queued', document_id: Optional[str] = None) -> bool:
+        """Create an ingestion job"""
+        try:
+            with self._get_connection() as conn:
+                conn.execute(
+                    'INSERT INTO INGESTION_JOBS (JOB_ID, USER_ID, FILENAME, FILE_PATH, CONTENT_HASH, STATUS, DOCUMENT_ID) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (job_id, user_id, filename, file_path, content_hash, status, document_id)
+                )
+                conn.commit()
+                logger.info(f"Ingestion job {job_id} created for user: {user_id}")
+                return True
+
+        except Exception as e:
+            logger.error(f"Error creating ingestion job: {str(e)}")
+            return False
+
+    def update_ingestion_job(self, job_id: str, **fields) -> bool:
+        """Update status and progress counters of an ingestion job"""
+        try:
+            with self._get_connection() as conn:
+                columns = [INGESTION_JOB_COLUMNS[name] for name in fields]
+                assignments = ', '.join(f'{column} = ?' for column in columns)
+
+                conn.execute(
+                    f'UPDATE INGESTION_JOBS SET {assignments}, UPDATED_AT = CURRENT_TIMESTAMP WHERE JOB_ID = ?',
+                    (*fields.values(), job_id)
+                )
+                conn.commit()
+                return True
+
+        except Exception as e:
+            logger.error(f"Error updating ingestion job {job_id}: {str(e)}")
+            return False
+
+    def get_ingestion_job(self, job_id: str, user_id: Optional[int] = None) -> Optional[Dict]:
+        """Get an ingestion job, optionally restricted to its owner"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                if user_id is None:
+                    cursor.execute('SELECT * FROM INGESTION_JOBS WHERE JOB_ID = ?', (job_id,))
+                else:
+                    cursor.execute('SELECT * FROM INGESTION_JOBS WHERE JOB_ID = ? AND USER_ID = ?', (job_id, user_id))
+                row = cursor.fetchone()
+
+                if row:
+                    return dict(row)
+                return None
+
+        except Exception as e:
+            logger.error(f"Error retrieving ingestion job: {str(e)}")
+            return None
+
+    def claim_ingestion_job(self, job_id: str) -> Optional[int]:
+        """Atomically move a queued job to running; returns its attempt number, or None if another worker has it"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.execute(
+                    "UPDATE INGESTION_JOBS SET STATUS = 'running', ATTEMPTS = ATTEMPTS + 1, UPDATED_AT = CURRENT_TIMESTAMP "
+                    "WHERE JOB_ID = ? AND STATUS = 'queued'",
+                    (job_id,)
+                )
+                if cursor.rowcount != 1:
+                    conn.rollback()
+                    return None
+                attempt = conn.execute('SELECT ATTEMPTS FROM INGESTION_JOBS WHERE JOB_ID = ?', (job_id,)).fetchone()[0]
+                conn.commit()
+                return attempt
+
+        except Exception as e:
+            logger.error(f"Error claiming ingestion job {job_id}: {str(e)}")
+            return None
+
+    def heartbeat_ingestion_job(self, job_id: str, attempt: int) -> bool:
+        """Extend the lease of a running job; False once the attempt is no longer the current one"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.execute(
+                    "UPDATE INGESTION_JOBS SET UPDATED_AT = CURRENT_TIMESTAMP "
+                    "WHERE JOB_ID = ? AND STATUS = 'running' AND ATTEMPTS = ?",
+                    (job_id, attempt)
+                )
+                conn.commit()
+                return cursor.rowcount == 1
+
+        except Exception as e:
+            logger.error(f"Error extending lease of ingestion job {job_id}: {str(e)}")
+            return False
+
+    def release_ingestion_job(self, job_id: str, attempt: int) -> bool:
+        """Return a running job to the queue, e.g. when its worker is stopped"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.execute(
+                    "UPDATE INGESTION_JOBS SET STATUS = 'queued', UPDATED_AT = CURRENT_TIMESTAMP "
+                    "WHERE JOB_ID = ? AND STATUS = 'running' AND ATTEMPTS = ?",
+                    (job_id, attempt)
+                )
+                conn.commit()
+                return cursor.rowcount == 1
+
+        except Exception as e:
+            logger.error(f"Error releasing ingestion job {job_id}: {str(e)}")
+            return False
+
+    def requeue_stale_ingestion_jobs(self, lease_seconds: int) -> int:
+        """Requeue running jobs whose lease expired, i.e. not updated for lease_seconds"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.execute(
+                    "UPDATE INGESTION_JOBS SET STATUS = 'queued', UPDATED_AT = CURRENT_TIMESTAMP "
+                    "WHERE STATUS = 'running' AND UPDATED_AT < datetime('now', ?)",
+                    (f'{-lease_seconds} seconds',)
+                )
+                conn.commit()
+                if cursor.rowcount:
+                    logger.info(f"Requeued {cursor.rowcount} ingestion jobs with an expired lease")
+                return cursor.rowcount
+
+        except Exception as e:
+            logger.error(f"Error requeueing stale ingestion jobs: {str(e)}")
+            return 0
+
+    def get_unfinished_ingestion_jobs(self) -> List[Dict]:
+        """Get queued or running ingestion jobs, oldest first"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT * FROM INGESTION_JOBS WHERE STATUS IN ('queued', 'running') ORDER BY ID"
+                )
+                return [dict(row) for row in cursor.fetchall()]
+
+        except Exception as e:
+            logger.error(f"Error retrieving unfinished ingestion jobs: {str(e)}")
+            return []
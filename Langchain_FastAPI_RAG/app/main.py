@@ -1,20 +1,31 @@
+import asyncio
+import json
 import uuid
 from datetime import datetime
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from typing import List
 from app.config.settings import settings
 from fastapi.middleware.cors import CORSMiddleware
 from app.models.request_models import ConversationRequest, DeleteDocumentRequest, DocumentListRequest, UserRegistrationRequest, UserLoginRequest, ForgotPasswordRequest, ResetPasswordRequest
 from app.models.response_models import (
-    AddDocumentResponse, DocumentListResponse, 
+    AddDocumentResponse, DocumentListResponse, IngestionJobResponse,
     DeleteDocumentResponse, ConversationResponse, ErrorResponse,
     UserRegistrationResponse, UserLoginResponse, ForgotPasswordResponse, ResetPasswordResponse
 )
 from app.services.document_service import DocumentService
 from app.services.conversation_service import ConversationService
-from app.services.user_service import UserService
+from app.services.ingestion_service import IngestionService, IngestionQueueFullError
+from app.services.user_service import get_user_service
 from app.auth import get_current_user_id
+from app.utils.document_loader import shutdown_parse_executor, UploadTooLargeError
+from app.utils.upload_limit import UploadSizeLimitMiddleware
+from app.utils.pagination import InvalidCursorError
+from app.database.sqlite_handler import close_connection_pools
+from app.database.async_sqlite_handler import shutdown_db_executor
+from app.utils.password_hasher import PasswordHasherBusyError
+from app.utils.metrics import COMPONENT_STATS, render_metrics
+from app.utils.tokens import load_encoding, shutdown_count_executor
 from app.utils.logger import setup_logger
 
 # Initialize logger
@@ -40,19 +51,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Oversized uploads are rejected before Starlette spools the body to disk
+app.add_middleware(UploadSizeLimitMiddleware, paths=("/api/documents/add", "/api/documents/upload"))
+
 # Initialize services
 document_service = DocumentService()
-conversation_service = ConversationService()
-user_service = UserService()
+# One vector store service, so a local embedding model is loaded once
+conversation_service = ConversationService(vector_store_service=document_service.vector_store_service)
+COMPONENT_STATS.register(conversation_service.get_stats)
+user_service = get_user_service()
+ingestion_service = IngestionService(document_service)
 
 @app.on_event("startup")
 async def startup_event():
     """Startup event handler"""
+    # Refuse to serve collections embedded by another provider or dimension
+    await asyncio.to_thread(document_service.vector_store_service.verify_embedding_provider)
+    # Chunks stored before per-user partitioning move to their owners' collections
+    await asyncio.to_thread(document_service.migrate_vector_partitions)
+    await asyncio.to_thread(document_service.sync_lexical_index)
+    if conversation_service.reranker:
+        await asyncio.to_thread(conversation_service.reranker.prepare)
+    await asyncio.to_thread(load_encoding)
+    await ingestion_service.start()
     logger.info("FastAPI RAG Application started")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Shutdown event handler"""
+    await ingestion_service.stop()
+    await conversation_service.log_writer.close()
+    await conversation_service.session_summarizer.drain()
+    shutdown_parse_executor()
+    shutdown_count_executor()
+    shutdown_db_executor()
+    close_connection_pools()
     logger.info("FastAPI RAG Application stopped")
 
 @app.get("/", tags=["Health Check"])
@@ -64,6 +97,12 @@ async def root():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/metrics", tags=["Health Check"])
+async def metrics():
+    """Prometheus metrics: per-stage conversation and ingestion timings, token, chunk, cache and error counters"""
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 @app.post("/api/auth/register", response_model=UserRegistrationResponse, tags=["Authentication"])
 async def register_user(request: UserRegistrationRequest):
     """
@@ -76,7 +115,7 @@ async def register_user(request: UserRegistrationRequest):
     try:
         logger.info(f"Received registration request for username: {request.username}")
 
-        result = user_service.register_user(request.username, request.email, request.password)
+        result = await user_service.register_user(request.username, request.email, request.password)
 
         if result['success']:
             return UserRegistrationResponse(**result)
@@ -85,6 +124,9 @@ async def register_user(request: UserRegistrationRequest):
 
     except HTTPException:
         raise
+    except PasswordHasherBusyError as e:
+        logger.warning(f"Rejected registration request: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Unexpected error during registration: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -100,7 +142,7 @@ async def login_user(request: UserLoginRequest):
     try:
         logger.info(f"Received login request for username: {request.username}")
 
-        result = user_service.authenticate_user(request.username, request.password)
+        result = await user_service.authenticate_user(request.username, request.password)
 
         if result['success']:
             return UserLoginResponse(**result)
@@ -109,6 +151,9 @@ async def login_user(request: UserLoginRequest):
 
     except HTTPException:
         raise
+    except PasswordHasherBusyError as e:
+        logger.warning(f"Rejected login request: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Unexpected error during login: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -124,7 +169,7 @@ async def forgot_password(request: ForgotPasswordRequest):
         logger.info(f"Received forgot password request for email: {request.email}")
 
         # Create reset token (returns None if email doesn't exist, but we don't reveal this)
-        reset_token = user_service.create_reset_token(request.email)
+        reset_token = await user_service.async_db_handler.run(user_service.create_reset_token, request.email)
         
         # Always return success to avoid email enumeration
         # In a real app, you would send an email with the reset_token here
@@ -150,7 +195,7 @@ async def reset_password(request: ResetPasswordRequest):
     try:
         logger.info(f"Received password reset request")
 
-        result = user_service.reset_password(request.token, request.new_password)
+        result = await user_service.reset_password(request.token, request.new_password)
 
         if result['success']:
             return ResetPasswordResponse(**result)
@@ -159,6 +204,9 @@ async def reset_password(request: ResetPasswordRequest):
 
     except HTTPException:
         raise
+    except PasswordHasherBusyError as e:
+        logger.warning(f"Rejected password reset request: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Unexpected error during password reset: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -194,10 +242,76 @@ async def add_new_document(
 
     except HTTPException:
         raise
+    except UploadTooLargeError as e:
+        logger.warning(f"Rejected upload {file.filename}: {str(e)}")
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.error(f"Unexpected error adding document: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/api/documents/upload", response_model=IngestionJobResponse, status_code=202, tags=["Documents"])
+async def upload_document(
+    file: UploadFile = File(...),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """
+    Queue a document for background ingestion
+
+    - **file**: Document file (PDF or DOCX)
+    - Requires authentication
+
+    Returns `202` with a job id; poll `GET /api/documents/jobs/{job_id}` for progress.
+    """
+    try:
+        logger.info(f"Received request to upload document: {file.filename} for user: {current_user_id}")
+
+        # Validate file type
+        if not file.filename.lower().endswith(('.pdf', '.docx')):
+            raise HTTPException(
+                status_code=400,
+                detail="Only PDF and DOCX files are supported"
+            )
+
+        job = await ingestion_service.submit(file, current_user_id)
+        return IngestionJobResponse(
+            success=True,
+            message=f'Document {file.filename} queued for ingestion',
+            job=job
+        )
+
+    except HTTPException:
+        raise
+    except UploadTooLargeError as e:
+        logger.warning(f"Rejected upload {file.filename}: {str(e)}")
+        raise HTTPException(status_code=413, detail=str(e))
+    except IngestionQueueFullError as e:
+        logger.warning(f"Rejected upload {file.filename}: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    except Exception as e:
+        logger.error(f"Unexpected error queueing document: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/api/documents/jobs/{job_id}", response_model=IngestionJobResponse, tags=["Documents"])
+async def get_ingestion_job(
+    job_id: str,
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """
+    Get status and progress of a background ingestion job
+
+    - **job_id**: Job identifier returned by the upload endpoint
+    - Requires authentication
+    """
+    job = await asyncio.to_thread(ingestion_service.get_job, job_id, current_user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Ingestion job {job_id} not found")
+
+    return IngestionJobResponse(
+        success=True,
+        message=f"Ingestion job is {job['status']}",
+        job=job
+    )
+
 @app.post("/api/documents/list", response_model=DocumentListResponse, tags=["Documents"])
 async def get_document_list(
     request: DocumentListRequest,
@@ -208,14 +322,19 @@ async def get_document_list(
 
     - **limit**: Number of documents to return (default: 10, max: 100)
     - **offset**: Number of documents to skip (default: 0)
+    - **cursor**: `next_cursor` of the previous page; continues after it instead of skipping `offset` documents
     - Requires authentication
     """
     try:
-        logger.info(f"Received request to get document list (limit: {request.limit}, offset: {request.offset}) for user: {current_user_id}")
+        logger.info(f"Received request to get document list (limit: {request.limit}, offset: {request.offset}, cursor: {request.cursor is not None}) for user: {current_user_id}")
 
-        result = document_service.get_document_list(current_user_id, request.limit, request.offset)
+        result = await document_service.async_db_handler.run(
+            document_service.get_document_list, current_user_id, request.limit, request.offset, request.cursor
+        )
         return DocumentListResponse(**result)
 
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error retrieving document list: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -234,7 +353,8 @@ async def delete_document(
     try:
         logger.info(f"Received request to delete document: {request.document_id} for user: {current_user_id}")
 
-        result = document_service.delete_document(request.document_id, current_user_id)
+        # Chroma and SQLite work, kept off the event loop
+        result = await asyncio.to_thread(document_service.delete_document, request.document_id, current_user_id)
 
         if result['success']:
             return DeleteDocumentResponse(**result)
@@ -262,7 +382,7 @@ async def conversation(
     try:
         logger.info(f"Received conversation request for session: {request.session_id} from user: {current_user_id}")
 
-        result = conversation_service.get_response(request.session_id, request.question, current_user_id)
+        result = await conversation_service.get_response(request.session_id, request.question, current_user_id)
 
         response_data = {
             'success': True,
@@ -280,6 +400,43 @@ async def conversation(
         logger.error(f"Error in conversation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/api/conversation/stream", tags=["Conversation"])
+async def conversation_stream(
+    request: ConversationRequest,
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """
+    Stream the AI's answer as Server-Sent Events
+
+    - **session_id**: Unique session identifier for conversation continuity
+    - **question**: User's question
+    - Requires authentication
+
+    Emits a `sources` event, one `token` event per answer chunk and a final
+    `done` event carrying the `session_id`. Failures are sent as an `error` event.
+    """
+    logger.info(f"Received streaming conversation request for session: {request.session_id} from user: {current_user_id}")
+
+    async def event_stream():
+        try:
+            async for event in conversation_service.stream_response(request.session_id, request.question, current_user_id):
+                if event['event'] == 'done':
+                    event['data']['response_timestamp'] = datetime.now().isoformat()
+                yield format_sse(event['event'], event['data'])
+        except Exception as e:
+            logger.error(f"Error in streaming conversation: {str(e)}")
+            yield format_sse('error', {'message': f"Internal server error: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def format_sse(event: str, data: dict) -> str:
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler"""
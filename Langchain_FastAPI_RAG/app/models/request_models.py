@@ -12,6 +12,7 @@ class DeleteDocumentRequest(BaseModel):
 class DocumentListRequest(BaseModel):
     limit: Optional[int] = Field(default=10, ge=1, le=100, description="Number of documents to return")
     offset: Optional[int] = Field(default=0, ge=0, description="Number of documents to skip")
+    cursor: Optional[str] = Field(default=None, description="next_cursor of the previous page; takes precedence over offset")
 
 class UserRegistrationRequest(BaseModel):
     username: str = Field(..., min_length=3, max_length=50, description="Username")
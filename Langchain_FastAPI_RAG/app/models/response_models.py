@@ -15,10 +15,28 @@ class DocumentInfo(BaseModel):
 
 class AddDocumentResponse(BaseResponse):
     document_info: Optional[DocumentInfo] = None
+    duplicate: bool = Field(default=False, description="True when identical content was already uploaded and the existing document was returned")
+
+class IngestionJobInfo(BaseModel):
+    job_id: str = Field(..., description="Ingestion job identifier")
+    status: str = Field(..., description="Job status (queued, running, completed, failed)")
+    filename: str = Field(..., description="Original filename")
+    pages_parsed: int = Field(default=0, description="Number of pages parsed so far")
+    total_chunks: int = Field(default=0, description="Number of chunks the document was split into")
+    chunks_embedded: int = Field(default=0, description="Number of chunks embedded so far")
+    chunks_written: int = Field(default=0, description="Number of chunks written to the vector store so far")
+    document_info: Optional[DocumentInfo] = Field(None, description="The ingested document, once the job has completed")
+    error_message: Optional[str] = Field(None, description="Failure reason, if the job failed")
+    created_at: datetime = Field(..., description="When the job was created")
+    updated_at: datetime = Field(..., description="When the job was last updated")
+
+class IngestionJobResponse(BaseResponse):
+    job: Optional[IngestionJobInfo] = None
 
 class DocumentListResponse(BaseResponse):
     documents: List[DocumentInfo] = Field(default=[], description="List of documents")
     total_count: int = Field(default=0, description="Total number of documents")
+    next_cursor: Optional[str] = Field(None, description="Cursor of the next page, absent on the last page")
 
 class DeleteDocumentResponse(BaseResponse):
     deleted_document_id: Optional[str] = None
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Dict, List, Optional
+import numpy as np
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+from app.utils.metrics import count_cache
+
+logger = setup_logger(__name__)
+
+
+class SemanticAnswerCache:
+    """Per-user cache of answers looked up by question-embedding similarity
+
+    Every user has a generation counter that is bumped whenever their
+    documents change. Entries are dropped on invalidation, and answers
+    computed against an older generation are never stored.
+    """
+
+    def __init__(self):
+        self.enabled = settings.answer_cache_enabled
+        self.similarity_threshold = settings.answer_cache_similarity_threshold
+        self.max_entries_per_user = settings.answer_cache_max_entries_per_user
+        self.ttl_seconds = settings.answer_cache_ttl_seconds
+        self.stats_log_interval = settings.answer_cache_stats_log_interval
+        self._entries: Dict[int, "OrderedDict[int, Dict]"] = {}
+        self._generations: Dict[int, int] = {}
+        self._entry_ids = count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def generation(self, user_id: int) -> int:
+        """Current document generation of a user"""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def lookup(self, user_id: int, embedding: List[float]) -> Optional[Dict]:
+        """Return the cached answer of the most similar earlier question, if close enough"""
+        query = self._normalize(embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            entries = self._entries.get(user_id)
+            best_id, best_score = None, -1.0
+
+            if entries:
+                for entry_id in [entry_id for entry_id, entry in entries.items() if entry['expires_at'] <= now]:
+                    del entries[entry_id]
+
+            if entries:
+                entry_ids = list(entries.keys())
+                scores = np.vstack([entries[entry_id]['vector'] for entry_id in entry_ids]) @ query
+                best_index = int(np.argmax(scores))
+                best_id, best_score = entry_ids[best_index], float(scores[best_index])
+
+            if best_id is not None and best_score >= self.similarity_threshold:
+                entries.move_to_end(best_id)
+                self.hits += 1
+                count_cache('answer', hits=1)
+                entry = entries[best_id]
+                result = {
+                    'answer': entry['answer'],
+                    'sources': list(entry['sources']),
+                    'question': entry['question'],
+                    'similarity': best_score
+                }
+            else:
+                self.misses += 1
+                count_cache('answer', misses=1)
+                result = None
+
+            lookups = self.hits + self.misses
+
+        if self.stats_log_interval > 0 and lookups % self.stats_log_interval == 0:
+            logger.info(f"Answer cache stats: {self.stats()}")
+        return result
+
+    def store(self, user_id: int, generation: int, embedding: List[float], question: str,
+              answer: str, sources: List[str]) -> bool:
+        """Cache an answer unless the user's documents changed since `generation`"""
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return False
+
+            entries = self._entries.setdefault(user_id, OrderedDict())
+            entries[next(self._entry_ids)] = {
+                'vector': self._normalize(embedding),
+                'question': question,
+                'answer': answer,
+                'sources': list(sources),
+                'expires_at': time.monotonic() + self.ttl_seconds
+            }
+            while len(entries) > self.max_entries_per_user:
+                entries.popitem(last=False)
+            return True
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop a user's cached answers after their document set changed"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            dropped = len(self._entries.pop(user_id, {}))
+            self.invalidations += 1
+
+        if dropped:
+            logger.info(f"Invalidated {dropped} cached answers for user: {user_id}")
+
+    def stats(self) -> Dict:
+        """Hit-rate and size counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'users': len(self._entries),
+                'entries': sum(len(entries) for entries in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations
+            }
+
+    def _normalize(self, embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+# Shared between ConversationService (lookups) and DocumentService (invalidation)
+answer_cache = SemanticAnswerCache()
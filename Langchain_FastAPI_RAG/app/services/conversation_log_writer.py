@@ -0,0 +1,211 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from app.config.settings import settings
+from app.database.sqlite_handler import SQLiteHandler
+from app.database.async_sqlite_handler import AsyncSQLiteHandler
+from app.utils.tokens import count_tokens
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class ConversationLogWriter:
+    """Write-behind buffer for conversation turns
+
+    With `conversation_log_write_behind` enabled, logged turns are kept in
+    memory and a background task writes them in one transaction every
+    `conversation_log_flush_interval_ms`, or sooner once
+    `conversation_log_flush_rows` are pending. Chat history reads merge the
+    pending turns of the session, so a session always sees its own turns.
+    Turns stay in the buffer until their transaction commits; close()
+    flushes whatever is left. Disabled, every turn is inserted right away.
+
+    The buffer is bounded by `conversation_log_max_pending`: at the limit,
+    log() waits for a flush, and when the database keeps failing the oldest
+    turns are dropped (and logged) so memory use stays capped.
+    """
+
+    def __init__(self, db_handler: SQLiteHandler):
+        self.db_handler = db_handler
+        self.async_db_handler = AsyncSQLiteHandler(db_handler)
+        self.enabled = settings.conversation_log_write_behind
+        self._pending: List[Dict] = []
+        self._flushing = False
+        self._generation = 0
+        self._condition = threading.Condition()
+        self._counters = {'flushes': 0, 'turns_flushed': 0, 'errors': 0, 'turns_dropped': 0}
+        # One writer thread: batches commit in order and never wait for the
+        # SQLite threads that readers may be holding
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-log-writer")
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def log(self, session_id: str, user_id: int, user_query: str, gpt_response: str, model: str) -> bool:
+        """Log one turn, buffered when write-behind is enabled"""
+        if not self.enabled or self._closed:
+            return await self.async_db_handler.insert_conversation_log(
+                session_id, user_id, user_query, gpt_response, model
+            )
+
+        turn = {
+            'session_id': session_id,
+            'user_id': user_id,
+            'user_query': user_query,
+            'gpt_response': gpt_response,
+            'model': model,
+            # Counted on first use in a worker thread, never on the event loop
+            'token_count': None,
+            'created_at': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        }
+        if len(self._pending) >= settings.conversation_log_max_pending:
+            # Backpressure: wait for the buffer to be written before adding to it
+            await self.flush()
+
+        with self._condition:
+            self._pending.append(turn)
+            pending = len(self._pending)
+
+        self._ensure_started()
+        if pending >= settings.conversation_log_flush_rows:
+            self._wakeup.set()
+        return True
+
+    def get_chat_history(self, session_id: str, user_id: int, token_budget: Optional[int] = None,
+                         max_turns: Optional[int] = None, after_id: int = 0) -> List[Dict]:
+        """SQLiteHandler.get_chat_history including the session's pending turns
+
+        Pending turns are the newest of the session, so they take their share
+        of the token budget and the turn limit first. Blocking; call it from
+        a worker thread.
+        """
+        while True:
+            with self._condition:
+                while self._flushing:
+                    self._condition.wait()
+                generation = self._generation
+                pending = [turn for turn in self._pending
+                           if turn['session_id'] == session_id and turn['user_id'] == user_id]
+
+            recent, stored_budget, stored_turns = self._fit_pending(pending, token_budget, max_turns)
+            if (stored_budget is not None and stored_budget <= 0) or (stored_turns is not None and stored_turns <= 0):
+                stored = []
+            else:
+                stored = self.db_handler.get_chat_history(session_id, user_id, stored_budget, stored_turns, after_id)
+
+            # A batch committed meanwhile could be both in the result and in
+            # the pending snapshot; read again in that case
+            with self._condition:
+                if not self._flushing and self._generation == generation:
+                    break
+
+        messages = list(stored)
+        for turn in recent:
+            messages.extend([
+                {"role": "human", "content": turn['user_query']},
+                {"role": "ai", "content": turn['gpt_response']}
+            ])
+        return messages
+
+    async def flush(self) -> bool:
+        """Write all pending turns now; returns False if the write failed"""
+        if not self._pending:
+            return True
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._write_pending)
+
+    async def close(self):
+        """Stop the background task and flush the remaining turns"""
+        self._closed = True
+        if self._task is not None:
+            # Woken rather than cancelled, so a flush in progress completes
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if not await self.flush():
+            logger.error(f"{len(self._pending)} conversation turns could not be written at shutdown")
+        self._executor.shutdown(wait=True)
+
+    def get_stats(self) -> Dict:
+        """Buffer depth and flush counters"""
+        with self._condition:
+            stats = dict(self._counters)
+            stats['pending'] = len(self._pending)
+        stats['enabled'] = self.enabled
+        return stats
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        interval = settings.conversation_log_flush_interval_ms / 1000
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def _write_pending(self) -> bool:
+        with self._condition:
+            batch = list(self._pending)
+            if not batch:
+                return True
+            self._flushing = True
+
+        written = False
+        try:
+            for turn in batch:
+                self._token_count(turn)
+            written = self.db_handler.insert_conversation_logs(batch)
+        finally:
+            with self._condition:
+                if written:
+                    # Turns logged during the write were appended after the batch
+                    del self._pending[:len(batch)]
+                    self._counters['flushes'] += 1
+                    self._counters['turns_flushed'] += len(batch)
+                else:
+                    # Kept for the next flush, up to the buffer limit
+                    self._counters['errors'] += 1
+                    excess = len(self._pending) - settings.conversation_log_max_pending
+                    if excess > 0:
+                        del self._pending[:excess]
+                        self._counters['turns_dropped'] += excess
+                        logger.error(f"Dropped the {excess} oldest unwritten conversation turns; "
+                                     f"the buffer is at its limit of {settings.conversation_log_max_pending}")
+                self._flushing = False
+                self._generation += 1
+                self._condition.notify_all()
+        return written
+
+    def _token_count(self, turn: Dict) -> int:
+        """Token count of a pending turn, computed on first use; call it from a worker thread"""
+        if turn['token_count'] is None:
+            turn['token_count'] = count_tokens(turn['user_query']) + count_tokens(turn['gpt_response'])
+        return turn['token_count']
+
+    def _fit_pending(self, pending: List[Dict], token_budget: Optional[int],
+                     max_turns: Optional[int]) -> Tuple[List[Dict], Optional[int], Optional[int]]:
+        """Newest pending turns within the limits, and what is left of them"""
+        recent = []
+        for turn in reversed(pending):
+            if max_turns is not None and len(recent) >= max_turns:
+                break
+            if token_budget is not None and self._token_count(turn) > token_budget:
+                # Older turns must not skip over a turn that did not fit
+                token_budget = 0
+                break
+            recent.append(turn)
+            if token_budget is not None:
+                token_budget -= self._token_count(turn)
+        if max_turns is not None:
+            max_turns -= len(recent)
+        recent.reverse()
+        return recent, token_budget, max_turns
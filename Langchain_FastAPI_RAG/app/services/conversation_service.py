@@ -1,23 +1,46 @@
-from typing import List, Dict, Optional
+import asyncio
+import time
+from typing import List, Dict, Optional, AsyncIterator, Tuple
 import uuid
 from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
+from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnablePassthrough
+from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from app.services.vector_store_service import VectorStoreService
+from app.services.question_rewriter import QuestionRewriter
+from app.services.answer_cache import answer_cache
+from app.services.session_summarizer import SessionSummarizer
+from app.services.conversation_log_writer import ConversationLogWriter
+from app.services.reranker import create_reranker
 from app.database.sqlite_handler import SQLiteHandler
+from app.database.async_sqlite_handler import AsyncSQLiteHandler
+from app.utils.embedding_cache import CachedEmbeddings
 from app.config.settings import settings
 from app.utils.logger import setup_logger
+from app.utils.metrics import (
+    CHUNKS, CONVERSATION_SECONDS, CONVERSATION_STAGE_SECONDS, ERRORS, STREAM_FIRST_TOKEN_SECONDS, TOKENS, track_stage
+)
+from app.utils.tokens import count_in_background, count_tokens
 
 logger = setup_logger(__name__)
 
 class ConversationService:
-    def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4o-mini")
+    def __init__(self, llm: Optional[BaseChatModel] = None,
+                 vector_store_service: Optional[VectorStoreService] = None,
+                 db_handler: Optional[SQLiteHandler] = None):
+        self.model_name = settings.llm_model
+        self.llm = llm or ChatOpenAI(model=self.model_name)
         self.output_parser = StrOutputParser()
-        self.vector_store_service = VectorStoreService()
-        self.db_handler = SQLiteHandler()
+        self.vector_store_service = vector_store_service or VectorStoreService()
+        self.db_handler = db_handler or SQLiteHandler()
+        self.async_db_handler = AsyncSQLiteHandler(self.db_handler)
+        self.answer_cache = answer_cache
+        self.session_summarizer = SessionSummarizer(self.llm, self.db_handler)
+        self.log_writer = ConversationLogWriter(self.db_handler)
+        self.reranker = create_reranker()
         self._setup_chains()
 
     def _setup_chains(self):
@@ -32,17 +55,26 @@ class ConversationService:
                 "just reformulate it if needed and otherwise return it as is."
             )
 
+            # The rewrite prompt gets its own, smaller history window
             contextualize_q_prompt = ChatPromptTemplate.from_messages([
                 ("system", contextualize_q_system_prompt),
-                MessagesPlaceholder("chat_history"),
+                MessagesPlaceholder("rewrite_history"),
                 ("human", "{input}")
             ])
 
-            # Create history aware retriever
-            retriever = self.vector_store_service.get_retriever()
-            self.history_aware_retriever = create_history_aware_retriever(
-                self.llm, retriever, contextualize_q_prompt
-            )
+            # Create history aware retriever; the rewriter only calls the LLM
+            # when the question actually depends on the chat history, and the
+            # search only covers the partition of the calling user
+            self.question_rewriter = QuestionRewriter(self.llm, contextualize_q_prompt, history_key="rewrite_history")
+            self.history_aware_retriever = (
+                RunnablePassthrough.assign(
+                    standalone_question=RunnableLambda(
+                        self._rewrite,
+                        afunc=self._arewrite
+                    ).with_config(run_name="rewrite_question")
+                )
+                | RunnableLambda(self._retrieve, afunc=self._aretrieve).with_config(run_name="retrieve_documents")
+            ).with_config(run_name="chat_retriever_chain")
 
             # QA prompt
             qa_prompt = ChatPromptTemplate.from_messages([
@@ -52,8 +84,11 @@ class ConversationService:
                 ("human", "{input}")
             ])
 
-            # Create question answer chain
-            question_answer_chain = create_stuff_documents_chain(self.llm, qa_prompt)
+            # Create question answer chain, timed from prompt to last token
+            question_answer_chain = create_stuff_documents_chain(self.llm, qa_prompt).with_listeners(
+                on_end=self._observe_answer_generation,
+                on_error=lambda run: ERRORS.labels(stage='answer_generation').inc()
+            )
 
             # Create RAG chain
             self.rag_chain = create_retrieval_chain(
@@ -67,43 +102,59 @@ class ConversationService:
             logger.error(f"Error setting up conversation chains: {str(e)}")
             raise
 
-    def get_response(self, session_id: Optional[str], question: str, user_id: int) -> Dict:
-        """Get conversational response"""
+    async def get_response(self, session_id: Optional[str], question: str, user_id: int) -> Dict:
+        """Get conversational response without blocking the event loop
+
+        LLM calls go through ainvoke, the Chroma query runs in the retriever's
+        executor and the SQLite calls run in worker threads.
+        """
+        started = time.perf_counter()
         try:
             # Generate new session_id if not provided
             if session_id is None:
                 session_id = str(uuid.uuid4())
                 logger.info(f"Created new session: {session_id}")
 
-            # Get chat history
-            chat_history = self.db_handler.get_chat_history(session_id, user_id)
+            # Get the token-budgeted chat history of each prompt
+            with track_stage(CONVERSATION_STAGE_SECONDS, 'history_load'):
+                rewrite_history, chat_history = await self.async_db_handler.run(self._load_history, session_id, user_id)
             logger.info(f"Retrieved {len(chat_history)} messages for session: {session_id}, user: {user_id}")
 
-            # Get response from RAG chain
-            response = self.rag_chain.invoke({
-                "input": question,
-                "chat_history": chat_history
-            })
-
-            answer = response.get('answer', '')
-
-            # Extract source documents
-            sources = []
-            if 'context' in response:
-                for doc in response['context']:
-                    source = doc.metadata.get('source', '')
-                    if source and source not in sources:
-                        sources.append(source)
-
-            # Save conversation to database
-            self.db_handler.insert_conversation_log(
-                session_id=session_id,
-                user_query=question,
-                gpt_response=answer,
-                model="gpt-4o-mini",
-                user_id=user_id
-            )
+            # Serve repeated questions from the answer cache
+            cached, cache_entry = await self._check_answer_cache(question, chat_history, user_id)
+            if cached:
+                answer, sources = cached['answer'], cached['sources']
+            else:
+                # Get response from RAG chain
+                response = await self.rag_chain.ainvoke({
+                    "input": question,
+                    "chat_history": chat_history,
+                    "rewrite_history": rewrite_history,
+                    "session_id": session_id,
+                    "user_id": user_id
+                })
+
+                answer = response.get('answer', '')
+
+                # Extract source documents
+                sources = self._extract_sources(response.get('context', []))
+                self._count_tokens(question, chat_history, response.get('context', []), answer)
 
+                if cache_entry:
+                    self.answer_cache.store(user_id, *cache_entry, question, answer, sources)
+
+            # Save conversation to database (buffered in write-behind mode)
+            with track_stage(CONVERSATION_STAGE_SECONDS, 'log_insert'):
+                await self.log_writer.log(
+                    session_id=session_id,
+                    user_query=question,
+                    gpt_response=answer,
+                    model=self.model_name,
+                    user_id=user_id
+                )
+            self.session_summarizer.schedule(session_id, user_id)
+
+            CONVERSATION_SECONDS.labels(mode='invoke').observe(time.perf_counter() - started)
             logger.info(f"Generated response for session: {session_id}")
 
             return {
@@ -113,5 +164,211 @@ class ConversationService:
             }
 
         except Exception as e:
+            ERRORS.labels(stage='conversation').inc()
             logger.error(f"Error generating response: {str(e)}")
             raise
+
+    async def stream_response(self, session_id: Optional[str], question: str, user_id: int) -> AsyncIterator[Dict]:
+        """Stream a conversational response as events
+
+        Yields a 'sources' event once retrieval finishes, a 'token' event for
+        every answer chunk and a final 'done' event after the turn is logged.
+        """
+        started = time.perf_counter()
+        try:
+            # Generate new session_id if not provided
+            if session_id is None:
+                session_id = str(uuid.uuid4())
+                logger.info(f"Created new session: {session_id}")
+
+            with track_stage(CONVERSATION_STAGE_SECONDS, 'history_load'):
+                rewrite_history, chat_history = await self.async_db_handler.run(self._load_history, session_id, user_id)
+
+            cached, cache_entry = await self._check_answer_cache(question, chat_history, user_id)
+            if cached:
+                sources = cached['sources']
+                answer = cached['answer']
+                yield {'event': 'sources', 'data': {'sources': sources}}
+                STREAM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                yield {'event': 'token', 'data': {'token': answer}}
+            else:
+                sources = []
+                documents = []
+                answer_parts = []
+                async for chunk in self.rag_chain.astream({
+                    "input": question,
+                    "chat_history": chat_history,
+                    "rewrite_history": rewrite_history,
+                    "session_id": session_id,
+                    "user_id": user_id
+                }):
+                    if 'context' in chunk:
+                        documents = chunk['context']
+                        sources = self._extract_sources(documents)
+                        yield {'event': 'sources', 'data': {'sources': sources}}
+
+                    if 'answer' in chunk:
+                        if not answer_parts:
+                            STREAM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                        answer_parts.append(chunk['answer'])
+                        yield {'event': 'token', 'data': {'token': chunk['answer']}}
+
+                answer = ''.join(answer_parts)
+                self._count_tokens(question, chat_history, documents, answer)
+
+                if cache_entry:
+                    self.answer_cache.store(user_id, *cache_entry, question, answer, sources)
+
+            # Save the complete turn once the stream has finished
+            with track_stage(CONVERSATION_STAGE_SECONDS, 'log_insert'):
+                await self.log_writer.log(
+                    session_id=session_id,
+                    user_query=question,
+                    gpt_response=answer,
+                    model=self.model_name,
+                    user_id=user_id
+                )
+            self.session_summarizer.schedule(session_id, user_id)
+
+            CONVERSATION_SECONDS.labels(mode='stream').observe(time.perf_counter() - started)
+            logger.info(f"Streamed response for session: {session_id}")
+
+            yield {
+                'event': 'done',
+                'data': {
+                    'session_id': session_id,
+                    'question': question,
+                    'sources': sources
+                }
+            }
+
+        except Exception as e:
+            ERRORS.labels(stage='conversation').inc()
+            logger.error(f"Error streaming response: {str(e)}")
+            raise
+
+    def get_stats(self) -> Dict:
+        """Runtime counters of the conversation pipeline"""
+        return {
+            'question_rewrite': self.question_rewriter.get_stats(),
+            'answer_cache': self.answer_cache.stats(),
+            'session_summary': self.session_summarizer.get_stats(),
+            'conversation_log': self.log_writer.get_stats(),
+            'reranker': self.reranker.get_stats() if self.reranker else None,
+            'embedding_cache': (
+                self.vector_store_service.embedding_function.stats()
+                if isinstance(self.vector_store_service.embedding_function, CachedEmbeddings) else None
+            )
+        }
+
+    def _load_history(self, session_id: str, user_id: int) -> Tuple[List[Dict], List[Dict]]:
+        """Session summary plus the most recent unsummarized turns that fit
+        the rewrite and the answer token budgets"""
+        summary = self.session_summarizer.get_summary(session_id, user_id)
+        after_id = summary['SUMMARIZED_THROUGH_ID'] if summary else 0
+        summary_messages = [
+            {"role": "system", "content": f"Summary of the earlier conversation: {summary['SUMMARY']}"}
+        ] if summary else []
+
+        rewrite_history = self.log_writer.get_chat_history(
+            session_id, user_id,
+            token_budget=settings.rewrite_history_token_budget,
+            max_turns=settings.history_max_turns,
+            after_id=after_id
+        )
+        chat_history = self.log_writer.get_chat_history(
+            session_id, user_id,
+            token_budget=settings.answer_history_token_budget,
+            max_turns=settings.history_max_turns,
+            after_id=after_id
+        )
+        return summary_messages + rewrite_history, summary_messages + chat_history
+
+    async def _check_answer_cache(self, question: str, chat_history: List,
+                                  user_id: int) -> Tuple[Optional[Dict], Optional[Tuple]]:
+        """Look a question up in the answer cache
+
+        Only questions that can be answered without the chat history are
+        cached. Returns the cached answer (or None) and the (generation,
+        embedding) pair to store a freshly generated answer under.
+        """
+        if not self.answer_cache.enabled:
+            return None, None
+
+        if self.question_rewriter.needs_history(question, chat_history):
+            return None, None
+
+        generation = self.answer_cache.generation(user_id)
+        with track_stage(CONVERSATION_STAGE_SECONDS, 'answer_cache'):
+            embedding = await self.vector_store_service.embedding_function.aembed_query(question)
+            cached = self.answer_cache.lookup(user_id, embedding)
+        if cached:
+            logger.info(f"Answer cache hit for user: {user_id} (similarity: {cached['similarity']:.3f})")
+        return cached, (generation, embedding)
+
+    def _rewrite(self, inputs: Dict) -> str:
+        with track_stage(CONVERSATION_STAGE_SECONDS, 'question_rewrite'):
+            return self.question_rewriter.rewrite(inputs)
+
+    async def _arewrite(self, inputs: Dict) -> str:
+        with track_stage(CONVERSATION_STAGE_SECONDS, 'question_rewrite'):
+            return await self.question_rewriter.arewrite(inputs)
+
+    def _retrieve(self, inputs: Dict, config: RunnableConfig) -> List:
+        """Search the calling user's documents for the standalone question
+
+        With a reranker, rerank_fetch_k candidates are retrieved and only
+        the best rerank_top_n of them reach the prompt.
+        """
+        question = inputs['standalone_question']
+        k = settings.rerank_fetch_k if self.reranker else None
+        with track_stage(CONVERSATION_STAGE_SECONDS, 'retrieval'):
+            documents = self.vector_store_service.get_retriever(inputs['user_id'], k=k).invoke(question, config)
+        CHUNKS.labels(operation='retrieved').inc(len(documents))
+        if not self.reranker:
+            return documents
+
+        with track_stage(CONVERSATION_STAGE_SECONDS, 'rerank'):
+            return self.reranker.rerank(question, documents, settings.rerank_top_n)
+
+    async def _aretrieve(self, inputs: Dict, config: RunnableConfig) -> List:
+        question = inputs['standalone_question']
+        k = settings.rerank_fetch_k if self.reranker else None
+        with track_stage(CONVERSATION_STAGE_SECONDS, 'retrieval'):
+            documents = await self.vector_store_service.get_retriever(inputs['user_id'], k=k).ainvoke(question, config)
+        CHUNKS.labels(operation='retrieved').inc(len(documents))
+        if not self.reranker:
+            return documents
+
+        # Scoring is CPU work
+        with track_stage(CONVERSATION_STAGE_SECONDS, 'rerank'):
+            return await asyncio.to_thread(self.reranker.rerank, question, documents, settings.rerank_top_n)
+
+    def _observe_answer_generation(self, run):
+        """Listener recording how long the answer chain ran"""
+        CONVERSATION_STAGE_SECONDS.labels(stage='answer_generation').observe(
+            (run.end_time - run.start_time).total_seconds()
+        )
+
+    def _count_tokens(self, question: str, chat_history: List[Dict], documents: List, answer: str):
+        """Add the estimated tokens of a generated turn to rag_tokens_total
+
+        Tokenizing runs on the token-counting thread and is not awaited, so
+        it neither blocks the event loop nor delays the response.
+        """
+        count_in_background(self._add_token_counts, question, chat_history, documents, answer)
+
+    def _add_token_counts(self, question: str, chat_history: List[Dict], documents: List, answer: str):
+        TOKENS.labels(kind='question').inc(count_tokens(question))
+        TOKENS.labels(kind='history').inc(sum(count_tokens(message['content']) for message in chat_history))
+        TOKENS.labels(kind='context').inc(sum(count_tokens(document.page_content) for document in documents))
+        TOKENS.labels(kind='answer').inc(count_tokens(answer))
+
+    def _extract_sources(self, documents: List) -> List[str]:
+        """Unique source references of the retrieved documents, in order"""
+        sources = []
+        for doc in documents:
+            source = doc.metadata.get('source', '')
+            if source and source not in sources:
+                sources.append(source)
+        return sources
@@ -1,12 +1,18 @@
+import asyncio
+import os
 import uuid
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Callable
 from datetime import datetime
 from fastapi import UploadFile
-from app.utils.document_loader import DocumentLoader
+from app.utils.document_loader import DocumentLoader, UploadTooLargeError
+from app.utils.pagination import InvalidCursorError, decode_cursor, encode_cursor
 from app.services.vector_store_service import VectorStoreService
+from app.services.answer_cache import answer_cache
 from app.database.sqlite_handler import SQLiteHandler
+from app.database.async_sqlite_handler import AsyncSQLiteHandler
 from app.models.response_models import DocumentInfo
 from app.utils.logger import setup_logger
+from app.utils.metrics import ERRORS
 
 logger = setup_logger(__name__)
 
@@ -15,75 +21,157 @@ class DocumentService:
         self.document_loader = DocumentLoader()
         self.vector_store_service = VectorStoreService()
         self.db_handler = SQLiteHandler()
+        self.async_db_handler = AsyncSQLiteHandler(self.db_handler)
+        self.answer_cache = answer_cache
 
     async def add_document(self, file: UploadFile, user_id: int) -> Dict:
-        """Add a new document"""
+        """Add a new document, reusing an identical earlier upload of the same user"""
+        temp_file_path = None
         try:
-            document_id = str(uuid.uuid4())
+            # Save upload and hash its content
+            temp_file_path, content_hash = await self.document_loader.save_temp_file(file)
+
+            return await self.ingest_file(temp_file_path, file.filename, user_id, content_hash)
+
+        except UploadTooLargeError:
+            raise
+        except Exception as e:
+            logger.error(f"Error adding document {file.filename}: {str(e)}")
+            return {
+                'success': False,
+                'message': f'Error adding document: {str(e)}',
+                'document_info': None
+            }
+
+        finally:
+            # Clean up temp file
+            if temp_file_path and os.path.exists(temp_file_path):
+                os.unlink(temp_file_path)
+
+    async def ingest_file(self, file_path: str, filename: str, user_id: int, content_hash: str,
+                          progress: Optional[Callable[..., None]] = None,
+                          document_id: Optional[str] = None) -> Dict:
+        """Parse, split, embed and store a saved upload
+
+        Blocking steps run in worker threads. `progress` is called with
+        keyword counters (pages_parsed, total_chunks, chunks_embedded,
+        chunks_written) as ingestion advances. A document_id given by the
+        caller is used for the new document, so a retried job writes its
+        chunks under the same ID.
+        """
+        try:
+            duplicate = await self.async_db_handler.run(self.find_duplicate, user_id, content_hash, filename)
+            if duplicate:
+                return duplicate
+
+            document_id = document_id or str(uuid.uuid4())
 
             # Load and split document
-            splits, file_type = await self.document_loader.load_and_split_document(file)
+            splits, file_type = await self.document_loader.aload_and_split_file(file_path, filename, progress)
 
-            # Add to vector store
-            success = self.vector_store_service.add_documents(splits, document_id)
+            # Add to vector store in concurrent embedding batches
+            success = await self.vector_store_service.aadd_documents(splits, document_id, user_id, progress=progress)
             if not success:
                 raise Exception("Failed to add documents to vector store")
 
             # Save metadata to database
-            metadata_success = self.db_handler.insert_document_metadata(
+            metadata_success = await self.async_db_handler.insert_document_metadata(
                 document_id=document_id,
-                filename=file.filename,
+                filename=filename,
                 file_type=file_type,
                 chunk_count=len(splits),
-                user_id=user_id
+                user_id=user_id,
+                content_hash=content_hash
             )
 
             if not metadata_success:
                 # Try to clean up vector store if metadata save failed
-                self.vector_store_service.delete_documents(document_id)
+                await asyncio.to_thread(self.vector_store_service.delete_documents, document_id, user_id)
+
+                # A concurrent upload of the same content may have won the race
+                duplicate = await self.async_db_handler.run(self.find_duplicate, user_id, content_hash, filename)
+                if duplicate:
+                    return duplicate
                 raise Exception("Failed to save document metadata")
 
             document_info = DocumentInfo(
                 document_id=document_id,
-                filename=file.filename,
+                filename=filename,
                 file_type=file_type,
                 upload_timestamp=datetime.now(),
                 chunk_count=len(splits)
             )
 
-            logger.info(f"Successfully added document: {file.filename}")
+            # Cached answers no longer reflect the user's document set
+            self.answer_cache.invalidate_user(user_id)
+
+            logger.info(f"Successfully added document: {filename}")
 
             return {
                 'success': True,
-                'message': f'Document {file.filename} added successfully',
+                'message': f'Document {filename} added successfully',
                 'document_info': document_info
             }
 
         except Exception as e:
-            logger.error(f"Error adding document {file.filename}: {str(e)}")
+            ERRORS.labels(stage='ingestion').inc()
+            logger.error(f"Error adding document {filename}: {str(e)}")
             return {
                 'success': False,
                 'message': f'Error adding document: {str(e)}',
                 'document_info': None
             }
 
-    def get_document_list(self, user_id: int, limit: int = 10, offset: int = 0) -> Dict:
-        """Get list of documents for a specific user"""
+    def get_document_info(self, document_id: str, user_id: int) -> Optional[DocumentInfo]:
+        """Get metadata of a single document"""
+        doc_data = self.db_handler.get_document_metadata(document_id, user_id)
+        return self._to_document_info(doc_data) if doc_data else None
+
+    def find_duplicate(self, user_id: int, content_hash: str, filename: str) -> Optional[Dict]:
+        """Return an add-document result for an identical earlier upload, if any"""
+        existing = self.db_handler.get_document_by_hash(user_id, content_hash)
+        if not existing:
+            return None
+
+        logger.info(f"Skipping duplicate upload {filename}, same content as document: {existing['DOCUMENT_ID']}")
+        return {
+            'success': True,
+            'message': f'Document {filename} was already uploaded as {existing["FILENAME"]}',
+            'document_info': self._to_document_info(existing),
+            'duplicate': True
+        }
+
+    def _to_document_info(self, doc_data: Dict) -> DocumentInfo:
+        """Build DocumentInfo from a DOCUMENTS row"""
+        return DocumentInfo(
+            document_id=doc_data['DOCUMENT_ID'],
+            filename=doc_data['FILENAME'],
+            file_type=doc_data['FILE_TYPE'],
+            upload_timestamp=datetime.fromisoformat(doc_data['UPLOAD_TIMESTAMP']),
+            chunk_count=doc_data['CHUNK_COUNT']
+        )
+
+    def get_document_list(self, user_id: int, limit: int = 10, offset: int = 0,
+                          cursor: Optional[str] = None) -> Dict:
+        """Get list of documents for a specific user
+
+        Pages are newest first. Passing the next_cursor of the previous page
+        continues right after it without scanning the skipped rows; offset
+        is then ignored.
+        """
         try:
-            # Get documents from database - using updated signature
-            documents_data = self.db_handler.get_document_list(user_id, limit, offset)
-            total_count = self.db_handler.get_total_document_count(user_id)
-
-            documents = []
-            for doc_data in documents_data:
-                document_info = DocumentInfo(
-                    document_id=doc_data['DOCUMENT_ID'],
-                    filename=doc_data['FILENAME'],
-                    file_type=doc_data['FILE_TYPE'],
-                    upload_timestamp=datetime.fromisoformat(doc_data['UPLOAD_TIMESTAMP']),
-                    chunk_count=doc_data['CHUNK_COUNT']
-                )
-                documents.append(document_info)
+            after = decode_cursor(cursor) if cursor else None
+
+            # One extra row tells whether there is a next page
+            documents_data, total_count = self.db_handler.get_document_page(
+                user_id, limit + 1, 0 if after else offset, after
+            )
+            next_cursor = None
+            if len(documents_data) > limit:
+                documents_data = documents_data[:limit]
+                next_cursor = encode_cursor(documents_data[-1]['UPLOAD_TIMESTAMP'], documents_data[-1]['ID'])
+
+            documents = [self._to_document_info(doc_data) for doc_data in documents_data]
 
             logger.info(f"Retrieved {len(documents)} documents for user: {user_id}")
 
@@ -91,9 +179,12 @@ class DocumentService:
                 'success': True,
                 'message': f'Retrieved {len(documents)} documents',
                 'documents': documents,
-                'total_count': total_count
+                'total_count': total_count,
+                'next_cursor': next_cursor
             }
 
+        except InvalidCursorError:
+            raise
         except Exception as e:
             logger.error(f"Error retrieving document list: {str(e)}")
             return {
@@ -107,12 +198,13 @@ class DocumentService:
         """Delete a document"""
         try:
             # Delete from vector store
-            vector_success = self.vector_store_service.delete_documents(document_id)
+            vector_success = self.vector_store_service.delete_documents(document_id, user_id)
 
             # Delete metadata from database
             metadata_success = self.db_handler.delete_document_metadata(document_id, user_id)
 
             if vector_success or metadata_success:
+                self.answer_cache.invalidate_user(user_id)
                 logger.info(f"Successfully deleted document: {document_id}")
                 return {
                     'success': True,
@@ -133,3 +225,23 @@ class DocumentService:
                 'message': f'Error deleting document: {str(e)}',
                 'deleted_document_id': None
             }
+
+    def migrate_vector_partitions(self) -> Dict:
+        """Move chunks stored before per-user partitioning into their owners' collections"""
+        try:
+            document_owners = self.db_handler.get_document_owners()
+            return self.vector_store_service.migrate_shared_collection(document_owners)
+
+        except Exception as e:
+            logger.error(f"Error migrating vector store partitions: {str(e)}")
+            return {'migrated': 0, 'orphaned': 0}
+
+    def sync_lexical_index(self) -> int:
+        """Build the keyword index of users whose chunks predate hybrid search"""
+        try:
+            user_ids = sorted(set(self.db_handler.get_document_owners().values()))
+            return self.vector_store_service.backfill_lexical_index(user_ids)
+
+        except Exception as e:
+            logger.error(f"Error building keyword index: {str(e)}")
+            return 0
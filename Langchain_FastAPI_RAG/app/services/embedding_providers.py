@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Output sizes of the OpenAI embedding models, so startup needs no API call
+OPENAI_MODEL_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+
+class EmbeddingProviderMismatchError(RuntimeError):
+    """Raised when a collection was built by a different embedding provider or dimension"""
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic feature-hashing embedder for tests and benchmarks
+
+    Every word and adjacent word pair is hashed to a signed dimension and
+    the vector is L2-normalised. Needs no model or network, and the same
+    text always gets the same vector.
+    """
+
+    def __init__(self, dimensions: int = 384):
+        self.model_name = "feature-hashing"
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        words = TOKEN_PATTERN.findall(text.lower())
+        features = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'little')
+            vector[value % self.dimensions] += 1.0 if value >> 63 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+
+class LocalSentenceTransformerEmbeddings(Embeddings):
+    """sentence-transformers model loaded from a local path, run on CPU
+
+    Texts are encoded in batches of `batch_size`. The async methods run
+    inference on a dedicated thread pool, so the event loop keeps serving
+    requests while the model works; torch releases the GIL during the
+    forward pass.
+    """
+
+    def __init__(self, model_path: str, batch_size: int = 32, workers: int = 1, normalize: bool = True):
+        self.model_name = model_path
+        self.batch_size = batch_size
+        self.normalize = normalize
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="local-embed")
+
+    @property
+    def dimensions(self) -> int:
+        return self._get_model().get_sentence_embedding_dimension()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        vectors = self._get_model().encode(
+            texts,
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=self.normalize
+        )
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.embed_query, text)
+
+    def _get_model(self):
+        with self._model_lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError as e:
+                    raise RuntimeError("The local embedding provider requires the sentence-transformers package") from e
+                started = time.perf_counter()
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+                logger.info(f"Loaded embedding model from {self.model_name} in {time.perf_counter() - started:.1f} s")
+            return self._model
+
+
+def _create_openai() -> Embeddings:
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(
+        model=settings.openai_embedding_model,
+        check_embedding_ctx_length=settings.openai_embedding_check_ctx_length
+    )
+
+
+def _create_local() -> Embeddings:
+    if not settings.local_embedding_model_path:
+        raise ValueError("local_embedding_model_path must point to a local sentence-transformers model")
+    return LocalSentenceTransformerEmbeddings(
+        settings.local_embedding_model_path,
+        batch_size=settings.local_embedding_batch_size,
+        workers=settings.local_embedding_workers
+    )
+
+
+def _create_hashing() -> Embeddings:
+    return HashingEmbeddings(settings.hashing_embedding_dimensions)
+
+
+EMBEDDING_PROVIDERS: Dict[str, Callable[[], Embeddings]] = {
+    "openai": _create_openai,
+    "local": _create_local,
+    "hashing": _create_hashing,
+}
+
+
+def create_embeddings(name: Optional[str] = None) -> Embeddings:
+    """Embedding model of the provider selected by the `embedding_provider` setting"""
+    name = (name or settings.embedding_provider).lower()
+    factory = EMBEDDING_PROVIDERS.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown embedding provider: {name}")
+    embeddings = factory()
+    logger.info(f"Using the {name} embedding provider")
+    return embeddings
+
+
+def provider_name(embeddings: Embeddings) -> str:
+    """Registry name of an embedding model, or its class name if it is not a registered provider"""
+    if isinstance(embeddings, HashingEmbeddings):
+        return "hashing"
+    if isinstance(embeddings, LocalSentenceTransformerEmbeddings):
+        return "local"
+    if type(embeddings).__name__ == "OpenAIEmbeddings":
+        return "openai"
+    return type(embeddings).__name__
+
+
+def embedding_dimensions(embeddings: Embeddings) -> int:
+    """Length of the vectors an embedding model returns
+
+    Taken from the model's configuration where it is known; otherwise one
+    probe text is embedded.
+    """
+    dimensions = getattr(embeddings, 'dimensions', None)
+    if dimensions:
+        return int(dimensions)
+    known = OPENAI_MODEL_DIMENSIONS.get(getattr(embeddings, 'model', None))
+    if provider_name(embeddings) == "openai" and known:
+        return known
+    return len(embeddings.embed_query("dimension probe"))
@@ -0,0 +1,56 @@
+import asyncio
+from typing import Dict, List, Tuple
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from app.database.async_sqlite_handler import get_db_executor
+from app.database.lexical_index import LexicalIndex
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    """Merge ranked lists by summing 1 / (rrf_k + rank) per chunk
+
+    Chunks are identified by their document and text, so a chunk found by
+    both searches is counted once with both contributions.
+    """
+    scores: Dict[Tuple, float] = {}
+    documents: Dict[Tuple, Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = (document.metadata.get('document_id'), document.page_content)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, document)
+
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense vector search and BM25 keyword search over one user's chunks
+
+    Both searches fetch `fetch_k` candidates at the same time (the keyword
+    search on the SQLite threads) and the lists are merged with reciprocal
+    rank fusion, so exact matches on identifiers and names surface even
+    when their embeddings are not the closest.
+    """
+
+    vector_retriever: BaseRetriever
+    lexical_index: LexicalIndex
+    user_id: int
+    k: int
+    fetch_k: int
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        lexical = get_db_executor().submit(self.lexical_index.search, query, self.user_id, self.fetch_k)
+        dense = self.vector_retriever.invoke(query, config={'callbacks': run_manager.get_child()})
+        return reciprocal_rank_fusion([dense, lexical.result()], self.k, self.rrf_k)
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        loop = asyncio.get_running_loop()
+        dense, lexical = await asyncio.gather(
+            self.vector_retriever.ainvoke(query, config={'callbacks': run_manager.get_child()}),
+            loop.run_in_executor(get_db_executor(), self.lexical_index.search, query, self.user_id, self.fetch_k)
+        )
+        return reciprocal_rank_fusion([dense, lexical], self.k, self.rrf_k)
@@ -0,0 +1,249 @@
+import asyncio
+import os
+import uuid
+from typing import Dict, List, Optional, Set
+from fastapi import UploadFile
+from app.config.settings import settings
+from app.database.sqlite_handler import SQLiteHandler
+from app.database.async_sqlite_handler import AsyncSQLiteHandler
+from app.services.document_service import DocumentService
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class IngestionQueueFullError(Exception):
+    """Raised when the ingestion backlog is at its configured limit"""
+
+
+class IngestionService:
+    """Background document ingestion with a bounded in-process worker pool
+
+    Uploads are staged on disk and recorded in INGESTION_JOBS before they are
+    queued. Several processes may share the jobs table: a worker only runs a
+    job after claiming it with an atomic queued -> running update, and keeps
+    it running by refreshing UPDATED_AT as a lease. Running jobs whose lease
+    expired (their process died) are requeued by the periodic recovery pass.
+    Each job's document_id is stored with the job, so a retry first removes
+    the chunks of the interrupted attempt.
+
+    At most max_queue_size jobs are held per process, counting uploads being
+    staged, queued jobs and running jobs.
+    """
+
+    def __init__(self, document_service: DocumentService, db_handler: Optional[SQLiteHandler] = None):
+        self.document_service = document_service
+        self.db_handler = db_handler or SQLiteHandler()
+        self.async_db_handler = AsyncSQLiteHandler(self.db_handler)
+        self.staging_directory = settings.upload_staging_directory
+        self.worker_count = settings.ingestion_workers
+        self.max_queue_size = settings.ingestion_queue_max_size
+        self.lease_seconds = settings.ingestion_job_lease_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._recovery_task: Optional[asyncio.Task] = None
+        # Jobs queued or running in this process, plus uploads being staged
+        self._held: Set[str] = set()
+        self._staging = 0
+
+    async def start(self):
+        """Start the workers and the recovery pass for jobs of stopped or crashed processes"""
+        os.makedirs(self.staging_directory, exist_ok=True)
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"ingestion-worker-{index}")
+            for index in range(self.worker_count)
+        ]
+        self._recovery_task = asyncio.create_task(self._recover_periodically(), name="ingestion-recovery")
+        logger.info(f"Ingestion service started with {self.worker_count} workers")
+
+    async def stop(self):
+        """Stop the workers; interrupted jobs are released back to the queue"""
+        tasks = self._workers + ([self._recovery_task] if self._recovery_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._recovery_task = None
+        logger.info("Ingestion service stopped")
+
+    async def submit(self, file: UploadFile, user_id: int) -> Dict:
+        """Stage an upload and queue it for ingestion"""
+        if self._queue is None:
+            raise RuntimeError("Ingestion service is not running")
+        # Reserved before the first await, so concurrent submits cannot overshoot the limit
+        if self._free_slots() <= 0:
+            raise IngestionQueueFullError(f"Ingestion queue is full ({self.max_queue_size} pending jobs)")
+        self._staging += 1
+
+        try:
+            job_id = str(uuid.uuid4())
+            file_path, content_hash = await self.document_service.document_loader.save_temp_file(
+                file, directory=self.staging_directory
+            )
+
+            # Identical content is answered immediately without queueing
+            duplicate = await self.async_db_handler.run(self.document_service.find_duplicate, user_id, content_hash, file.filename)
+            if duplicate:
+                os.unlink(file_path)
+                await self.async_db_handler.create_ingestion_job(
+                    job_id, user_id, file.filename, file_path,
+                    content_hash, status='completed', document_id=duplicate['document_info'].document_id
+                )
+            else:
+                created = await self.async_db_handler.create_ingestion_job(
+                    job_id, user_id, file.filename, file_path,
+                    content_hash, document_id=str(uuid.uuid4())
+                )
+                if not created:
+                    os.unlink(file_path)
+                    raise Exception("Failed to create ingestion job")
+                self._enqueue(job_id)
+        finally:
+            self._staging -= 1
+
+        logger.info(f"Queued ingestion job {job_id} for {file.filename}, user: {user_id}")
+        return await self.async_db_handler.run(self.get_job, job_id, user_id)
+
+    def get_job(self, job_id: str, user_id: int) -> Optional[Dict]:
+        """Get status, progress and (once finished) the document of a job"""
+        job = self.db_handler.get_ingestion_job(job_id, user_id)
+        if not job:
+            return None
+
+        document_info = None
+        if job['STATUS'] == 'completed' and job['DOCUMENT_ID']:
+            document_info = self.document_service.get_document_info(job['DOCUMENT_ID'], user_id)
+
+        return {
+            'job_id': job['JOB_ID'],
+            'status': job['STATUS'],
+            'filename': job['FILENAME'],
+            'pages_parsed': job['PAGES_PARSED'],
+            'total_chunks': job['TOTAL_CHUNKS'],
+            'chunks_embedded': job['CHUNKS_EMBEDDED'],
+            'chunks_written': job['CHUNKS_WRITTEN'],
+            'document_info': document_info,
+            'error_message': job['ERROR_MESSAGE'],
+            'created_at': job['CREATED_AT'],
+            'updated_at': job['UPDATED_AT']
+        }
+
+    def _free_slots(self) -> int:
+        return self.max_queue_size - len(self._held) - self._staging
+
+    def _enqueue(self, job_id: str):
+        """Queue a job in a slot that was checked to be free"""
+        self._held.add(job_id)
+        self._queue.put_nowait(job_id)
+
+    async def _recover_periodically(self):
+        """Requeue jobs with an expired lease and pick up queued jobs no process is holding"""
+        while True:
+            try:
+                await self.async_db_handler.requeue_stale_ingestion_jobs(self.lease_seconds)
+                # Jobs queued in other live processes may be picked up here too; the claim runs each once
+                queued_jobs = [
+                    job for job in await self.async_db_handler.get_unfinished_ingestion_jobs()
+                    if job['STATUS'] == 'queued' and job['JOB_ID'] not in self._held
+                ]
+                picked_up = queued_jobs[:max(0, self._free_slots())]
+                for job in picked_up:
+                    self._enqueue(job['JOB_ID'])
+                if picked_up:
+                    logger.info(f"Picked up {len(picked_up)} queued ingestion jobs")
+            except Exception as e:
+                logger.error(f"Error recovering ingestion jobs: {str(e)}")
+
+            await asyncio.sleep(self.lease_seconds / 2)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                logger.error(f"Unexpected error in ingestion job {job_id}: {str(e)}")
+            finally:
+                self._held.discard(job_id)
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str):
+        attempt = await self.async_db_handler.claim_ingestion_job(job_id)
+        if attempt is None:
+            # Finished, or claimed by a worker of another process
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, attempt))
+        try:
+            await self._ingest_claimed_job(job_id, attempt)
+        except asyncio.CancelledError:
+            # Stopped mid-run: hand the job back instead of waiting for its lease to expire
+            await asyncio.to_thread(self.db_handler.release_ingestion_job, job_id, attempt)
+            raise
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job_id: str, attempt: int):
+        """Keep the lease of a running job well within ingestion_job_lease_seconds"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await self.async_db_handler.heartbeat_ingestion_job(job_id, attempt):
+                logger.warning(f"Ingestion job {job_id} lost its lease (attempt {attempt})")
+                return
+
+    async def _ingest_claimed_job(self, job_id: str, attempt: int):
+        job = await self.async_db_handler.get_ingestion_job(job_id)
+
+        if not os.path.exists(job['FILE_PATH']):
+            await self.async_db_handler.update_ingestion_job(
+                job_id,
+                status='failed', error_message='Staged upload is missing'
+            )
+            return
+
+        document_id = job['DOCUMENT_ID']
+        if not document_id:
+            # Queued before document IDs were assigned at submit time
+            document_id = str(uuid.uuid4())
+            await self.async_db_handler.update_ingestion_job(job_id, document_id=document_id)
+        elif attempt > 1:
+            # An earlier attempt was interrupted; it may have finished storing the document
+            document_info = await self.async_db_handler.run(
+                self.document_service.get_document_info, document_id, job['USER_ID']
+            )
+            if document_info:
+                await self.async_db_handler.update_ingestion_job(job_id, status='completed')
+                os.unlink(job['FILE_PATH'])
+                logger.info(f"Ingestion job {job_id} had already completed")
+                return
+            # Drop the chunks it wrote before starting over
+            await asyncio.to_thread(
+                self.document_service.vector_store_service.delete_documents, document_id, job['USER_ID']
+            )
+
+        def progress(**counters):
+            # Called from the ingestion worker threads
+            self.db_handler.update_ingestion_job(job_id, **counters)
+
+        result = await self.document_service.ingest_file(
+            job['FILE_PATH'], job['FILENAME'], job['USER_ID'], job['CONTENT_HASH'],
+            progress=progress, document_id=document_id
+        )
+
+        if result['success']:
+            await self.async_db_handler.update_ingestion_job(
+                job_id,
+                status='completed', document_id=result['document_info'].document_id
+            )
+            logger.info(f"Ingestion job {job_id} completed")
+        else:
+            await self.async_db_handler.update_ingestion_job(
+                job_id,
+                status='failed', error_message=result['message']
+            )
+            logger.error(f"Ingestion job {job_id} failed: {result['message']}")
+
+        if os.path.exists(job['FILE_PATH']):
+            os.unlink(job['FILE_PATH'])
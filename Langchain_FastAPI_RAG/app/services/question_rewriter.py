@@ -0,0 +1,144 @@
+import hashlib
+import json
+import re
+import threading
+from typing import Dict, List, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from app.config.settings import settings
+from app.utils.cache import TTLCache
+from app.utils.logger import setup_logger
+from app.utils.metrics import count_cache
+
+logger = setup_logger(__name__)
+
+# Words that usually point back into the conversation ("what about it?",
+# "and the second one?"); a question containing any of them gets rewritten.
+REFERENCE_WORDS = frozenset({
+    'it', 'its', "it's", 'this', 'that', 'these', 'those', 'they', 'them', 'their', 'theirs',
+    'he', 'him', 'his', 'she', 'her', 'hers', 'former', 'latter', 'above', 'previous',
+    'earlier', 'same', 'such', 'there', 'again', 'else', 'one', 'ones', 'other', 'another', 'more'
+})
+LEADING_FOLLOW_UP_WORDS = frozenset({'and', 'but', 'so', 'also', 'or', 'then'})
+# Openers that ask about something from an earlier turn ("what about the premium plan?")
+LEADING_FOLLOW_UP_PHRASES = (('what', 'about'), ('how', 'about'), ('what', 'if'), ('why', 'not'))
+
+
+class QuestionRewriter:
+    """History-aware question rewriting that avoids the LLM when it can
+
+    The LLM is skipped when there is no chat history, or, with
+    rewrite_skip_standalone on, when the question already stands on its own;
+    otherwise rewrites are memoized per (session, history tail, question).
+    The history is read from inputs[history_key].
+    """
+
+    def __init__(self, llm: BaseChatModel, prompt: ChatPromptTemplate, history_key: str = 'chat_history'):
+        self.rewrite_chain = prompt | llm | StrOutputParser()
+        self.history_key = history_key
+        self.cache = TTLCache(settings.rewrite_cache_size, settings.rewrite_cache_ttl_seconds)
+        self._counters = {
+            'llm_calls': 0,
+            'skipped_empty_history': 0,
+            'skipped_standalone': 0,
+            'cache_hits': 0
+        }
+        self._lock = threading.Lock()
+
+    def rewrite(self, inputs: Dict) -> str:
+        """Return a standalone version of inputs['input']"""
+        question, key = self._prepare(inputs)
+        if key is None:
+            return question
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._count('cache_hits')
+            count_cache('question_rewrite', hits=1)
+            return cached
+
+        count_cache('question_rewrite', misses=1)
+        rewritten = self.rewrite_chain.invoke(inputs)
+        self._count('llm_calls')
+        self.cache.set(key, rewritten)
+        return rewritten
+
+    async def arewrite(self, inputs: Dict) -> str:
+        """Async version of rewrite"""
+        question, key = self._prepare(inputs)
+        if key is None:
+            return question
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._count('cache_hits')
+            count_cache('question_rewrite', hits=1)
+            return cached
+
+        count_cache('question_rewrite', misses=1)
+        rewritten = await self.rewrite_chain.ainvoke(inputs)
+        self._count('llm_calls')
+        self.cache.set(key, rewritten)
+        return rewritten
+
+    def needs_history(self, question: str, chat_history: List) -> bool:
+        """Whether the question may depend on the chat history
+
+        Without rewrite_skip_standalone every question asked after the
+        first turn counts as a follow-up.
+        """
+        if not chat_history:
+            return False
+        return not (settings.rewrite_skip_standalone and self.is_standalone(question))
+
+    def is_standalone(self, question: str) -> bool:
+        """Heuristic: long enough and free of references to earlier turns"""
+        words = re.findall(r"[a-z']+", question.lower())
+        if len(words) < settings.rewrite_standalone_min_words:
+            return False
+        if words[0] in LEADING_FOLLOW_UP_WORDS or tuple(words[:2]) in LEADING_FOLLOW_UP_PHRASES:
+            return False
+        return not any(word in REFERENCE_WORDS for word in words)
+
+    def get_stats(self) -> Dict:
+        """Rewrite counters, including the number of LLM calls saved
+
+        A question without history never needed a rewrite, so only
+        standalone skips and memo hits count as saved calls.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+        counters['llm_calls_saved'] = counters['skipped_standalone'] + counters['cache_hits']
+        counters['cache'] = self.cache.stats()
+        return counters
+
+    def _prepare(self, inputs: Dict):
+        """Return (question, cache key); the key is None when no rewrite is needed"""
+        question = inputs['input']
+        chat_history = inputs.get(self.history_key) or []
+
+        if not chat_history:
+            self._count('skipped_empty_history')
+            return question, None
+
+        if not self.needs_history(question, chat_history):
+            self._count('skipped_standalone')
+            return question, None
+
+        return question, self._cache_key(inputs.get('session_id'), chat_history, question)
+
+    def _cache_key(self, session_id: Optional[str], chat_history: List, question: str) -> str:
+        """Hash of the session, the tail of its history and the question"""
+        tail = chat_history[-settings.rewrite_cache_history_messages:] if settings.rewrite_cache_history_messages > 0 else []
+        payload = json.dumps([session_id, [self._message_text(message) for message in tail], question])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _message_text(self, message) -> List[str]:
+        if isinstance(message, dict):
+            return [message.get('role', ''), message.get('content', '')]
+        return [getattr(message, 'type', ''), str(getattr(message, 'content', message))]
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
@@ -0,0 +1,137 @@
+import re
+import threading
+from abc import ABC, abstractmethod
+import time
+from typing import Dict, List, Optional
+from langchain_core.documents import Document
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class Reranker(ABC):
+    """Reorders retrieved chunks by relevance to the question
+
+    Subclasses implement score(); rerank() keeps the top_n chunks and
+    records how long scoring took, separately from retrieval.
+    """
+
+    name = "reranker"
+
+    def __init__(self):
+        self._counters = {'calls': 0, 'candidates': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0}
+        self._lock = threading.Lock()
+
+    def prepare(self):
+        """Load whatever scoring needs, so the first question does not pay for it"""
+
+    @abstractmethod
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """Relevance of each text to the query, higher is better"""
+
+    def rerank(self, query: str, documents: List[Document], top_n: int) -> List[Document]:
+        """The top_n documents by score; on failure the first top_n in retrieval order"""
+        if len(documents) <= 1:
+            return documents[:top_n]
+
+        try:
+            self.prepare()
+            started = time.perf_counter()
+            scores = self.score(query, [document.page_content for document in documents])
+        except Exception as e:
+            with self._lock:
+                self._counters['errors'] += 1
+            logger.error(f"Error reranking with {self.name}: {str(e)}")
+            return documents[:top_n]
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            self._counters['calls'] += 1
+            self._counters['candidates'] += len(documents)
+            self._counters['total_ms'] += elapsed_ms
+            self._counters['max_ms'] = max(self._counters['max_ms'], elapsed_ms)
+            self._counters['last_ms'] = elapsed_ms
+        logger.info(f"Reranked {len(documents)} chunks with {self.name} in {elapsed_ms:.1f} ms")
+
+        # Stable, so equal scores keep the retrieval order
+        order = sorted(range(len(documents)), key=lambda index: scores[index], reverse=True)
+        return [documents[index] for index in order[:top_n]]
+
+    def get_stats(self) -> Dict:
+        """Call counters and scoring latency"""
+        with self._lock:
+            stats = dict(self._counters)
+        stats['name'] = self.name
+        stats['avg_ms'] = stats['total_ms'] / stats['calls'] if stats['calls'] else 0.0
+        return stats
+
+
+class TermOverlapReranker(Reranker):
+    """Fraction of the question's words that occur in the chunk; needs no model"""
+
+    name = "term_overlap"
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        query_terms = set(WORD_PATTERN.findall(query.lower()))
+        if not query_terms:
+            return [0.0] * len(texts)
+        return [len(query_terms & set(WORD_PATTERN.findall(text.lower()))) / len(query_terms) for text in texts]
+
+
+class CrossEncoderReranker(Reranker):
+    """sentence-transformers cross-encoder loaded from a local path, run on CPU
+
+    All (question, chunk) pairs are scored in one batched forward pass.
+    The model is loaded by prepare() at startup, or on first use.
+    """
+
+    name = "cross_encoder"
+
+    def __init__(self, model_path: str, batch_size: int = 32, max_length: int = 512):
+        super().__init__()
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    def prepare(self):
+        self._get_model()
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        scores = self._get_model().predict(
+            [(query, text) for text in texts],
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True
+        )
+        return scores.tolist()
+
+    def _get_model(self):
+        with self._model_lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+                except ImportError as e:
+                    raise RuntimeError("The cross_encoder reranker requires the sentence-transformers package") from e
+                started = time.perf_counter()
+                self._model = CrossEncoder(self.model_path, device="cpu", max_length=self.max_length)
+                logger.info(f"Loaded cross-encoder from {self.model_path} in {time.perf_counter() - started:.1f} s")
+            return self._model
+
+
+def create_reranker(name: Optional[str] = None) -> Optional[Reranker]:
+    """Reranker selected by the `reranker` setting; None when reranking is off"""
+    name = (name or settings.reranker).lower()
+    if name in ("", "none"):
+        return None
+    if name == TermOverlapReranker.name:
+        return TermOverlapReranker()
+    if name == CrossEncoderReranker.name:
+        if not settings.reranker_model_path:
+            raise ValueError("reranker_model_path must point to a local cross-encoder model")
+        return CrossEncoderReranker(settings.reranker_model_path, settings.rerank_batch_size)
+    raise ValueError(f"Unknown reranker: {name}")
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from langchain_core.language_models import BaseChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from app.config.settings import settings
+from app.database.sqlite_handler import SQLiteHandler
+from app.database.async_sqlite_handler import AsyncSQLiteHandler
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class SessionSummarizer:
+    """Rolling per-session summaries, updated in the background
+
+    Once a session has `session_summary_batch_turns` turns that are older
+    than its `session_summary_recent_turns` newest ones and not yet
+    summarized, those turns are folded into the stored summary with one
+    LLM call. Prompts then carry the summary plus the unsummarized turns.
+    """
+
+    def __init__(self, llm: BaseChatModel, db_handler: SQLiteHandler):
+        self.db_handler = db_handler
+        self.async_db_handler = AsyncSQLiteHandler(db_handler)
+        self.summary_chain = ChatPromptTemplate.from_messages([
+            ("system",
+             "You maintain a running summary of a conversation between a user and an AI assistant. "
+             "Extend the existing summary with the new turns. Keep facts, names, numbers and open "
+             "questions the user may refer back to. Reply with the updated summary only, in at most "
+             "{max_words} words."),
+            ("human", "Existing summary:\n{summary}\n\nNew turns:\n{turns}")
+        ]) | llm | StrOutputParser()
+        self._in_flight: Set[Tuple[str, int]] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._counters = {'updates': 0, 'turns_folded': 0, 'errors': 0}
+        self._lock = threading.Lock()
+
+    def get_summary(self, session_id: str, user_id: int) -> Optional[Dict]:
+        """Stored summary row of a session, if any"""
+        if not settings.session_summary_enabled:
+            return None
+        return self.db_handler.get_session_summary(session_id, user_id)
+
+    def schedule(self, session_id: str, user_id: int):
+        """Update the session summary in a background task"""
+        if not settings.session_summary_enabled:
+            return
+
+        key = (session_id, user_id)
+        if key in self._in_flight:
+            # The running update will be followed by another turn soon enough
+            return
+
+        self._in_flight.add(key)
+        task = asyncio.create_task(self.update(session_id, user_id))
+        self._tasks.add(task)
+        task.add_done_callback(lambda done: (self._tasks.discard(done), self._in_flight.discard(key)))
+
+    async def update(self, session_id: str, user_id: int) -> bool:
+        """Fold old enough turns into the summary; returns True if it changed"""
+        try:
+            stored = await self.async_db_handler.get_session_summary(session_id, user_id)
+            previous_through_id = stored['SUMMARIZED_THROUGH_ID'] if stored else 0
+
+            turns = await self.async_db_handler.get_turns_to_summarize(
+                session_id, user_id, previous_through_id, settings.session_summary_recent_turns
+            )
+            if len(turns) < settings.session_summary_batch_turns:
+                return False
+
+            summary = await self.summary_chain.ainvoke({
+                "summary": stored['SUMMARY'] if stored else "(none)",
+                "turns": self._format_turns(turns),
+                "max_words": settings.session_summary_max_words
+            })
+
+            saved = await self.async_db_handler.save_session_summary(
+                session_id, user_id, summary.strip(), turns[-1]['ID'], previous_through_id
+            )
+            if saved:
+                self._count('updates')
+                self._count('turns_folded', len(turns))
+                logger.info(f"Folded {len(turns)} turns into the summary of session: {session_id}")
+            return saved
+
+        except Exception as e:
+            self._count('errors')
+            logger.error(f"Error updating summary of session {session_id}: {str(e)}")
+            return False
+
+    async def drain(self):
+        """Wait for running summary updates"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict:
+        """Summary update counters"""
+        with self._lock:
+            counters = dict(self._counters)
+        counters['in_flight'] = len(self._in_flight)
+        return counters
+
+    def _format_turns(self, turns: List[Dict]) -> str:
+        return "\n".join(
+            f"User: {turn['USER_QUERY']}\nAssistant: {turn['GPT_RESPONSE']}" for turn in turns
+        )
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] += amount
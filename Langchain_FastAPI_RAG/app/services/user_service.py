@@ -1,10 +1,13 @@
 import secrets
+import threading
 from typing import Optional, Dict
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 from app.database.sqlite_handler import SQLiteHandler
+from app.database.async_sqlite_handler import AsyncSQLiteHandler
 from app.config.settings import settings
+from app.utils.cache import TTLCache
+from app.utils.password_hasher import PasswordHasherBusyError, get_password_hasher
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -12,18 +15,22 @@ logger = setup_logger(__name__)
 class UserService:
     def __init__(self):
         self.db_handler = SQLiteHandler()
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self.async_db_handler = AsyncSQLiteHandler(self.db_handler)
+        self.password_hasher = get_password_hasher()
+        self.pwd_context = self.password_hasher.pwd_context
         # Use a secret key from settings
         self.secret_key = settings.secret_key
         self.algorithm = "HS256"
         self.access_token_expire_minutes = settings.access_token_expire_minutes
+        # Active users by ID, so authenticated requests skip the database
+        self.user_cache = TTLCache(settings.user_cache_size, settings.user_cache_ttl_seconds)
 
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        """Verify a password against its hash"""
+        """Verify a password against its hash (blocking; request handlers use password_hasher)"""
         return self.pwd_context.verify(plain_password, hashed_password)
 
     def get_password_hash(self, password: str) -> str:
-        """Hash a password"""
+        """Hash a password (blocking; request handlers use password_hasher)"""
         return self.pwd_context.hash(password)
 
     def create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None):
@@ -43,24 +50,25 @@ class UserService:
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
             user_id: int = payload.get("sub")
-            if user_id is None:
+            if user_id is None or payload.get("type") == "reset":
+                # Reset tokens only work for resetting the password
                 return None
             return {"user_id": int(user_id)}
         except JWTError:
             return None
 
-    def register_user(self, username: str, email: str, password: str) -> Dict:
+    async def register_user(self, username: str, email: str, password: str) -> Dict:
         """Register a new user"""
         try:
             # Check if user already exists
-            existing_user = self.db_handler.get_user_by_username(username)
+            existing_user = await self.async_db_handler.get_user_by_username(username)
             if existing_user:
                 return {
                     'success': False,
                     'message': 'Username already exists'
                 }
 
-            existing_email = self.db_handler.get_user_by_email(email)
+            existing_email = await self.async_db_handler.get_user_by_email(email)
             if existing_email:
                 return {
                     'success': False,
@@ -68,11 +76,11 @@ class UserService:
                 }
 
             # Hash password and create user
-            password_hash = self.get_password_hash(password)
-            user_id = self.db_handler.create_user(username, email, password_hash)
+            password_hash = await self.password_hasher.hash(password)
+            user_id = await self.async_db_handler.create_user(username, email, password_hash)
 
             if user_id:
-                user_data = self.db_handler.get_user_by_id(user_id)
+                user_data = await self.async_db_handler.get_user_by_id(user_id)
                 logger.info(f"User registered successfully: {username}")
                 return {
                     'success': True,
@@ -90,6 +98,8 @@ class UserService:
                     'message': 'Failed to create user'
                 }
 
+        except PasswordHasherBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error registering user: {str(e)}")
             return {
@@ -97,10 +107,10 @@ class UserService:
                 'message': f'Registration failed: {str(e)}'
             }
 
-    def authenticate_user(self, username: str, password: str) -> Dict:
+    async def authenticate_user(self, username: str, password: str) -> Dict:
         """Authenticate user and return login response"""
         try:
-            user_data = self.db_handler.get_user_by_username(username)
+            user_data = await self.async_db_handler.get_user_by_username(username)
             
             if not user_data:
                 return {
@@ -108,12 +118,18 @@ class UserService:
                     'message': 'Invalid username or password'
                 }
 
-            if not self.verify_password(password, user_data['PASSWORD_HASH']):
+            valid, new_hash = await self.password_hasher.verify_and_update(password, user_data['PASSWORD_HASH'])
+            if not valid:
                 return {
                     'success': False,
                     'message': 'Invalid username or password'
                 }
 
+            if new_hash:
+                # The bcrypt cost factor changed since this hash was made
+                await self.async_db_handler.update_user_password(user_data['ID'], new_hash)
+                logger.info(f"Rehashed password of user: {username}")
+
             # Create access token
             access_token_expires = timedelta(minutes=self.access_token_expire_minutes)
             access_token = self.create_access_token(
@@ -135,6 +151,8 @@ class UserService:
                 'token_type': 'bearer'
             }
 
+        except PasswordHasherBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error authenticating user: {str(e)}")
             return {
@@ -143,26 +161,43 @@ class UserService:
             }
 
     def get_current_user(self, token: str) -> Optional[Dict]:
-        """Get current user from token"""
+        """Get current user from token
+
+        The JWT is verified locally and active users are served from a TTL
+        cache, so the common case needs no database round-trip.
+        """
         try:
             token_data = self.verify_token(token)
             if not token_data:
                 return None
 
-            user_data = self.db_handler.get_user_by_id(token_data["user_id"])
+            user_id = token_data["user_id"]
+            user = self.user_cache.get(user_id)
+            if user is not None:
+                return user
+
+            user_data = self.db_handler.get_user_by_id(user_id)
             if user_data:
-                return {
+                user = {
                     'user_id': user_data['ID'],
                     'username': user_data['USERNAME'],
                     'email': user_data['EMAIL'],
                     'created_at': user_data['CREATED_AT']
                 }
+                self.user_cache.set(user_id, user)
+                return user
             return None
 
         except Exception as e:
             logger.error(f"Error getting current user: {str(e)}")
             return None
 
+    def deactivate_user(self, user_id: int) -> bool:
+        """Deactivate a user; their tokens stop working immediately in this process"""
+        success = self.db_handler.set_user_active(user_id, False)
+        self.user_cache.pop(user_id)
+        return success
+
     def create_reset_token(self, email: str) -> Optional[str]:
         """Create a password reset token for an email"""
         try:
@@ -187,7 +222,7 @@ class UserService:
             logger.error(f"Error creating reset token: {str(e)}")
             return None
 
-    def reset_password(self, token: str, new_password: str) -> Dict:
+    async def reset_password(self, token: str, new_password: str) -> Dict:
         """Reset password using reset token"""
         try:
             # Verify reset token
@@ -202,19 +237,20 @@ class UserService:
                 }
 
             # Check if token exists in database
-            if not self.db_handler.verify_reset_token(int(user_id), token):
+            if not await self.async_db_handler.verify_reset_token(int(user_id), token):
                 return {
                     'success': False,
                     'message': 'Invalid or expired reset token'
                 }
 
             # Hash new password and update
-            password_hash = self.get_password_hash(new_password)
-            success = self.db_handler.update_user_password(int(user_id), password_hash)
+            password_hash = await self.password_hasher.hash(new_password)
+            success = await self.async_db_handler.update_user_password(int(user_id), password_hash)
             
             if success:
+                self.user_cache.pop(int(user_id))
                 # Delete the used reset token
-                self.db_handler.delete_reset_token(int(user_id), token)
+                await self.async_db_handler.delete_reset_token(int(user_id), token)
                 logger.info(f"Password reset successfully for user ID: {user_id}")
                 return {
                     'success': True,
@@ -231,9 +267,24 @@ class UserService:
                 'success': False,
                 'message': 'Invalid or expired reset token'
             }
+        except PasswordHasherBusyError:
+            raise
         except Exception as e:
             logger.error(f"Error resetting password: {str(e)}")
             return {
                 'success': False,
                 'message': f'Password reset failed: {str(e)}'
-            }
\ No newline at end of file
+            }
+
+
+_user_service: Optional[UserService] = None
+_user_service_lock = threading.Lock()
+
+
+def get_user_service() -> UserService:
+    """Process-wide UserService shared by the endpoints and the auth dependency"""
+    global _user_service
+    with _user_service_lock:
+        if _user_service is None:
+            _user_service = UserService()
+        return _user_service
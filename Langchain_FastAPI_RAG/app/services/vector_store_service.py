@@ -1,45 +1,183 @@
+import asyncio
+import random
+import threading
+import time
 import uuid
-from typing import List, Optional
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+import chromadb
+from chromadb.errors import NotFoundError
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
 from app.config.settings import settings
+from app.database.lexical_index import LexicalIndex
+from app.services.embedding_providers import (
+    EmbeddingProviderMismatchError, create_embeddings, embedding_dimensions, provider_name
+)
+from app.services.hybrid_retriever import HybridRetriever
+from app.utils.embedding_cache import CachedEmbeddings, get_embedding_cache_store
 from app.utils.logger import setup_logger
+from app.utils.metrics import CHUNKS, ERRORS, INGESTION_STAGE_SECONDS, TOKENS
+from app.utils.tokens import count_in_background, count_tokens
 
 logger = setup_logger(__name__)
 
+
+class EmptyRetriever(BaseRetriever):
+    """Retriever for a user who has no collection yet"""
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return []
+
+
 class VectorStoreService:
-    def __init__(self):
-        self.embedding_function = OpenAIEmbeddings()
+    def __init__(self, embedding_function: Optional[Embeddings] = None):
+        embedding_function = embedding_function or create_embeddings()
+        self.embedding_provider = embedding_function
+        if settings.embedding_cache_enabled:
+            # Every embedding call goes through the content-addressed cache
+            embedding_function = CachedEmbeddings(embedding_function, get_embedding_cache_store())
+        self.embedding_function = embedding_function
         self.collection_name = settings.chroma_collection_name
         self.persist_directory = settings.chroma_persist_directory
-        self._vector_store = None
+        self._user_stores: "OrderedDict[int, Chroma]" = OrderedDict()
+        self._user_stores_lock = threading.Lock()
+        self.lexical_index = LexicalIndex() if settings.hybrid_search_enabled else None
+        self._embedding_metadata: Optional[Dict] = None
+        self._embedding_metadata_lock = threading.Lock()
+
+    def user_collection_name(self, user_id: int) -> str:
+        """Name of the collection that holds a user's chunks"""
+        return f"{self.collection_name}_user_{user_id}"
+
+    def get_user_store(self, user_id: int, create: bool = True) -> Optional[Chroma]:
+        """Lazily open the vector store partition of a user
+
+        Every user's chunks live in their own collection, so a query only
+        searches the caller's corpus. The most recently used
+        `vector_store_cache_size` stores stay open. With create=False a user
+        without a collection gets None instead of a new, empty collection.
+        """
+        with self._user_stores_lock:
+            store = self._user_stores.get(user_id)
+            if store is not None:
+                self._user_stores.move_to_end(user_id)
+                return store
+
+        # Opened outside the lock, so a slow open does not block other users' lookups
+        try:
+            store = Chroma(
+                collection_name=self.user_collection_name(user_id),
+                embedding_function=self.embedding_function,
+                persist_directory=self.persist_directory,
+                collection_metadata=self.embedding_metadata,
+                create_collection_if_not_exists=create
+            )
+            self._check_collection(store._collection)
+        except NotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Error initializing vector store: {str(e)}")
+            raise
+
+        with self._user_stores_lock:
+            # Another thread may have opened the same store meanwhile
+            existing = self._user_stores.get(user_id)
+            if existing is not None:
+                self._user_stores.move_to_end(user_id)
+                return existing
+
+            self._user_stores[user_id] = store
+            while len(self._user_stores) > max(1, settings.vector_store_cache_size):
+                self._user_stores.popitem(last=False)
+            logger.info(f"Vector store initialized for user: {user_id}")
+            return store
 
     @property
-    def vector_store(self) -> Chroma:
-        """Lazy initialization of vector store"""
-        if self._vector_store is None:
+    def embedding_metadata(self) -> Dict:
+        """Provider, model and dimension recorded on the collections this service creates"""
+        with self._embedding_metadata_lock:
+            if self._embedding_metadata is None:
+                self._embedding_metadata = {
+                    'embedding_provider': provider_name(self.embedding_provider),
+                    'embedding_model': str(getattr(self.embedding_provider, 'model_name', None)
+                                           or getattr(self.embedding_provider, 'model', None) or ''),
+                    'embedding_dimensions': embedding_dimensions(self.embedding_provider)
+                }
+            return self._embedding_metadata
+
+    def verify_embedding_provider(self) -> int:
+        """Check every collection against the configured embedding provider
+
+        Collections created before provider tracking are stamped with the
+        current provider when their stored vectors have its dimension.
+        Raises EmbeddingProviderMismatchError naming every collection that
+        was built by another provider or with another dimension; returns the
+        number of collections checked.
+        """
+        client = chromadb.PersistentClient(path=self.persist_directory)
+        problems = []
+        checked = 0
+        for collection in client.list_collections():
+            if not collection.name.startswith(self.collection_name):
+                continue
+            checked += 1
             try:
-                self._vector_store = Chroma(
-                    collection_name=self.collection_name,
-                    embedding_function=self.embedding_function,
-                    persist_directory=self.persist_directory
+                self._check_collection(collection)
+            except EmbeddingProviderMismatchError as e:
+                problems.append(str(e))
+
+        if problems:
+            raise EmbeddingProviderMismatchError(
+                f"{len(problems)} collection(s) do not match the configured embedding provider; "
+                f"re-embed them or switch embedding_provider back: " + "; ".join(problems)
+            )
+        logger.info(f"Verified {checked} collections against embedding provider {self.embedding_metadata['embedding_provider']} "
+                    f"({self.embedding_metadata['embedding_dimensions']} dimensions)")
+        return checked
+
+    def _check_collection(self, collection):
+        """Raise if a collection was built by another provider; stamp it if it predates tracking"""
+        expected = self.embedding_metadata
+        metadata = collection.metadata or {}
+        if 'embedding_provider' not in metadata:
+            stored = collection.peek(1)['embeddings']
+            if stored is not None and len(stored) and len(stored[0]) != expected['embedding_dimensions']:
+                raise EmbeddingProviderMismatchError(
+                    f"{collection.name} holds {len(stored[0])}-dimensional vectors, "
+                    f"the {expected['embedding_provider']} provider returns {expected['embedding_dimensions']}"
                 )
-                logger.info("Vector store initialized successfully")
-            except Exception as e:
-                logger.error(f"Error initializing vector store: {str(e)}")
-                raise
-        return self._vector_store
+            collection.modify(metadata={**metadata, **expected})
+            logger.info(f"Recorded embedding provider {expected['embedding_provider']} on collection {collection.name}")
+            return
 
-    def add_documents(self, documents: List[Document], document_id: str) -> bool:
-        """Add documents to vector store"""
+        if (metadata['embedding_provider'] != expected['embedding_provider']
+                or metadata.get('embedding_dimensions') != expected['embedding_dimensions']):
+            raise EmbeddingProviderMismatchError(
+                f"{collection.name} was built by {metadata['embedding_provider']} "
+                f"({metadata.get('embedding_dimensions')} dimensions), the configured provider is "
+                f"{expected['embedding_provider']} ({expected['embedding_dimensions']} dimensions)"
+            )
+        if metadata.get('embedding_model') != expected['embedding_model']:
+            logger.warning(f"Collection {collection.name} was built with model {metadata.get('embedding_model')}, "
+                           f"now using {expected['embedding_model']}")
+
+    def add_documents(self, documents: List[Document], document_id: str, user_id: int) -> bool:
+        """Add documents to the user's vector store"""
         try:
-            # Add document_id to metadata for each chunk
+            # Add document_id and owner to metadata for each chunk
             for doc in documents:
                 doc.metadata['document_id'] = document_id
+                doc.metadata['user_id'] = user_id
 
             # Add documents to vector store
-            self.vector_store.add_documents(documents)
+            self.get_user_store(user_id).add_documents(documents)
+            if self.lexical_index and not self.lexical_index.add_documents(documents, document_id, user_id):
+                self.delete_documents(document_id, user_id)
+                return False
             logger.info(f"Added {len(documents)} documents to vector store with ID: {document_id}")
             return True
 
@@ -47,11 +185,132 @@ class VectorStoreService:
             logger.error(f"Error adding documents to vector store: {str(e)}")
             return False
 
-    def delete_documents(self, document_id: str) -> bool:
-        """Delete documents from vector store by document_id"""
+    async def aadd_documents(self, documents: List[Document], document_id: str, user_id: int,
+                             progress: Optional[Callable[..., None]] = None) -> bool:
+        """Embed chunks in concurrent batches and write each batch once it is embedded
+
+        At most `embedding_concurrency` batches of `embedding_batch_size`
+        chunks are embedded at a time; rate-limited calls are retried with
+        exponential backoff. `progress` is called from a worker thread with
+        the running chunks_embedded / chunks_written counts. If any batch
+        fails or the call is cancelled, the other batches are cancelled and
+        everything written is removed.
+        """
+        writes: List[asyncio.Future] = []
         try:
+            # Add document_id and owner to metadata for each chunk
+            for doc in documents:
+                doc.metadata['document_id'] = document_id
+                doc.metadata['user_id'] = user_id
+
+            batch_size = max(1, settings.embedding_batch_size)
+            batches = [documents[start:start + batch_size] for start in range(0, len(documents), batch_size)]
+            semaphore = asyncio.Semaphore(max(1, settings.embedding_concurrency))
+            counters = {'chunks_embedded': 0, 'chunks_written': 0}
+            stage_seconds = {'embed': 0.0, 'vector_write': 0.0}
+            progress_lock = asyncio.Lock()
+
+            async def report(counter: str, count: int):
+                # Serialized so the reported counts never go backwards
+                async with progress_lock:
+                    counters[counter] += count
+                    if progress:
+                        await asyncio.to_thread(progress, **{counter: counters[counter]})
+
+            async def process_batch(batch: List[Document]):
+                async with semaphore:
+                    started = time.perf_counter()
+                    embeddings = await self._embed_with_backoff([doc.page_content for doc in batch])
+                    stage_seconds['embed'] += time.perf_counter() - started
+                await report('chunks_embedded', len(batch))
+
+                started = time.perf_counter()
+                # Shielded: a cancelled batch cannot stop its upsert thread, so cleanup waits for it
+                write = asyncio.ensure_future(asyncio.to_thread(self._write_batch, user_id, batch, embeddings))
+                writes.append(write)
+                await asyncio.shield(write)
+                stage_seconds['vector_write'] += time.perf_counter() - started
+                await report('chunks_written', len(batch))
+
+            # The first failing batch cancels the rest before the group exits
+            async with asyncio.TaskGroup() as batch_group:
+                for batch in batches:
+                    batch_group.create_task(process_batch(batch))
+            if self.lexical_index:
+                started = time.perf_counter()
+                if not await asyncio.to_thread(self.lexical_index.add_documents, documents, document_id, user_id):
+                    raise RuntimeError("Keyword indexing failed")
+                stage_seconds['keyword_index'] = time.perf_counter() - started
+
+            for stage, seconds in stage_seconds.items():
+                INGESTION_STAGE_SECONDS.labels(stage=stage).observe(seconds)
+            CHUNKS.labels(operation='ingested').inc(len(documents))
+            count_in_background(self._count_embedded_tokens, documents)
+            logger.info(f"Added {len(documents)} documents in {len(batches)} batches to vector store with ID: {document_id}")
+            return True
+
+        except Exception as e:
+            if isinstance(e, ExceptionGroup):
+                e = e.exceptions[0]
+            ERRORS.labels(stage='vector_store').inc()
+            logger.error(f"Error adding documents to vector store: {str(e)}")
+            await self._discard_written(writes, document_id, user_id)
+            return False
+
+        except asyncio.CancelledError:
+            logger.warning(f"Adding documents with ID {document_id} was cancelled")
+            await self._discard_written(writes, document_id, user_id)
+            raise
+
+    async def _discard_written(self, writes: List[asyncio.Future], document_id: str, user_id: int):
+        """Remove batches that were already written, once no upsert is in flight"""
+        await asyncio.gather(*writes, return_exceptions=True)
+        await asyncio.to_thread(self.delete_documents, document_id, user_id)
+
+    async def _embed_with_backoff(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch, backing off exponentially (with jitter) on rate limits"""
+        for attempt in range(settings.embedding_max_retries + 1):
+            try:
+                return await self.embedding_function.aembed_documents(texts)
+            except Exception as e:
+                if attempt == settings.embedding_max_retries or not self._is_rate_limit_error(e):
+                    raise
+                delay = min(
+                    settings.embedding_backoff_max_seconds,
+                    settings.embedding_backoff_base_seconds * (2 ** attempt)
+                ) * (0.5 + random.random() / 2)
+                logger.warning(f"Embedding rate limited, retrying in {delay:.2f}s (attempt {attempt + 1})")
+                await asyncio.sleep(delay)
+
+    def _is_rate_limit_error(self, error: Exception) -> bool:
+        status_code = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+        return status_code == 429 or type(error).__name__ == 'RateLimitError'
+
+    def _write_batch(self, user_id: int, documents: List[Document], embeddings: List[List[float]]):
+        """Write pre-computed embeddings straight to the user's Chroma collection"""
+        self.get_user_store(user_id)._collection.upsert(
+            ids=[str(uuid.uuid4()) for _ in documents],
+            embeddings=embeddings,
+            documents=[doc.page_content for doc in documents],
+            metadatas=[doc.metadata for doc in documents]
+        )
+
+    def _count_embedded_tokens(self, documents: List[Document]):
+        TOKENS.labels(kind='embedded').inc(sum(count_tokens(doc.page_content) for doc in documents))
+
+    def delete_documents(self, document_id: str, user_id: int) -> bool:
+        """Delete documents from the user's vector store by document_id"""
+        try:
+            if self.lexical_index:
+                self.lexical_index.delete_documents(document_id, user_id)
+
+            vector_store = self.get_user_store(user_id, create=False)
+            if vector_store is None:
+                logger.warning(f"No documents found with ID: {document_id}")
+                return False
+
             # Get all documents with the specified document_id
-            results = self.vector_store.get(
+            results = vector_store.get(
                 where={"document_id": document_id}
             )
 
@@ -60,7 +319,7 @@ class VectorStoreService:
                 return False
 
             # Delete documents by their IDs
-            self.vector_store.delete(ids=results['ids'])
+            vector_store.delete(ids=results['ids'])
             logger.info(f"Deleted {len(results['ids'])} documents with ID: {document_id}")
             return True
 
@@ -68,11 +327,15 @@ class VectorStoreService:
             logger.error(f"Error deleting documents from vector store: {str(e)}")
             return False
 
-    def get_document_list(self) -> List[dict]:
-        """Get list of documents in vector store"""
+    def get_document_list(self, user_id: int) -> List[dict]:
+        """Get list of documents in the user's vector store"""
         try:
+            vector_store = self.get_user_store(user_id, create=False)
+            if vector_store is None:
+                return []
+
             # Get all documents
-            results = self.vector_store.get()
+            results = vector_store.get()
 
             # Group by document_id
             document_groups = {}
@@ -96,20 +359,136 @@ class VectorStoreService:
             logger.error(f"Error retrieving document list from vector store: {str(e)}")
             return []
 
-    def get_retriever(self):
-        """Get retriever for similarity search"""
-        return self.vector_store.as_retriever(
-            search_kwargs={"k": settings.similarity_search_k}
+    def get_retriever(self, user_id: int, k: Optional[int] = None):
+        """Get retriever returning the k best chunks of the user's documents
+
+        With hybrid search enabled, vector and keyword hits are fused;
+        otherwise it is a plain similarity search.
+        """
+        k = k or settings.similarity_search_k
+        vector_store = self.get_user_store(user_id, create=False)
+        if vector_store is None:
+            # Nothing uploaded yet, so neither search can find anything
+            return EmptyRetriever()
+        if not self.lexical_index:
+            return vector_store.as_retriever(
+                search_kwargs={"k": k}
+            )
+        fetch_k = max(k, settings.hybrid_fetch_k)
+        return HybridRetriever(
+            vector_retriever=vector_store.as_retriever(search_kwargs={"k": fetch_k}),
+            lexical_index=self.lexical_index,
+            user_id=user_id,
+            k=k,
+            fetch_k=fetch_k,
+            rrf_k=settings.rrf_k
         )
 
-    def similarity_search(self, query: str, k: Optional[int] = None) -> List[Document]:
-        """Perform similarity search"""
+    def similarity_search(self, query: str, user_id: int, k: Optional[int] = None) -> List[Document]:
+        """Perform similarity search over the user's documents"""
         try:
             k = k or settings.similarity_search_k
-            results = self.vector_store.similarity_search(query, k=k)
+            vector_store = self.get_user_store(user_id, create=False)
+            results = vector_store.similarity_search(query, k=k) if vector_store else []
             logger.info(f"Similarity search returned {len(results)} results for query: {query[:50]}...")
             return results
 
         except Exception as e:
             logger.error(f"Error performing similarity search: {str(e)}")
             return []
+
+    def migrate_shared_collection(self, document_owners: Dict[str, int], batch_size: int = 500) -> Dict:
+        """Move chunks of the shared collection into per-user collections
+
+        Chunks are copied with their stored embeddings (nothing is re-embedded)
+        to the collection of the user that owns their document_id; chunks whose
+        document has no owner go to a `<collection>_orphaned` collection. The
+        shared collection is dropped once every chunk is copied, so later starts
+        have nothing to scan. Safe to run again after an interruption, since
+        copies are upserts.
+        """
+        client = chromadb.PersistentClient(path=self.persist_directory)
+        if self.collection_name not in [collection.name for collection in client.list_collections()]:
+            return {'migrated': 0, 'orphaned': 0}
+
+        shared = client.get_collection(self.collection_name)
+        orphaned_collection = None
+        migrated, orphaned = 0, 0
+        offset = 0
+        while True:
+            batch = shared.get(include=['embeddings', 'documents', 'metadatas'], limit=batch_size, offset=offset)
+            if not batch['ids']:
+                break
+            offset += len(batch['ids'])
+
+            # Group the batch by owner; chunks without one are set aside under None
+            by_user: Dict[Optional[int], List[int]] = {}
+            for index, metadata in enumerate(batch['metadatas']):
+                user_id = document_owners.get((metadata or {}).get('document_id'))
+                by_user.setdefault(user_id, []).append(index)
+
+            for user_id, indexes in by_user.items():
+                ids = [batch['ids'][index] for index in indexes]
+                if user_id is None:
+                    if orphaned_collection is None:
+                        orphaned_collection = client.get_or_create_collection(
+                            f"{self.collection_name}_orphaned", metadata=shared.metadata
+                        )
+                    target, metadatas = orphaned_collection, [batch['metadatas'][index] for index in indexes]
+                    orphaned += len(ids)
+                else:
+                    target = self.get_user_store(user_id)._collection
+                    metadatas = [{**batch['metadatas'][index], 'user_id': user_id} for index in indexes]
+                    migrated += len(ids)
+                target.upsert(
+                    ids=ids,
+                    embeddings=[batch['embeddings'][index] for index in indexes],
+                    documents=[batch['documents'][index] for index in indexes],
+                    metadatas=metadatas
+                )
+
+        # Every chunk has been copied, so later starts find nothing to scan
+        client.delete_collection(self.collection_name)
+
+        if orphaned:
+            logger.warning(f"{orphaned} chunks without owner moved to collection {self.collection_name}_orphaned")
+        logger.info(f"Migrated {migrated} chunks to per-user collections")
+        return {'migrated': migrated, 'orphaned': orphaned}
+
+    def backfill_lexical_index(self, user_ids: List[int], batch_size: int = 500) -> int:
+        """Index the chunks of users whose keyword index is still empty
+
+        Covers chunks stored before hybrid search existed (and migrated
+        ones). Returns the number of chunks indexed.
+        """
+        if not self.lexical_index:
+            return 0
+
+        indexed = 0
+        for user_id in user_ids:
+            if self.lexical_index.has_documents(user_id):
+                continue
+            vector_store = self.get_user_store(user_id, create=False)
+            if vector_store is None:
+                continue
+            collection = vector_store._collection
+            offset = 0
+            while True:
+                batch = collection.get(include=['documents', 'metadatas'], limit=batch_size, offset=offset)
+                if not batch['ids']:
+                    break
+                offset += len(batch['ids'])
+
+                by_document: Dict[str, List[Document]] = {}
+                for text, metadata in zip(batch['documents'], batch['metadatas']):
+                    metadata = metadata or {}
+                    by_document.setdefault(metadata.get('document_id', 'unknown'), []).append(
+                        Document(page_content=text, metadata=metadata)
+                    )
+                for document_id, documents in by_document.items():
+                    if self.lexical_index.add_documents(documents, document_id, user_id):
+                        indexed += len(documents)
+
+        if indexed:
+            logger.info(f"Backfilled the keyword index with {indexed} chunks")
+        return indexed
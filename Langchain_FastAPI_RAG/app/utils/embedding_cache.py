@@ -0,0 +1,257 @@
+import asyncio
+import hashlib
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from app.config.settings import settings
+from app.database.sqlite_handler import PooledConnection, get_connection_pool
+from app.utils.logger import setup_logger
+from app.utils.metrics import count_cache
+
+logger = setup_logger(__name__)
+
+
+def to_float32(vector: List[float]) -> List[float]:
+    """Round a vector to the precision it is stored with, so hits and misses agree"""
+    return array('f', vector).tolist()
+
+
+class EmbeddingCacheStore:
+    """Persistent, size-bounded embedding store keyed by (model, sha256 of text)
+
+    Vectors are stored as float32 blobs. When the store grows past
+    max_entries the least recently used tenth is evicted in one statement.
+    Recency is coarse: a hit only rewrites LAST_USED_AT once it is older than
+    embedding_cache_touch_interval_seconds, so most hits stay read-only. The
+    entry count is re-read from the table every
+    embedding_cache_count_interval_seconds, or before evicting, since other
+    processes sharing the file insert and evict too.
+    """
+
+    def __init__(self, db_name: str, max_entries: int):
+        self.db_name = db_name
+        self.max_entries = max_entries
+        self.touch_interval_seconds = settings.embedding_cache_touch_interval_seconds
+        self.count_interval_seconds = settings.embedding_cache_count_interval_seconds
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._init_database()
+
+    def _get_connection(self) -> PooledConnection:
+        """Borrow a pooled database connection; close() returns it to the pool"""
+        return get_connection_pool(self.db_name).acquire()
+
+    def _init_database(self):
+        """Create the cache table"""
+        conn = self._get_connection()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS EMBEDDING_CACHE (
+                    MODEL TEXT NOT NULL,
+                    TEXT_HASH TEXT NOT NULL,
+                    EMBEDDING BLOB NOT NULL,
+                    LAST_USED_AT REAL NOT NULL,
+                    PRIMARY KEY (MODEL, TEXT_HASH)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS IDX_EMBEDDING_CACHE_LAST_USED ON EMBEDDING_CACHE (LAST_USED_AT)')
+            conn.commit()
+            self._entry_count = self._count_entries(conn)
+            self._counted_at = time.monotonic()
+            logger.info(f"Embedding cache initialized with {self._entry_count} entries")
+        finally:
+            conn.close()
+
+    def get_many(self, model: str, text_hashes: List[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for the given hashes and refresh stale LRU timestamps"""
+        if not text_hashes:
+            return {}
+
+        conn = self._get_connection()
+        try:
+            found = {}
+            stale = []
+            now = time.time()
+            unique_hashes = list(dict.fromkeys(text_hashes))
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f'SELECT TEXT_HASH, EMBEDDING, LAST_USED_AT FROM EMBEDDING_CACHE '
+                    f'WHERE MODEL = ? AND TEXT_HASH IN ({placeholders})',
+                    (model, *batch)
+                ).fetchall()
+                for text_hash, blob, last_used_at in rows:
+                    found[text_hash] = array('f', blob).tolist()
+                    if now - last_used_at >= self.touch_interval_seconds:
+                        stale.append(text_hash)
+
+            if stale:
+                conn.executemany(
+                    'UPDATE EMBEDDING_CACHE SET LAST_USED_AT = ? WHERE MODEL = ? AND TEXT_HASH = ?',
+                    [(now, model, text_hash) for text_hash in stale]
+                )
+                conn.commit()
+
+            hits = sum(1 for text_hash in text_hashes if text_hash in found)
+            with self._lock:
+                self.hits += hits
+                self.misses += len(text_hashes) - hits
+            count_cache('embedding', hits=hits, misses=len(text_hashes) - hits)
+            return found
+        finally:
+            conn.close()
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]) -> None:
+        """Store vectors and evict least recently used entries beyond max_entries"""
+        if not vectors:
+            return
+
+        conn = self._get_connection()
+        try:
+            now = time.time()
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO EMBEDDING_CACHE (MODEL, TEXT_HASH, EMBEDDING, LAST_USED_AT) VALUES (?, ?, ?, ?)',
+                [(model, text_hash, array('f', vector).tobytes(), now) for text_hash, vector in vectors.items()]
+            )
+            inserted = conn.total_changes - before
+
+            with self._lock:
+                self._entry_count += inserted
+                recount = (self._entry_count > self.max_entries
+                           or time.monotonic() - self._counted_at >= self.count_interval_seconds)
+
+            if recount:
+                # Counted inside the insert transaction, so it includes other processes' writes
+                entry_count = self._count_entries(conn)
+                excess = entry_count - self.max_entries
+                evicted = 0
+                if excess > 0:
+                    # Evict down to 90% so eviction does not run on every insert
+                    excess += self.max_entries // 10
+                    before = conn.total_changes
+                    conn.execute(
+                        'DELETE FROM EMBEDDING_CACHE WHERE rowid IN '
+                        '(SELECT rowid FROM EMBEDDING_CACHE ORDER BY LAST_USED_AT LIMIT ?)',
+                        (excess,)
+                    )
+                    evicted = conn.total_changes - before
+                with self._lock:
+                    self._entry_count = entry_count - evicted
+                    self._counted_at = time.monotonic()
+                    self.evictions += evicted
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _count_entries(self, conn: PooledConnection) -> int:
+        return conn.execute('SELECT COUNT(*) FROM EMBEDDING_CACHE').fetchone()[0]
+
+    def stats(self) -> Dict:
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': self._entry_count,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends texts missing from the cache to the model
+
+    Query embeddings are kept under a separate key namespace, since some
+    models embed queries differently from documents.
+    """
+
+    def __init__(self, underlying: Embeddings, store: EmbeddingCacheStore, model_name: Optional[str] = None):
+        self.underlying = underlying
+        self.store = store
+        self.model_name = model_name or self._default_model_name(underlying)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [self._hash(text) for text in texts]
+        found = self.store.get_many(self.model_name, hashes)
+        missing = self._missing_texts(texts, hashes, found)
+        if missing:
+            computed = self.underlying.embed_documents(list(missing.values()))
+            new_vectors = {text_hash: to_float32(vector) for text_hash, vector in zip(missing.keys(), computed)}
+            self.store.put_many(self.model_name, new_vectors)
+            found.update(new_vectors)
+        return [found[text_hash] for text_hash in hashes]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [self._hash(text) for text in texts]
+        found = await asyncio.to_thread(self.store.get_many, self.model_name, hashes)
+        missing = self._missing_texts(texts, hashes, found)
+        if missing:
+            computed = await self.underlying.aembed_documents(list(missing.values()))
+            new_vectors = {text_hash: to_float32(vector) for text_hash, vector in zip(missing.keys(), computed)}
+            await asyncio.to_thread(self.store.put_many, self.model_name, new_vectors)
+            found.update(new_vectors)
+        return [found[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        text_hash = self._hash(text)
+        found = self.store.get_many(self._query_model_name, [text_hash])
+        if text_hash in found:
+            return found[text_hash]
+        vector = to_float32(self.underlying.embed_query(text))
+        self.store.put_many(self._query_model_name, {text_hash: vector})
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        text_hash = self._hash(text)
+        found = await asyncio.to_thread(self.store.get_many, self._query_model_name, [text_hash])
+        if text_hash in found:
+            return found[text_hash]
+        vector = to_float32(await self.underlying.aembed_query(text))
+        await asyncio.to_thread(self.store.put_many, self._query_model_name, {text_hash: vector})
+        return vector
+
+    def stats(self) -> Dict:
+        """Counters of the shared cache store"""
+        return self.store.stats()
+
+    @property
+    def _query_model_name(self) -> str:
+        return f"{self.model_name}|query"
+
+    def _missing_texts(self, texts: List[str], hashes: List[str], found: Dict[str, List[float]]) -> Dict[str, str]:
+        """Unique texts without a cached vector, keyed by hash"""
+        return {text_hash: text for text_hash, text in zip(hashes, texts) if text_hash not in found}
+
+    def _hash(self, text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _default_model_name(self, underlying: Embeddings) -> str:
+        parts = [type(underlying).__name__]
+        for attribute in ('model', 'model_name', 'dimensions', 'size'):
+            value = getattr(underlying, attribute, None)
+            if value:
+                parts.append(str(value))
+        return ':'.join(parts)
+
+
+_stores: Dict[str, EmbeddingCacheStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_embedding_cache_store() -> EmbeddingCacheStore:
+    """Shared cache store for the configured database file"""
+    with _stores_lock:
+        store = _stores.get(settings.embedding_cache_db_name)
+        if store is None:
+            store = EmbeddingCacheStore(settings.embedding_cache_db_name, settings.embedding_cache_max_entries)
+            _stores[settings.embedding_cache_db_name] = store
+        return store
@@ -0,0 +1,118 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+# Spans sub-millisecond SQLite reads up to slow LLM answers and large uploads
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONVERSATION_STAGE_SECONDS = Histogram(
+    'rag_conversation_stage_seconds',
+    'Seconds spent in each stage of a conversation turn',
+    ['stage'],
+    buckets=STAGE_BUCKETS
+)
+CONVERSATION_SECONDS = Histogram(
+    'rag_conversation_seconds',
+    'Seconds per conversation turn, from request to logged answer',
+    ['mode'],
+    buckets=STAGE_BUCKETS
+)
+STREAM_FIRST_TOKEN_SECONDS = Histogram(
+    'rag_stream_first_token_seconds',
+    'Seconds from a streaming request to its first answer token',
+    buckets=STAGE_BUCKETS
+)
+INGESTION_STAGE_SECONDS = Histogram(
+    'rag_ingestion_stage_seconds',
+    'Seconds per ingested document spent in each stage, summed over parse workers and embedding batches',
+    ['stage'],
+    buckets=STAGE_BUCKETS
+)
+TOKENS = Counter(
+    'rag_tokens_total',
+    'Estimated tokens by kind (question, history, context, answer, embedded)',
+    ['kind']
+)
+CHUNKS = Counter(
+    'rag_chunks_total',
+    'Document chunks by operation (ingested, retrieved)',
+    ['operation']
+)
+CACHE_REQUESTS = Counter(
+    'rag_cache_requests_total',
+    'Cache lookups by cache and result (hit, miss)',
+    ['cache', 'result']
+)
+ERRORS = Counter(
+    'rag_errors_total',
+    'Failures by stage',
+    ['stage']
+)
+
+
+class ComponentStatsCollector(Collector):
+    """Exposes the get_stats() counters of registered components as rag_component_stats{component,stat}
+
+    A source returns {component: {stat: value}}; nested dicts are flattened
+    to dotted stat names and non-numeric values are skipped. Values are read
+    at scrape time, so the components keep their own locks and counters.
+    """
+
+    def __init__(self):
+        self._sources: List[Callable[[], Dict]] = []
+
+    def register(self, source: Callable[[], Dict]):
+        self._sources.append(source)
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        family = GaugeMetricFamily(
+            'rag_component_stats',
+            'Runtime counters of conversation pipeline components (rewrite, caches, summaries, log writer, reranker)',
+            labels=['component', 'stat']
+        )
+        for source in self._sources:
+            for component, stats in source().items():
+                for stat, value in _flatten(stats or {}):
+                    family.add_metric([component, stat], float(value))
+        yield family
+
+
+def _flatten(stats: Dict, prefix: str = '') -> Iterator[Tuple[str, float]]:
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)):
+            yield f"{prefix}{key}", value
+
+
+COMPONENT_STATS = ComponentStatsCollector()
+REGISTRY.register(COMPONENT_STATS)
+
+
+@contextmanager
+def track_stage(histogram: Histogram, stage: str):
+    """Observe the duration of a block under `stage`; failures are also counted in rag_errors_total"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.labels(stage=stage).inc()
+        raise
+    finally:
+        histogram.labels(stage=stage).observe(time.perf_counter() - started)
+
+
+def count_cache(cache: str, hits: int = 0, misses: int = 0):
+    """Record cache hits and misses"""
+    if hits:
+        CACHE_REQUESTS.labels(cache=cache, result='hit').inc(hits)
+    if misses:
+        CACHE_REQUESTS.labels(cache=cache, result='miss').inc(misses)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with its content type"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,27 @@
+import base64
+import binascii
+import json
+from typing import Tuple
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor was not issued by this API"""
+
+
+def encode_cursor(upload_timestamp: str, row_id: int) -> str:
+    """Opaque cursor for the position right after a document"""
+    payload = json.dumps([upload_timestamp, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """(UPLOAD_TIMESTAMP, ID) a cursor points after"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        upload_timestamp, row_id = json.loads(payload)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursorError("Invalid pagination cursor") from e
+
+    if not isinstance(upload_timestamp, str) or not isinstance(row_id, int):
+        raise InvalidCursorError("Invalid pagination cursor")
+    return upload_timestamp, row_id
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+from passlib.context import CryptContext
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class PasswordHasherBusyError(Exception):
+    """Raised when too many password operations are already waiting"""
+
+
+class PasswordHasher:
+    """bcrypt hashing and verification on a small dedicated thread pool
+
+    bcrypt releases the GIL, so a few threads keep password work off the
+    event loop without a process pool. At most `max_pending` operations may
+    be queued or running; beyond that callers get PasswordHasherBusyError
+    instead of an ever-growing backlog.
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hasher")
+        self._pending = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    async def hash(self, password: str) -> str:
+        """Hash a password with the configured cost factor"""
+        return await self._run(self.pwd_context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password; also return a new hash if the stored one uses an outdated cost factor"""
+        return await self._run(self.pwd_context.verify_and_update, password, hashed_password)
+
+    def stats(self) -> Dict:
+        """Queue depth and rejection counters"""
+        with self._lock:
+            return {'pending': self._pending, 'max_pending': self.max_pending, 'rejected': self._rejected}
+
+    async def _run(self, func: Callable, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordHasherBusyError("Too many authentication requests, please retry shortly")
+            self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+_password_hasher: Optional[PasswordHasher] = None
+_password_hasher_lock = threading.Lock()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Process-wide password hasher"""
+    global _password_hasher
+    with _password_hasher_lock:
+        if _password_hasher is None:
+            _password_hasher = PasswordHasher(
+                settings.password_hash_workers, settings.password_hash_max_pending, settings.bcrypt_rounds
+            )
+        return _password_hasher
+
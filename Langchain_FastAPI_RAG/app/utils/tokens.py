@@ -0,0 +1,80 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Rough characters per token for English text, used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+_count_executor: Optional[ThreadPoolExecutor] = None
+_count_executor_lock = threading.Lock()
+
+
+def _get_encoding():
+    """tiktoken encoding of the configured model, or None if it cannot be loaded"""
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            _encoding_loaded = True
+            try:
+                import tiktoken
+                try:
+                    _encoding = tiktoken.encoding_for_model(settings.llm_model)
+                except KeyError:
+                    _encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                # tiktoken downloads its vocabularies on first use
+                logger.warning(f"tiktoken unavailable, estimating tokens from length: {str(e)}")
+                _encoding = None
+        return _encoding
+
+
+def load_encoding() -> bool:
+    """Load the tokenizer now (blocking), so no request pays for it; False if it is unavailable"""
+    return _get_encoding() is not None
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """Number of tokens in text for the configured chat model"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_in_background(func: Callable[..., None], *args) -> Future:
+    """Run a token-counting metrics callback on a dedicated thread
+
+    Callers do not wait for it, so it never delays a response; its own
+    thread keeps tokenizing off the default executor. Failures are logged.
+    """
+    global _count_executor
+    with _count_executor_lock:
+        if _count_executor is None:
+            _count_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="token-counter")
+        future = _count_executor.submit(func, *args)
+    future.add_done_callback(_log_count_failure)
+    return future
+
+
+def shutdown_count_executor():
+    """Finish pending token counts and stop their thread"""
+    global _count_executor
+    with _count_executor_lock:
+        if _count_executor is not None:
+            _count_executor.shutdown(wait=True)
+            _count_executor = None
+
+
+def _log_count_failure(future: Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Token counting failed: {str(future.exception())}")
@@ -0,0 +1,54 @@
+from typing import Iterable
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.config.settings import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class UploadSizeLimitMiddleware:
+    """Reject oversized upload bodies before they are spooled
+
+    A Content-Length above the limit is answered with 413 without reading
+    the body; a body without one is cut off with 413 as soon as it grows
+    past the limit. The limit is max_upload_size_bytes plus
+    upload_multipart_overhead_bytes for the multipart framing; the exact
+    per-file check stays in DocumentLoader.save_temp_file.
+    """
+
+    def __init__(self, app: ASGIApp, paths: Iterable[str]):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or scope['path'] not in self.paths or settings.max_upload_size_bytes <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        max_body_size = settings.max_upload_size_bytes + settings.upload_multipart_overhead_bytes
+        detail = f"Upload exceeds the maximum upload size of {settings.max_upload_size_bytes} bytes"
+
+        content_length = Headers(scope=scope).get('content-length', '')
+        if content_length.isdigit() and int(content_length) > max_body_size:
+            logger.warning(f"Rejected upload to {scope['path']}: Content-Length {content_length}")
+            response = JSONResponse({'detail': detail}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > max_body_size:
+                    logger.warning(f"Rejected upload to {scope['path']}: body exceeds {max_body_size} bytes")
+                    # Re-raised by FastAPI's body parsing and rendered as a 413
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
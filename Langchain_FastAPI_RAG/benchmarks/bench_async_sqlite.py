@@ -0,0 +1,126 @@
+"""p99 latency of SQLite access under mixed read/write load from async code
+
+Concurrent tasks issue a mix of get_chat_history (70%), insert_conversation_log
+(20%) and get_user_by_id (10%) while other tasks keep the default executor
+busy, the way Chroma queries and embedding calls do in the app. Three ways
+of calling the database are compared:
+
+    blocking   SQLiteHandler called directly on the event loop
+    to_thread  SQLiteHandler via asyncio.to_thread (shares the default executor)
+    async      AsyncSQLiteHandler (dedicated SQLite threads)
+
+A probe also records how late a 10 ms asyncio.sleep wakes up (event loop lag).
+
+    python -m benchmarks.bench_async_sqlite --tasks 32 --duration 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+
+from benchmarks.common import use_temp_workspace, summarize_latencies
+
+use_temp_workspace()
+
+from app.config.settings import settings  # noqa: E402
+from app.database.async_sqlite_handler import AsyncSQLiteHandler  # noqa: E402
+from app.database.sqlite_handler import SQLiteHandler  # noqa: E402
+
+SESSIONS = 200
+
+
+def seed(handler: SQLiteHandler, turns: int) -> int:
+    user_id = handler.create_user("bench", "bench@example.com", "not-a-real-hash")
+    for session in range(SESSIONS):
+        for turn in range(turns):
+            handler.insert_conversation_log(f"session-{session}", user_id, f"question {turn}",
+                                            f"answer {turn} " * 20, "bench")
+    return user_id
+
+
+def make_call(mode: str, handler: SQLiteHandler, async_handler: AsyncSQLiteHandler):
+    async def call(method: str, *args):
+        if mode == 'blocking':
+            result = getattr(handler, method)(*args)
+            # A request handler returns to the loop between queries
+            await asyncio.sleep(0)
+            return result
+        if mode == 'to_thread':
+            return await asyncio.to_thread(getattr(handler, method), *args)
+        return await getattr(async_handler, method)(*args)
+    return call
+
+
+async def db_worker(call, user_id: int, stop: asyncio.Event, latencies: dict):
+    while not stop.is_set():
+        roll = random.random()
+        started = time.perf_counter()
+        if roll < 0.7:
+            op = 'get_chat_history'
+            await call(op, f"session-{random.randrange(SESSIONS)}", user_id)
+        elif roll < 0.9:
+            op = 'insert_conversation_log'
+            await call(op, str(uuid.uuid4()), user_id, "question", "answer " * 20, "bench")
+        else:
+            op = 'get_user_by_id'
+            await call(op, user_id)
+        latencies[op].append(time.perf_counter() - started)
+
+
+async def executor_noise(stop: asyncio.Event, busy_seconds: float):
+    while not stop.is_set():
+        await asyncio.to_thread(time.sleep, busy_seconds)
+
+
+async def loop_lag_probe(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - started - 0.01)
+
+
+async def run_mode(mode: str, handler, async_handler, user_id: int, args) -> dict:
+    stop = asyncio.Event()
+    latencies = {'get_chat_history': [], 'insert_conversation_log': [], 'get_user_by_id': []}
+    lags = []
+    call = make_call(mode, handler, async_handler)
+    tasks = [asyncio.create_task(db_worker(call, user_id, stop, latencies)) for _ in range(args.tasks)]
+    tasks += [asyncio.create_task(executor_noise(stop, args.noise_ms / 1000)) for _ in range(args.noise_tasks)]
+    tasks.append(asyncio.create_task(loop_lag_probe(stop, lags)))
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    total = sum(len(samples) for samples in latencies.values())
+    return {'ops_per_s': total / args.duration, 'lag': summarize_latencies(lags),
+            **{op: summarize_latencies(samples) for op, samples in latencies.items()}}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=32, help='Concurrent database tasks')
+    parser.add_argument('--noise-tasks', type=int, default=16, help='Tasks keeping the default executor busy')
+    parser.add_argument('--noise-ms', type=float, default=20.0, help='Length of each default executor job')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per mode')
+    parser.add_argument('--turns', type=int, default=10, help='Seeded turns per session')
+    args = parser.parse_args()
+
+    random.seed(0)
+    settings.sqlite_db_name = os.path.abspath('bench_async.db')
+    handler = SQLiteHandler()
+    async_handler = AsyncSQLiteHandler(handler)
+    user_id = seed(handler, args.turns)
+
+    print(f"tasks={args.tasks} noise_tasks={args.noise_tasks}x{args.noise_ms:.0f}ms duration={args.duration}s "
+          f"sqlite_threads={settings.sqlite_pool_size}")
+    print(f"{'mode':>10} {'ops/s':>8} {'history p99':>12} {'insert p99':>11} {'user p99':>9} {'loop lag p99':>13}")
+    for mode in ('blocking', 'to_thread', 'async'):
+        result = await run_mode(mode, handler, async_handler, user_id, args)
+        print(f"{mode:>10} {result['ops_per_s']:>8.0f} {result['get_chat_history']['p99_ms']:>10.1f}ms "
+              f"{result['insert_conversation_log']['p99_ms']:>9.1f}ms {result['get_user_by_id']['p99_ms']:>7.1f}ms "
+              f"{result['lag']['p99_ms']:>11.1f}ms")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""Conversation throughput vs. number of concurrent sessions
+
+Drives ConversationService.get_response with a local fake LLM so the numbers
+reflect how well the request path overlaps waiting on the model, not OpenAI.
+
+    python -m benchmarks.bench_conversation_concurrency --latency 0.2 --turns 3
+    python -m benchmarks.bench_conversation_concurrency --blocking   # pre-async path
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from benchmarks.common import use_temp_workspace, summarize_latencies
+
+use_temp_workspace()
+
+from langchain_core.documents import Document  # noqa: E402
+from langchain_core.embeddings import DeterministicFakeEmbedding  # noqa: E402
+from app.services.conversation_service import ConversationService  # noqa: E402
+from app.services.vector_store_service import VectorStoreService  # noqa: E402
+from benchmarks.fakes import FakeChatModel  # noqa: E402
+
+USER_ID = 1
+
+
+def build_service(latency: float) -> ConversationService:
+    vector_store_service = VectorStoreService(embedding_function=DeterministicFakeEmbedding(size=256))
+    corpus = [
+        Document(page_content=f"Section {i}: the refund window for plan {i} is {i + 10} days.",
+                 metadata={'source': 'handbook.pdf', 'page': i})
+        for i in range(50)
+    ]
+    vector_store_service.add_documents(corpus, document_id=str(uuid.uuid4()), user_id=USER_ID)
+    return ConversationService(llm=FakeChatModel(latency=latency), vector_store_service=vector_store_service)
+
+
+async def blocking_turn(service: ConversationService, session_id: str, question: str):
+    """The pre-async request path: every call blocks the event loop"""
+    chat_history = service.db_handler.get_chat_history(session_id, USER_ID)
+    response = service.rag_chain.invoke({"input": question, "chat_history": chat_history,
+                                        "rewrite_history": chat_history, "user_id": USER_ID})
+    service.db_handler.insert_conversation_log(session_id, USER_ID, question, response['answer'], service.model_name)
+
+
+async def run_session(service: ConversationService, turns: int, blocking: bool, latencies: list):
+    session_id = str(uuid.uuid4())
+    for turn in range(turns):
+        question = f"What is the refund window for plan {turn}?"
+        started = time.perf_counter()
+        if blocking:
+            await blocking_turn(service, session_id, question)
+        else:
+            await service.get_response(session_id, question, USER_ID)
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_level(service: ConversationService, sessions: int, turns: int, blocking: bool) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(run_session(service, turns, blocking, latencies) for _ in range(sessions)))
+    elapsed = time.perf_counter() - started
+    return {'sessions': sessions, 'elapsed_s': elapsed, 'turns_per_s': len(latencies) / elapsed,
+            **summarize_latencies(latencies)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.2, help='Fake LLM latency per call in seconds')
+    parser.add_argument('--turns', type=int, default=3, help='Turns per session')
+    parser.add_argument('--levels', type=str, default='1,2,4,8,16,32', help='Comma separated session counts')
+    parser.add_argument('--blocking', action='store_true', help='Use the synchronous pre-async request path')
+    args = parser.parse_args()
+
+    service = build_service(args.latency)
+    mode = 'blocking' if args.blocking else 'async'
+    print(f"mode={mode} llm_latency={args.latency}s turns_per_session={args.turns}")
+    print(f"{'sessions':>8} {'turns/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for level in (int(value) for value in args.levels.split(',')):
+        result = await run_level(service, level, args.turns, args.blocking)
+        print(f"{result['sessions']:>8} {result['turns_per_s']:>9.2f} {result['p50_ms']:>9.1f} "
+              f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
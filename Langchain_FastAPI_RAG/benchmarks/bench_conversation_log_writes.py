@@ -0,0 +1,75 @@
+"""Cost of logging a conversation turn on the response path
+
+Concurrent tasks log turns as fast as the chat endpoint would after each
+answer, first with a synchronous insert and commit per turn and then
+through the write-behind buffer. Reports the latency the caller waits for
+and the turns/s that reach the database.
+
+    python -m benchmarks.bench_conversation_log_writes --tasks 16 --turns 200
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.common import use_temp_workspace, summarize_latencies
+
+use_temp_workspace()
+
+from app.config.settings import settings  # noqa: E402
+from app.database.sqlite_handler import SQLiteHandler  # noqa: E402
+from app.services.conversation_log_writer import ConversationLogWriter  # noqa: E402
+
+ANSWER = "The refund window is 30 days from the date of purchase. " * 10
+
+
+async def log_turns(writer: ConversationLogWriter, user_id: int, task: int, turns: int, latencies: list):
+    for turn in range(turns):
+        started = time.perf_counter()
+        await writer.log(f"session-{task}", user_id, f"question {turn}", ANSWER, "bench")
+        latencies.append(time.perf_counter() - started)
+        # The rest of the request runs before the session's next turn
+        await asyncio.sleep(0.001)
+
+
+async def run_mode(write_behind: bool, handler: SQLiteHandler, user_id: int, args) -> dict:
+    settings.conversation_log_write_behind = write_behind
+    writer = ConversationLogWriter(handler)
+    latencies = []
+
+    started = time.perf_counter()
+    await asyncio.gather(*(log_turns(writer, user_id, task, args.turns, latencies) for task in range(args.tasks)))
+    await writer.close()
+    seconds = time.perf_counter() - started
+
+    return {'turns_per_s': len(latencies) / seconds, 'flushes': writer.get_stats()['flushes'],
+            **summarize_latencies(latencies)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=16, help='Concurrent sessions')
+    parser.add_argument('--turns', type=int, default=200, help='Turns logged per session')
+    parser.add_argument('--synchronous', default='NORMAL', help='SQLite synchronous pragma (FULL fsyncs every commit)')
+    args = parser.parse_args()
+
+    settings.sqlite_db_name = os.path.abspath('bench_log_writes.db')
+    handler = SQLiteHandler()
+    user_id = handler.create_user("bench", "bench@example.com", "not-a-real-hash")
+    # Apply the pragma to every pooled connection
+    conns = [handler._get_connection() for _ in range(settings.sqlite_pool_size)]
+    for conn in conns:
+        conn.execute(f'PRAGMA synchronous = {args.synchronous}')
+        conn.close()
+
+    print(f"tasks={args.tasks} turns={args.turns} synchronous={args.synchronous} "
+          f"flush_interval={settings.conversation_log_flush_interval_ms}ms flush_rows={settings.conversation_log_flush_rows}")
+    print(f"{'mode':>13} {'turns/s':>8} {'flushes':>8} {'log p50':>9} {'log p99':>9} {'log max':>9}")
+    for label, write_behind in (('insert/turn', False), ('write-behind', True)):
+        result = await run_mode(write_behind, handler, user_id, args)
+        print(f"{label:>13} {result['turns_per_s']:>8.0f} {result['flushes']:>8} {result['p50_ms']:>7.2f}ms "
+              f"{result['p99_ms']:>7.2f}ms {result['max_ms']:>7.2f}ms")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""Document list latency by page depth, LIMIT/OFFSET + COUNT(*) vs. keyset cursor + counter
+
+Seeds one user with many documents and times DocumentService.get_document_list
+at increasing depths: reaching page N with an offset, and reaching it by
+following next_cursor (only the request for page N itself is timed).
+The old path also runs the separate COUNT(*) the listing used to issue.
+
+    python -m benchmarks.bench_document_listing --documents 200000 --limit 50
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+from benchmarks.common import use_temp_workspace, summarize_latencies
+
+use_temp_workspace()
+
+from app.config.settings import settings  # noqa: E402
+from app.database.sqlite_handler import SQLiteHandler  # noqa: E402
+from app.services.document_service import DocumentService  # noqa: E402
+
+USER_ID = 1
+
+
+def seed(db_name: str, documents: int):
+    conn = sqlite3.connect(db_name)
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute("INSERT INTO USERS (USERNAME, EMAIL, PASSWORD_HASH) VALUES ('bench', 'bench@example.com', 'x')")
+    conn.executemany(
+        'INSERT INTO DOCUMENTS (DOCUMENT_ID, USER_ID, FILENAME, FILE_TYPE, CHUNK_COUNT, UPLOAD_TIMESTAMP) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        # Many documents share a timestamp, as bulk uploads do
+        ((f"doc-{index}", USER_ID, f"file_{index}.pdf", "pdf", 10,
+          f"2026-01-{index // 86400 % 28 + 1:02d} {index // 3600 % 24:02d}:{index // 60 % 60:02d}:{index // 4 % 60:02d}")
+         for index in range(documents))
+    )
+    conn.commit()
+    conn.close()
+
+
+def legacy_page(handler: SQLiteHandler, limit: int, offset: int):
+    """The listing before keyset pagination: OFFSET scan plus COUNT(*)"""
+    conn = handler._get_connection()
+    try:
+        rows = conn.execute(
+            'SELECT * FROM DOCUMENTS WHERE USER_ID = ? ORDER BY UPLOAD_TIMESTAMP DESC LIMIT ? OFFSET ?',
+            (USER_ID, limit, offset)
+        ).fetchall()
+        conn.execute('SELECT COUNT(*) FROM DOCUMENTS WHERE USER_ID = ?', (USER_ID,)).fetchone()
+        return rows
+    finally:
+        conn.close()
+
+
+def timed(func, repeats: int) -> dict:
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return summarize_latencies(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=200000)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--pages', default='1,10,100,1000,3999', help='Page numbers to measure')
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    settings.sqlite_db_name = os.path.abspath('bench_listing.db')
+    handler = SQLiteHandler()
+    seed(settings.sqlite_db_name, args.documents)
+    service = DocumentService()
+
+    # Collect the cursor of every page once; a client would carry it from the previous response
+    cursors = [None]
+    while True:
+        result = service.get_document_list(USER_ID, args.limit, cursor=cursors[-1])
+        if not result['next_cursor']:
+            break
+        cursors.append(result['next_cursor'])
+
+    print(f"documents={args.documents} limit={args.limit} pages={len(cursors)}")
+    print(f"{'page':>6} {'offset+COUNT p50':>17} {'offset service p50':>19} {'cursor p50':>11}")
+    for page in (int(value) for value in args.pages.split(',')):
+        if page > len(cursors):
+            continue
+        offset = (page - 1) * args.limit
+        legacy = timed(lambda: legacy_page(handler, args.limit, offset), args.repeats)
+        by_offset = timed(lambda: service.get_document_list(USER_ID, args.limit, offset), args.repeats)
+        by_cursor = timed(lambda: service.get_document_list(USER_ID, args.limit, cursor=cursors[page - 1]), args.repeats)
+        print(f"{page:>6} {legacy['p50_ms']:>15.2f}ms {by_offset['p50_ms']:>17.2f}ms {by_cursor['p50_ms']:>9.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""PDF parse + split time vs. number of parse worker processes
+
+Generates a corpus of text PDFs and runs DocumentLoader.aload_and_split_file
+over all of them concurrently, once in a thread (workers=0, the old
+behaviour) and then with process pools of increasing size.
+
+    python -m benchmarks.bench_document_parsing --docs 8 --pages 200
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.common import use_temp_workspace
+
+use_temp_workspace()
+
+from app.config.settings import settings  # noqa: E402
+from app.utils.document_loader import (  # noqa: E402
+    DocumentLoader, count_pdf_pages, get_parse_executor, shutdown_parse_executor
+)
+from benchmarks.pdf_corpus import make_text_pdf  # noqa: E402
+
+
+def write_corpus(docs: int, pages: int):
+    paths = []
+    for index in range(docs):
+        path = os.path.abspath(f"corpus_{index}.pdf")
+        with open(path, 'wb') as pdf_file:
+            pdf_file.write(make_text_pdf(pages, seed=index))
+        paths.append(path)
+    return paths
+
+
+async def parse_corpus(paths):
+    loader = DocumentLoader()
+    results = await asyncio.gather(*(loader.aload_and_split_file(path, os.path.basename(path)) for path in paths))
+    return sum(len(splits) for splits, _ in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=8)
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--pages-per-task', type=int, default=20)
+    parser.add_argument('--levels', type=str, default=None, help='Comma separated worker counts (default: powers of two up to the core count)')
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    levels = [int(value) for value in args.levels.split(',')] if args.levels else \
+        [0] + [2 ** power for power in range(cores.bit_length()) if 2 ** power <= cores]
+    settings.pdf_pages_per_parse_task = args.pages_per_task
+
+    paths = write_corpus(args.docs, args.pages)
+    print(f"docs={args.docs} pages_per_doc={args.pages} pages_per_task={args.pages_per_task} cores={cores}")
+    print(f"{'workers':>8} {'seconds':>9} {'pages/s':>9} {'chunks':>8} {'speedup':>8}")
+
+    timings = []
+    for workers in levels:
+        settings.document_parse_workers = workers
+        shutdown_parse_executor()
+        executor = get_parse_executor()
+        if executor is not None:
+            # Spawn every worker up front so process start-up is not measured
+            list(executor.map(count_pdf_pages, paths[:1] * workers))
+
+        started = time.perf_counter()
+        chunks = asyncio.run(parse_corpus(paths))
+        timings.append((workers, time.perf_counter() - started, chunks))
+
+    # Speedup is relative to a single worker process (or the first run)
+    baseline = next((elapsed for workers, elapsed, _ in timings if workers == 1), timings[0][1])
+    for workers, elapsed, chunks in timings:
+        label = 'thread' if workers == 0 else str(workers)
+        print(f"{label:>8} {elapsed:>9.2f} {args.docs * args.pages / elapsed:>9.1f} {chunks:>8} {baseline / elapsed:>7.2f}x")
+
+    shutdown_parse_executor()
+
+
+if __name__ == '__main__':
+    main()
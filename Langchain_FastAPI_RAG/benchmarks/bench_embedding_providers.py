@@ -0,0 +1,116 @@
+"""Throughput and event-loop impact of the local embedding providers
+
+Embeds a corpus of chunks with each provider, one chunk per call and in
+batches of local_embedding_batch_size, then runs --concurrency query
+embeddings at once from the event loop while a ticker measures how late
+the loop wakes up. The async path is compared with calling embed_query
+straight from a coroutine, which is what blocks the loop.
+
+The local row uses --model-path if given (a sentence-transformers model
+on disk). Without one, a randomly initialised encoder of MiniLM-L6 shape
+is built, which measures CPU cost only.
+
+    python -m benchmarks.bench_embedding_providers --chunks 256 --concurrency 16
+    python -m benchmarks.bench_embedding_providers --model-path ./models/all-MiniLM-L6-v2
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from typing import List
+
+from benchmarks.common import use_temp_workspace, summarize_latencies
+
+use_temp_workspace()
+
+from app.config.settings import settings  # noqa: E402
+from app.services.embedding_providers import HashingEmbeddings, LocalSentenceTransformerEmbeddings  # noqa: E402
+from benchmarks.fakes import build_random_sentence_encoder  # noqa: E402
+
+WORDS = ("invoice payment refund account router firmware warranty battery screen shipping order customer "
+         "password reset update install error code support contract renewal delivery address").split()
+
+
+def corpus(chunks: int, words: int = 120) -> List[str]:
+    rng = random.Random(0)
+    return [' '.join(rng.choice(WORDS) for _ in range(words)) for _ in range(chunks)]
+
+
+async def loop_lag(run, interval: float = 0.005) -> tuple:
+    """Run a coroutine while measuring how late a periodic ticker fires"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await run()
+    elapsed = time.perf_counter() - started
+    done.set()
+    await task
+    return elapsed, max(lags) if lags else elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=256)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--model-path', default='', help='Local sentence-transformers model; a random MiniLM-shaped one otherwise')
+    args = parser.parse_args()
+
+    texts = corpus(args.chunks)
+    model_path = args.model_path or build_random_sentence_encoder(os.path.abspath('random_encoder'), WORDS)
+    providers = [
+        ('hashing', HashingEmbeddings(settings.hashing_embedding_dimensions)),
+        ('local', LocalSentenceTransformerEmbeddings(model_path, batch_size=settings.local_embedding_batch_size,
+                                                     workers=settings.local_embedding_workers)),
+    ]
+
+    print(f"chunks={args.chunks} batch_size={settings.local_embedding_batch_size} "
+          f"concurrency={args.concurrency} model={'given' if args.model_path else 'random MiniLM-L6 shape'}")
+    print(f"{'provider':>8} {'dims':>5} {'per chunk':>12} {'batched':>12} {'query p50':>10} "
+          f"{'blocking lag':>13} {'async lag':>10}")
+    for name, embeddings in providers:
+        embeddings.embed_query(texts[0])  # load the model outside the measurement
+        dimensions = len(embeddings.embed_query(texts[0]))
+
+        started = time.perf_counter()
+        for text in texts:
+            embeddings.embed_documents([text])
+        one_by_one = args.chunks / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        embeddings.embed_documents(texts)
+        batched = args.chunks / (time.perf_counter() - started)
+
+        queries = texts[:args.concurrency]
+        latencies = []
+
+        async def timed_query(text):
+            started = time.perf_counter()
+            await embeddings.aembed_query(text)
+            latencies.append(time.perf_counter() - started)
+
+        async def blocking_queries():
+            for text in queries:
+                embeddings.embed_query(text)
+                await asyncio.sleep(0)
+
+        async def async_queries():
+            await asyncio.gather(*(timed_query(text) for text in queries))
+
+        _, blocking_lag = await loop_lag(blocking_queries)
+        _, async_lag = await loop_lag(async_queries)
+        query = summarize_latencies(latencies)
+        print(f"{name:>8} {dimensions:>5} {one_by_one:>8.0f}/s {batched:>9.0f}/s {query['p50_ms']:>8.1f}ms "
+              f"{blocking_lag * 1000:>11.1f}ms {async_lag * 1000:>8.1f}ms")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""Exact-identifier recall and latency, dense-only vs. hybrid (dense + FTS5 BM25) retrieval
+
+Indexes a parts catalogue whose chunks differ mostly by part number and
+error code, then asks for specific identifiers. The stand-in embedding
+model hashes the alphabetic words of a text only, so like real embedding
+models it barely separates "XJ-2041" from "XJ-2014". It also sleeps for
+--embed-latency per query to stand in for the embeddings API round trip.
+
+Reports hit@k (the chunk with the identifier is among the k results) and
+latency for: dense only, keyword only, both legs one after the other, and
+the HybridRetriever that runs them concurrently.
+
+    python -m benchmarks.bench_hybrid_retrieval --parts 5000 --queries 200
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from typing import List
+
+from benchmarks.common import use_temp_workspace, summarize_latencies
+
+use_temp_workspace()
+
+from langchain_core.documents import Document  # noqa: E402
+
+from app.config.settings import settings  # noqa: E402
+from app.services.hybrid_retriever import reciprocal_rank_fusion  # noqa: E402
+from app.services.vector_store_service import VectorStoreService  # noqa: E402
+from benchmarks.fakes import WordHashEmbeddings  # noqa: E402
+
+USER_ID = 1
+COMPONENTS = ['bracket', 'hinge', 'valve', 'gasket', 'sensor', 'relay', 'pump', 'fan', 'filter', 'spring']
+MATERIALS = ['steel', 'aluminium', 'brass', 'nylon', 'rubber']
+
+
+def catalogue(parts: int) -> List[Document]:
+    rng = random.Random(0)
+    return [
+        Document(
+            page_content=(f"Part XJ-{1000 + index} is a {rng.choice(MATERIALS)} {rng.choice(COMPONENTS)}. "
+                          f"If the controller reports error E{index:05d}, replace part XJ-{1000 + index}."),
+            metadata={'source': 'catalogue.pdf'}
+        )
+        for index in range(parts)
+    ]
+
+
+def questions(parts: int, count: int) -> List[tuple]:
+    rng = random.Random(1)
+    result = []
+    for _ in range(count):
+        index = rng.randrange(parts)
+        if rng.random() < 0.5:
+            result.append((f"What kind of component is part XJ-{1000 + index}?", index))
+        else:
+            result.append((f"The controller shows error E{index:05d}, what should I replace?", index))
+    return result
+
+
+async def run(label: str, search, queries: List[tuple]) -> dict:
+    hits, latencies = 0, []
+    for question, index in queries:
+        started = time.perf_counter()
+        documents = await search(question)
+        latencies.append(time.perf_counter() - started)
+        hits += any(f"XJ-{1000 + index} " in document.page_content for document in documents)
+    return {'label': label, 'hit_rate': hits / len(queries), **summarize_latencies(latencies)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--parts', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--embed-latency', type=float, default=0.03, help='Seconds per query embedding call')
+    args = parser.parse_args()
+
+    settings.embedding_cache_enabled = False
+    settings.hybrid_search_enabled = True
+    service = VectorStoreService(embedding_function=WordHashEmbeddings(latency=args.embed_latency))
+    service.add_documents(catalogue(args.parts), str(uuid.uuid4()), USER_ID)
+
+    k, fetch_k = settings.similarity_search_k, settings.hybrid_fetch_k
+    dense = service.get_user_store(USER_ID).as_retriever(search_kwargs={'k': fetch_k})
+    hybrid = service.get_retriever(USER_ID)
+
+    async def dense_only(question):
+        return (await dense.ainvoke(question))[:k]
+
+    async def keyword_only(question):
+        return await asyncio.to_thread(service.lexical_index.search, question, USER_ID, k)
+
+    async def sequential(question):
+        vector_hits = await dense.ainvoke(question)
+        keyword_hits = await asyncio.to_thread(service.lexical_index.search, question, USER_ID, fetch_k)
+        return reciprocal_rank_fusion([vector_hits, keyword_hits], k, settings.rrf_k)
+
+    queries = questions(args.parts, args.queries)
+    print(f"parts={args.parts} queries={args.queries} k={k} fetch_k={fetch_k} embed_latency={args.embed_latency * 1000:.0f}ms")
+    print(f"{'retrieval':>20} {'hit@k':>6} {'p50':>9} {'p95':>9}")
+    for label, search in (('dense only', dense_only), ('keyword only', keyword_only),
+                          ('hybrid, sequential', sequential), ('hybrid, concurrent', hybrid.ainvoke)):
+        result = await run(label, search, queries)
+        print(f"{result['label']:>20} {result['hit_rate']:>6.0%} {result['p50_ms']:>7.1f}ms {result['p95_ms']:>7.1f}ms")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""Ingestion time of a large document vs. embedding batch concurrency
+
+Embeds and writes N chunks through VectorStoreService against the local fake
+OpenAI embeddings server, first with the single-call add_documents path and
+then with aadd_documents at increasing concurrency.
+
+    python -m benchmarks.bench_ingestion_embedding --chunks 2000 --batch-size 64
+    python -m benchmarks.bench_ingestion_embedding --max-concurrent 4   # exercise 429 backoff
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+from benchmarks.common import use_temp_workspace
+
+use_temp_workspace()
+# Every run must pay for its embeddings
+os.environ['EMBEDDING_CACHE_ENABLED'] = 'false'
+
+from langchain_core.documents import Document  # noqa: E402
+from langchain_openai import OpenAIEmbeddings  # noqa: E402
+from app.config.settings import settings  # noqa: E402
+from app.services.vector_store_service import VectorStoreService  # noqa: E402
+from benchmarks.fake_openai_server import FakeOpenAIServer  # noqa: E402
+
+USER_ID = 1
+
+
+def make_chunks(count: int):
+    return [
+        Document(page_content=f"Chunk {i}: " + "lorem ipsum dolor sit amet " * 30, metadata={'source': 'large.pdf', 'page': i // 4})
+        for i in range(count)
+    ]
+
+
+def make_service(base_url: str, name: str) -> VectorStoreService:
+    embeddings = OpenAIEmbeddings(base_url=base_url, api_key="sk-fake", check_embedding_ctx_length=False)
+    service = VectorStoreService(embedding_function=embeddings)
+    service.collection_name = name
+    return service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--levels', type=str, default='1,2,4,8,16')
+    parser.add_argument('--base-latency', type=float, default=0.1, help='Fake server latency per request (s)')
+    parser.add_argument('--per-item-latency', type=float, default=0.002, help='Fake server latency per input (s)')
+    parser.add_argument('--dimension', type=int, default=1536, help='Embedding dimension returned by the fake server')
+    parser.add_argument('--max-concurrent', type=int, default=0, help='Fake server returns 429 above this many in-flight requests')
+    args = parser.parse_args()
+
+    settings.embedding_batch_size = args.batch_size
+    settings.embedding_backoff_base_seconds = 0.05
+
+    with FakeOpenAIServer(port=8101, base_latency=args.base_latency, per_item_latency=args.per_item_latency,
+                          dimension=args.dimension, max_concurrent=args.max_concurrent) as server:
+        print(f"chunks={args.chunks} batch_size={args.batch_size} dimension={args.dimension} "
+              f"server_latency={args.base_latency}s+{args.per_item_latency}s/item max_concurrent={args.max_concurrent or 'unlimited'}")
+        print(f"{'mode':>22} {'seconds':>9} {'chunks/s':>10} {'429s':>6}")
+
+        service = make_service(server.base_url, 'bench_sequential')
+        rate_limited = server.stats()['rate_limited']
+        started = time.perf_counter()
+        service.add_documents(make_chunks(args.chunks), str(uuid.uuid4()), USER_ID)
+        elapsed = time.perf_counter() - started
+        rate_limited, previous = server.stats()['rate_limited'], rate_limited
+        print(f"{'add_documents (before)':>22} {elapsed:>9.2f} {args.chunks / elapsed:>10.1f} {rate_limited - previous:>6}")
+
+        for level in (int(value) for value in args.levels.split(',')):
+            settings.embedding_concurrency = level
+            service = make_service(server.base_url, f'bench_concurrency_{level}')
+            started = time.perf_counter()
+            ok = asyncio.run(service.aadd_documents(make_chunks(args.chunks), str(uuid.uuid4()), USER_ID))
+            elapsed = time.perf_counter() - started
+            rate_limited, previous = server.stats()['rate_limited'], rate_limited
+            label = f"concurrency={level}" + ("" if ok else " FAILED")
+            print(f"{label:>22} {elapsed:>9.2f} {args.chunks / elapsed:>10.1f} {rate_limited - previous:>6}")
+
+
+if __name__ == '__main__':
+    main()
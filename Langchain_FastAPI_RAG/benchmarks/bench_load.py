@@ -0,0 +1,305 @@
+"""End-to-end load test of the API against local OpenAI stand-ins
+
+Starts the fake OpenAI server (embeddings plus chat completions, with
+configurable latency) and the FastAPI app under uvicorn in a child
+process pointed at it, so requests go through the real HTTP stack, the
+real ChatOpenAI / OpenAIEmbeddings clients and the real stores. Users
+and PDF documents are seeded through the API, then --workers clients
+drive a weighted mix of login, upload, list, conversation and streaming
+conversation for --duration seconds.
+
+Reports count, errors, throughput and p50/p95/p99 latency per endpoint
+(and time to the first streamed token), and writes them with the run's
+configuration and git commit to --output. Pass an earlier result as
+--baseline to print the change per endpoint. Settings of the app can be
+overridden with --app-env NAME=VALUE.
+
+    python -m benchmarks.bench_load --users 8 --docs-per-user 3 --workers 16 --duration 60 --output load.json
+    python -m benchmarks.bench_load --baseline load.json --app-env CONVERSATION_LOG_WRITE_BEHIND=true
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from benchmarks.common import PROJECT_ROOT, use_temp_workspace, summarize_latencies
+
+# Relative --output / --baseline paths are taken from where the benchmark was started
+INVOCATION_DIRECTORY = os.getcwd()
+WORKSPACE = use_temp_workspace()
+
+import httpx  # noqa: E402
+
+from benchmarks.fake_openai_server import FakeOpenAIServer  # noqa: E402
+from benchmarks.pdf_corpus import make_pdf  # noqa: E402
+
+PASSWORD = "password123"
+DEFAULT_MIX = "login=5,upload=5,list=30,conversation=45,stream=15"
+TOPICS = ["refund", "shipping", "warranty", "invoice", "password", "firmware", "battery", "contract"]
+QUESTIONS = [
+    "What is the refund window for damaged items?",
+    "How long does shipping to Canada take?",
+    "Which invoices can be paid by bank transfer?",
+    "How do I reset the router firmware?",
+    "What does the warranty cover for the battery?",
+]
+
+
+class AppServer:
+    """The FastAPI app under uvicorn in a child process, configured through environment variables"""
+
+    def __init__(self, port: int, env: Dict[str, str], log_path: str):
+        self.port = port
+        self.env = env
+        self.log_path = log_path
+        self._process: Optional[subprocess.Popen] = None
+        self._log = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "AppServer":
+        self._log = open(self.log_path, 'w')
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'app.main:app', '--host', '127.0.0.1', '--port', str(self.port),
+             '--log-level', 'warning'],
+            cwd=WORKSPACE, env={**os.environ, 'PYTHONPATH': str(PROJECT_ROOT), **self.env},
+            stdout=self._log, stderr=subprocess.STDOUT
+        )
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"App server exited with {self._process.returncode}, see {self.log_path}")
+            try:
+                if httpx.get(self.base_url + '/').status_code == 200:
+                    return self
+            except httpx.TransportError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"App server did not start, see {self.log_path}")
+
+    def __exit__(self, *exc_info):
+        self._process.terminate()
+        try:
+            self._process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+        self._log.close()
+
+
+def document_pdf(rng: random.Random, pages: int) -> bytes:
+    lines = []
+    for _ in range(pages * 40):
+        topic = rng.choice(TOPICS)
+        lines.append(f"The {topic} policy section {rng.randrange(1000)} applies to order {rng.randrange(10 ** 6)}.")
+    return make_pdf([lines[start:start + 40] for start in range(0, len(lines), 40)])
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class Recorder:
+    """Latency samples and error counts per endpoint, ignoring requests that started during warm-up"""
+
+    def __init__(self, measure_from: float):
+        self.measure_from = measure_from
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, started: float, ok: bool):
+        if started < self.measure_from:
+            return
+        if ok:
+            self.samples.setdefault(endpoint, []).append(time.perf_counter() - started)
+        else:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def add_sample(self, endpoint: str, started: float, seconds: float):
+        if started >= self.measure_from:
+            self.samples.setdefault(endpoint, []).append(seconds)
+
+
+async def seed(client: httpx.AsyncClient, users: int, docs_per_user: int, pages: int) -> List[dict]:
+    """Register, log in and upload documents for every user"""
+    rng = random.Random(0)
+    run_id = uuid.uuid4().hex[:6]
+
+    async def seed_user(index: int) -> dict:
+        username = f"load_{run_id}_{index}"
+        response = await client.post('/api/auth/register', json={
+            'username': username, 'email': f"{username}@example.com", 'password': PASSWORD
+        })
+        response.raise_for_status()
+        response = await client.post('/api/auth/login', json={'username': username, 'password': PASSWORD})
+        response.raise_for_status()
+        user = {'username': username, 'headers': {'Authorization': f"Bearer {response.json()['access_token']}"}}
+        for number in range(docs_per_user):
+            response = await client.post('/api/documents/add', headers=user['headers'], files={
+                'file': (f"seed_{index}_{number}.pdf", document_pdf(rng, pages), 'application/pdf')
+            })
+            response.raise_for_status()
+        return user
+
+    return await asyncio.gather(*(seed_user(index) for index in range(users)))
+
+
+async def worker(client: httpx.AsyncClient, users: List[dict], mix: Dict[str, int], pages: int,
+                 recorder: Recorder, deadline: float, seed_value: int):
+    rng = random.Random(seed_value)
+    operations, weights = list(mix), list(mix.values())
+    session_ids = {user['username']: str(uuid.uuid4()) for user in users}
+    while time.perf_counter() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        user = rng.choice(users)
+        started = time.perf_counter()
+        try:
+            if operation == 'login':
+                response = await client.post('/api/auth/login', json={'username': user['username'], 'password': PASSWORD})
+                recorder.record('login', started, response.status_code == 200)
+            elif operation == 'upload':
+                response = await client.post('/api/documents/add', headers=user['headers'], files={
+                    'file': (f"load_{uuid.uuid4().hex[:8]}.pdf", document_pdf(rng, pages), 'application/pdf')
+                })
+                recorder.record('upload', started, response.status_code == 200)
+            elif operation == 'list':
+                response = await client.post('/api/documents/list', headers=user['headers'], json={'limit': 10})
+                recorder.record('list', started, response.status_code == 200)
+            elif operation == 'conversation':
+                response = await client.post('/api/conversation', headers=user['headers'], json={
+                    'question': rng.choice(QUESTIONS), 'session_id': session_ids[user['username']]
+                })
+                recorder.record('conversation', started, response.status_code == 200)
+            else:
+                first_token, failed = None, False
+                async with client.stream('POST', '/api/conversation/stream', headers=user['headers'], json={
+                    'question': rng.choice(QUESTIONS), 'session_id': session_ids[user['username']]
+                }) as response:
+                    async for line in response.aiter_lines():
+                        if line == 'event: token' and first_token is None:
+                            first_token = time.perf_counter() - started
+                        failed = failed or line == 'event: error'
+                ok = response.status_code == 200 and not failed
+                recorder.record('stream', started, ok)
+                if ok and first_token is not None:
+                    recorder.add_sample('stream_first_token', started, first_token)
+        except httpx.HTTPError:
+            recorder.record(operation, started, False)
+
+
+def compare(results: dict, baseline: dict):
+    print(f"\nvs. baseline {baseline.get('git_commit', '?')} ({baseline.get('timestamp', '?')})")
+    print(f"{'endpoint':>20} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>9}")
+    for endpoint, row in results['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(endpoint)
+        if not before:
+            continue
+
+        def change(key):
+            return f"{(row[key] - before[key]) / before[key]:>+8.0%}" if before[key] else f"{'-':>8}"
+
+        print(f"{endpoint:>20} {change('p50_ms')} {change('p95_ms')} {change('p99_ms')} {change('throughput_rps')}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--docs-per-user', type=int, default=3)
+    parser.add_argument('--pages', type=int, default=2, help='Pages per generated PDF')
+    parser.add_argument('--workers', type=int, default=16, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds of mixed traffic')
+    parser.add_argument('--warmup', type=float, default=5.0, help='Seconds at the start that are not measured')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Relative weights of login, upload, list, conversation, stream')
+    parser.add_argument('--chat-latency', type=float, default=0.5, help='Fake LLM seconds to the first token')
+    parser.add_argument('--token-interval', type=float, default=0.01, help='Fake LLM seconds between streamed words')
+    parser.add_argument('--embed-latency', type=float, default=0.05, help='Fake embeddings seconds per request')
+    parser.add_argument('--embed-per-item-latency', type=float, default=0.001, help='Fake embeddings seconds per input')
+    parser.add_argument('--dimension', type=int, default=1536)
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--port', type=int, default=8200)
+    parser.add_argument('--openai-port', type=int, default=8201)
+    parser.add_argument('--app-env', action='append', default=[], metavar='NAME=VALUE', help='Setting override for the app')
+    parser.add_argument('--output', default='', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', default='', help='Earlier JSON result to compare against')
+    args = parser.parse_args()
+
+    mix = {name: int(weight) for name, weight in (item.split('=') for item in args.mix.split(','))}
+    app_env = dict(item.split('=', 1) for item in args.app_env)
+
+    with FakeOpenAIServer(port=args.openai_port, base_latency=args.embed_latency,
+                          per_item_latency=args.embed_per_item_latency, dimension=args.dimension,
+                          chat_latency=args.chat_latency, token_interval=args.token_interval) as openai_server:
+        env = {
+            'OPENAI_API_KEY': 'sk-fake',
+            'OPENAI_API_BASE': openai_server.base_url,
+            'EMBEDDING_PROVIDER': 'openai',
+            'OPENAI_EMBEDDING_CHECK_CTX_LENGTH': 'false',
+            'LANGCHAIN_TRACING_V2': 'false',
+            'BCRYPT_ROUNDS': str(args.bcrypt_rounds),
+            **app_env,
+        }
+        with AppServer(args.port, env, os.path.join(WORKSPACE, 'app_server.log')) as app_server:
+            limits = httpx.Limits(max_connections=args.workers + args.users)
+            async with httpx.AsyncClient(base_url=app_server.base_url, timeout=300, limits=limits) as client:
+                started = time.perf_counter()
+                users = await seed(client, args.users, args.docs_per_user, args.pages)
+                seed_seconds = time.perf_counter() - started
+                print(f"seeded {args.users} users x {args.docs_per_user} documents in {seed_seconds:.1f}s")
+
+                started = time.perf_counter()
+                recorder = Recorder(started + args.warmup)
+                deadline = started + args.warmup + args.duration
+                await asyncio.gather(*(worker(client, users, mix, args.pages, recorder, deadline, index)
+                                       for index in range(args.workers)))
+                measured = time.perf_counter() - recorder.measure_from
+
+    endpoints = {}
+    for endpoint in [*mix, 'stream_first_token']:
+        samples = recorder.samples.get(endpoint, [])
+        if not samples and not recorder.errors.get(endpoint):
+            continue
+        endpoints[endpoint] = {
+            **summarize_latencies(samples),
+            'errors': recorder.errors.get(endpoint, 0),
+            'throughput_rps': len(samples) / measured,
+        }
+    results = {
+        'benchmark': 'bench_load',
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'config': {**vars(args), 'mix': mix, 'app_env': app_env},
+        'seed_seconds': seed_seconds,
+        'measured_seconds': measured,
+        'endpoints': endpoints,
+    }
+
+    print(f"workers={args.workers} duration={args.duration:.0f}s chat_latency={args.chat_latency * 1000:.0f}ms "
+          f"embed_latency={args.embed_latency * 1000:.0f}ms commit={results['git_commit']}")
+    print(f"{'endpoint':>20} {'count':>6} {'errors':>6} {'req/s':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for endpoint, row in endpoints.items():
+        print(f"{endpoint:>20} {row['count']:>6} {row['errors']:>6} {row['throughput_rps']:>7.2f} "
+              f"{row['p50_ms']:>7.0f}ms {row['p95_ms']:>7.0f}ms {row['p99_ms']:>7.0f}ms")
+
+    if args.output:
+        with open(os.path.join(INVOCATION_DIRECTORY, args.output), 'w') as output:
+            json.dump(results, output, indent=2)
+        print(f"\nresults written to {args.output}")
+    if args.baseline:
+        with open(os.path.join(INVOCATION_DIRECTORY, args.baseline)) as baseline:
+            compare(results, json.load(baseline))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
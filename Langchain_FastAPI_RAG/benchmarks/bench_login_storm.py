@@ -0,0 +1,128 @@
+"""Conversation latency while a burst of logins hits the same process
+
+Drives the FastAPI app in-process (fake LLM and embeddings) with a steady
+stream of /api/conversation requests, first alone and then alongside a
+login storm. The storm runs twice: with bcrypt inline on the event loop
+(the old behaviour) and on the bounded password hasher pool.
+
+    python -m benchmarks.bench_login_storm --logins 40 --rounds 12
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from benchmarks.common import use_temp_workspace, summarize_latencies
+
+use_temp_workspace()
+
+import httpx  # noqa: E402
+from langchain_core.documents import Document  # noqa: E402
+from langchain_core.embeddings import DeterministicFakeEmbedding  # noqa: E402
+
+from app.config.settings import settings  # noqa: E402
+from app.utils.password_hasher import PasswordHasher, get_password_hasher  # noqa: E402
+from benchmarks.fakes import FakeChatModel  # noqa: E402
+
+PASSWORD = "password123"
+
+
+def build_app(llm_latency: float):
+    import app.main as main
+    from app.services.conversation_service import ConversationService
+    from app.services.vector_store_service import VectorStoreService
+
+    vector_store_service = VectorStoreService(embedding_function=DeterministicFakeEmbedding(size=256))
+    main.conversation_service = ConversationService(
+        llm=FakeChatModel(latency=llm_latency), vector_store_service=vector_store_service
+    )
+    return main.app, vector_store_service
+
+
+async def run_inline(self, func, *args):
+    """The pre-pool path: bcrypt runs on the event loop"""
+    return func(*args)
+
+
+async def chat_loop(client, headers, stop: asyncio.Event, latencies: list):
+    session_id = str(uuid.uuid4())
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.post('/api/conversation', headers=headers,
+                                     json={'question': 'What is the refund window?', 'session_id': session_id})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+
+async def login_storm(client, users: list, logins: int) -> dict:
+    async def login(index: int):
+        response = await client.post('/api/auth/login',
+                                     json={'username': users[index % len(users)], 'password': PASSWORD})
+        return response.status_code
+
+    started = time.perf_counter()
+    statuses = await asyncio.gather(*(login(index) for index in range(logins)))
+    return {'seconds': time.perf_counter() - started, 'ok': statuses.count(200), 'busy': statuses.count(503)}
+
+
+async def measure(client, headers, users, chatters: int, logins: int, duration: float) -> dict:
+    stop = asyncio.Event()
+    latencies = []
+    chats = [asyncio.create_task(chat_loop(client, headers, stop, latencies)) for _ in range(chatters)]
+    await asyncio.sleep(0.2)
+    latencies.clear()
+
+    storm = await login_storm(client, users, logins) if logins else None
+    if storm is None:
+        await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*chats)
+    return {'storm': storm, **summarize_latencies(latencies)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=40, help='Concurrent logins in the storm')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost factor')
+    parser.add_argument('--chatters', type=int, default=4, help='Concurrent conversation sessions')
+    parser.add_argument('--llm-latency', type=float, default=0.05)
+    parser.add_argument('--duration', type=float, default=3.0, help='Seconds to measure without a storm')
+    args = parser.parse_args()
+
+    settings.bcrypt_rounds = args.rounds
+    settings.password_hash_max_pending = max(settings.password_hash_max_pending, args.logins)
+    app, vector_store_service = build_app(args.llm_latency)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=600) as client:
+        users = [f"user{index}" for index in range(args.users)]
+        for username in users:
+            await client.post('/api/auth/register',
+                              json={'username': username, 'email': f"{username}@example.com", 'password': PASSWORD})
+        login = await client.post('/api/auth/login', json={'username': users[0], 'password': PASSWORD})
+        headers = {'Authorization': f"Bearer {login.json()['access_token']}"}
+        user_id = login.json()['user_info']['user_id']
+        vector_store_service.add_documents(
+            [Document(page_content="The refund window is 30 days.", metadata={'source': 'handbook.pdf'})],
+            str(uuid.uuid4()), user_id
+        )
+
+        print(f"bcrypt_rounds={args.rounds} logins={args.logins} chatters={args.chatters} "
+              f"hasher_workers={settings.password_hash_workers}")
+        print(f"{'scenario':>16} {'storm s':>8} {'logins ok':>9} {'chat p50':>9} {'chat p95':>9} {'chat p99':>9} {'chat max':>9}")
+
+        scenarios = [('no storm', 0, None), ('storm, inline', args.logins, run_inline), ('storm, pooled', args.logins, None)]
+        original_run = PasswordHasher._run
+        for label, logins, runner in scenarios:
+            PasswordHasher._run = runner or original_run
+            result = await measure(client, headers, users, args.chatters, logins, args.duration)
+            storm = result['storm'] or {'seconds': 0.0, 'ok': 0}
+            print(f"{label:>16} {storm['seconds']:>8.2f} {storm['ok']:>9} {result['p50_ms']:>9.1f} "
+                  f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['max_ms']:>9.1f}")
+        PasswordHasher._run = original_run
+        print(f"hasher stats: {get_password_hasher().stats()}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+"""Precision, prompt size and latency of retrieval with and without a reranking stage
+
+Indexes a support handbook in which every device has near-identical
+chunks for several procedures, then asks how to do one procedure on one
+device. Compares handing the top k chunks straight to the prompt, handing
+all over-fetched candidates to the prompt, and over-fetching then
+reranking down to rerank_top_n. Reports whether the wanted chunk is in
+the context (hit) and ranked first (first), the context size, and
+retrieval and rerank latency separately.
+
+The cross-encoder row uses --model-path if given (a local
+sentence-transformers cross-encoder). Without one, a randomly initialised
+model of MiniLM-L6 shape is built, which measures CPU cost only; its
+precision is meaningless and not shown.
+
+    python -m benchmarks.bench_reranking --devices 300 --queries 200
+    python -m benchmarks.bench_reranking --model-path ./models/ms-marco-MiniLM-L-6-v2
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from typing import List
+
+from benchmarks.common import use_temp_workspace, summarize_latencies
+
+use_temp_workspace()
+
+from langchain_core.documents import Document  # noqa: E402
+
+from app.config.settings import settings  # noqa: E402
+from app.services.reranker import CrossEncoderReranker, TermOverlapReranker  # noqa: E402
+from app.services.vector_store_service import VectorStoreService  # noqa: E402
+from app.utils.tokens import count_tokens  # noqa: E402
+from benchmarks.fakes import WordHashEmbeddings, build_random_cross_encoder  # noqa: E402
+
+USER_ID = 1
+PROCEDURES = {
+    'reset': "To reset the {device} router, hold the rear button for {n} seconds until the light blinks.",
+    'update': "To update the {device} router firmware, open the admin page and upload image version {n}.",
+    'pair': "To pair the {device} router with the app, scan the code on the label within {n} minutes.",
+    'mount': "To mount the {device} router on a wall, use two screws spaced {n} centimetres apart.",
+}
+QUESTIONS = {
+    'reset': "How long do I hold the button to reset my {device} router?",
+    'update': "Which firmware image version should the {device} router be updated to?",
+    'pair': "How many minutes do I have to pair the {device} router with the app?",
+    'mount': "How far apart are the screws when mounting the {device} router on a wall?",
+}
+
+
+def handbook(devices: int) -> List[Document]:
+    rng = random.Random(0)
+    return [
+        Document(page_content=template.format(device=f"model{index}", n=rng.randrange(2, 60)),
+                 metadata={'source': 'handbook.pdf', 'device': f"model{index}", 'procedure': procedure})
+        for index in range(devices) for procedure, template in PROCEDURES.items()
+    ]
+
+
+def is_target(document: Document, device: str, procedure: str) -> bool:
+    return document.metadata.get('device') == device and document.metadata.get('procedure') == procedure
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=300)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--model-path', default='', help='Local cross-encoder; a random MiniLM-shaped one otherwise')
+    args = parser.parse_args()
+
+    settings.embedding_cache_enabled = False
+    service = VectorStoreService(embedding_function=WordHashEmbeddings())
+    documents = handbook(args.devices)
+    service.add_documents(documents, str(uuid.uuid4()), USER_ID)
+
+    model_path = args.model_path or build_random_cross_encoder(
+        os.path.abspath('random_cross_encoder'),
+        [word.strip('.,?') for text in list(PROCEDURES.values()) + list(QUESTIONS.values()) for word in text.split()]
+        + [f"model{index}" for index in range(args.devices)]
+    )
+    rerankers = [TermOverlapReranker(), CrossEncoderReranker(model_path)]
+    for reranker in rerankers:
+        reranker.prepare()
+
+    rng = random.Random(1)
+    queries = [(f"model{rng.randrange(args.devices)}", rng.choice(list(QUESTIONS))) for _ in range(args.queries)]
+    k, fetch_k, top_n = settings.similarity_search_k, settings.rerank_fetch_k, settings.rerank_top_n
+    base = service.get_retriever(USER_ID)
+    wide = service.get_retriever(USER_ID, k=fetch_k)
+
+    rows = {label: {'hits': 0, 'first': 0, 'tokens': 0, 'retrieve': [], 'rerank': []}
+            for label in (f"top {k}", f"all {fetch_k}", *(f"{fetch_k} -> {reranker.name} -> {top_n}" for reranker in rerankers))}
+    for device, procedure in queries:
+        question = QUESTIONS[procedure].format(device=device)
+
+        started = time.perf_counter()
+        chosen = await base.ainvoke(question)
+        rows[f"top {k}"]['retrieve'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        candidates = await wide.ainvoke(question)
+        wide_latency = time.perf_counter() - started
+        rows[f"all {fetch_k}"]['retrieve'].append(wide_latency)
+
+        results = {f"top {k}": chosen, f"all {fetch_k}": candidates}
+        for reranker in rerankers:
+            label = f"{fetch_k} -> {reranker.name} -> {top_n}"
+            started = time.perf_counter()
+            results[label] = reranker.rerank(question, candidates, top_n)
+            rows[label]['rerank'].append(time.perf_counter() - started)
+            rows[label]['retrieve'].append(wide_latency)
+
+        for label, found in results.items():
+            rows[label]['hits'] += any(is_target(document, device, procedure) for document in found)
+            rows[label]['first'] += bool(found) and is_target(found[0], device, procedure)
+            rows[label]['tokens'] += sum(count_tokens(document.page_content) for document in found)
+
+    print(f"chunks={len(documents)} queries={args.queries} model={'given' if args.model_path else 'random MiniLM-L6 shape'}")
+    print(f"{'context':>34} {'hit':>5} {'first':>6} {'prompt tokens':>13} {'retrieve p50':>13} {'rerank p50':>11} {'rerank p95':>11}")
+    for label, row in rows.items():
+        retrieve, rerank = summarize_latencies(row['retrieve']), summarize_latencies(row['rerank'])
+        meaningless = not args.model_path and 'cross_encoder' in label
+        hit = '  n/a' if meaningless else f"{row['hits'] / len(queries):>5.0%}"
+        first = '   n/a' if meaningless else f"{row['first'] / len(queries):>6.0%}"
+        rerank_p50 = f"{rerank['p50_ms']:>9.2f}ms" if row['rerank'] else f"{'-':>11}"
+        rerank_p95 = f"{rerank['p95_ms']:>9.2f}ms" if row['rerank'] else f"{'-':>11}"
+        print(f"{label:>34} {hit} {first} {row['tokens'] / len(queries):>13.0f} {retrieve['p50_ms']:>11.1f}ms {rerank_p50} {rerank_p95}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""SQLiteHandler ops/sec, connection per call vs. pooled WAL connections
+
+Runs get_chat_history and insert_conversation_log against two fresh
+databases: one through the old connect-per-call path with the default
+rollback journal, one through the connection pool. Each is measured from
+a single thread and from several threads at once.
+
+    python -m benchmarks.bench_sqlite_handler --ops 5000 --threads 4
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from benchmarks.common import use_temp_workspace
+
+use_temp_workspace()
+
+from app.config.settings import settings  # noqa: E402
+from app.database.sqlite_handler import SQLiteHandler  # noqa: E402
+
+USER_ID = 1
+
+
+class ConnectPerCallHandler(SQLiteHandler):
+    """The pre-pool handler: a fresh connection for every call"""
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_name)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+
+def make_handler(pooled: bool) -> SQLiteHandler:
+    settings.sqlite_db_name = os.path.abspath(f"bench_{'pooled' if pooled else 'per_call'}.db")
+    if not pooled:
+        # Start from the default rollback journal
+        sqlite3.connect(settings.sqlite_db_name).execute('PRAGMA journal_mode = DELETE').fetchone()
+    return SQLiteHandler() if pooled else ConnectPerCallHandler()
+
+
+def seed(handler: SQLiteHandler, sessions: int, turns: int):
+    conn = sqlite3.connect(handler.db_name)
+    conn.executemany(
+        'INSERT INTO APPLICATION_LOGS (SESSION_ID, USER_ID, USER_QUERY, GPT_RESPONSE, MODEL) VALUES (?, ?, ?, ?, ?)',
+        [(f"session-{session}", USER_ID, f"question {turn}", f"answer {turn} " * 20, "bench")
+         for session in range(sessions) for turn in range(turns)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def read_op(handler: SQLiteHandler, index: int, sessions: int):
+    handler.get_chat_history(f"session-{index % sessions}", USER_ID)
+
+
+def write_op(handler: SQLiteHandler, index: int, sessions: int):
+    handler.insert_conversation_log(str(uuid.uuid4()), USER_ID, "question", "answer " * 20, "bench")
+
+
+def run(handler: SQLiteHandler, op, ops: int, threads: int, sessions: int) -> float:
+    per_thread = ops // threads
+
+    def worker(offset: int):
+        for index in range(offset, offset + per_thread):
+            op(handler, index, sessions)
+
+    workers = [threading.Thread(target=worker, args=(thread * per_thread,)) for thread in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return per_thread * threads / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ops', type=int, default=5000, help='Operations per measurement')
+    parser.add_argument('--threads', type=int, default=4, help='Threads for the concurrent measurement')
+    parser.add_argument('--sessions', type=int, default=1000, help='Seeded sessions')
+    parser.add_argument('--turns', type=int, default=10, help='Seeded turns per session')
+    args = parser.parse_args()
+
+    print(f"ops={args.ops} seeded_rows={args.sessions * args.turns} threads=1,{args.threads}")
+    print(f"{'handler':>10} {'operation':>24} {'threads':>8} {'ops/s':>10}")
+    for pooled in (False, True):
+        handler = make_handler(pooled)
+        seed(handler, args.sessions, args.turns)
+        label = 'pooled' if pooled else 'per-call'
+        for name, op in (('get_chat_history', read_op), ('insert_conversation_log', write_op)):
+            for threads in (1, args.threads):
+                rate = run(handler, op, args.ops, threads, args.sessions)
+                print(f"{label:>10} {name:>24} {threads:>8} {rate:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Query plans and latency of the hot SQLite reads, without and with the migration indexes
+
+Seeds APPLICATION_LOGS and DOCUMENTS, drops the indexes added by the
+schema migrations and records EXPLAIN QUERY PLAN plus latency for
+get_chat_history and get_document_list. It then re-applies the
+migrations (timing the index build) and measures again.
+
+    python -m benchmarks.bench_sqlite_indexes --rows 10000000
+    python -m benchmarks.bench_sqlite_indexes --rows 1000000 --queries 50   # quicker
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+
+from benchmarks.common import use_temp_workspace, summarize_latencies
+
+use_temp_workspace()
+
+from app.config.settings import settings  # noqa: E402
+from app.database.migrations import MIGRATIONS, apply_migrations  # noqa: E402
+from app.database.sqlite_handler import SQLiteHandler  # noqa: E402
+
+TURNS_PER_SESSION = 10
+CHAT_HISTORY_SQL = ('SELECT USER_QUERY, GPT_RESPONSE FROM APPLICATION_LOGS '
+                    'WHERE SESSION_ID = ? AND USER_ID = ? ORDER BY CREATED_AT')
+DOCUMENT_LIST_SQL = 'SELECT * FROM DOCUMENTS WHERE USER_ID = ? ORDER BY UPLOAD_TIMESTAMP DESC LIMIT ? OFFSET ?'
+
+
+def seed(db_name: str, rows: int, users: int, documents: int):
+    conn = sqlite3.connect(db_name)
+    conn.execute('PRAGMA synchronous = OFF')
+
+    def log_rows():
+        for index in range(rows):
+            session = index // TURNS_PER_SESSION
+            yield (f"session-{session}", session % users + 1, f"question {index}", f"answer {index}", "bench",
+                   f"2026-01-01 00:00:{index % 60:02d}")
+
+    started = time.perf_counter()
+    log_iter = log_rows()
+    while True:
+        batch = [row for _, row in zip(range(100000), log_iter)]
+        if not batch:
+            break
+        conn.executemany(
+            'INSERT INTO APPLICATION_LOGS (SESSION_ID, USER_ID, USER_QUERY, GPT_RESPONSE, MODEL, CREATED_AT) '
+            'VALUES (?, ?, ?, ?, ?, ?)', batch
+        )
+        conn.commit()
+
+    conn.executemany(
+        'INSERT INTO DOCUMENTS (DOCUMENT_ID, USER_ID, FILENAME, FILE_TYPE, CHUNK_COUNT) VALUES (?, ?, ?, ?, ?)',
+        ((f"doc-{index}", index % users + 1, f"file_{index}.pdf", "pdf", 10) for index in range(documents))
+    )
+    conn.commit()
+    conn.close()
+    return time.perf_counter() - started
+
+
+def drop_migration_indexes(db_name: str):
+    conn = sqlite3.connect(db_name)
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'IDX_%'").fetchall():
+        if name != 'IDX_DOCUMENTS_USER_CONTENT_HASH':
+            conn.execute(f'DROP INDEX {name}')
+    conn.execute('DELETE FROM SCHEMA_VERSION')
+    conn.commit()
+    conn.close()
+
+
+def query_plan(conn: sqlite3.Connection, sql: str, params: tuple) -> str:
+    return '; '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params))
+
+
+def measure(handler: SQLiteHandler, sessions: int, users: int, queries: int) -> dict:
+    conn = sqlite3.connect(handler.db_name)
+    session = random.randrange(sessions)
+    result = {
+        'chat_history_plan': query_plan(conn, CHAT_HISTORY_SQL, (f"session-{session}", session % users + 1)),
+        'document_list_plan': query_plan(conn, DOCUMENT_LIST_SQL, (1, 10, 0)),
+    }
+    conn.close()
+
+    for name, call in (
+        ('get_chat_history', lambda session: handler.get_chat_history(f"session-{session}", session % users + 1)),
+        ('get_document_list', lambda session: handler.get_document_list(session % users + 1, 10, 0)),
+    ):
+        latencies = []
+        for _ in range(queries):
+            session = random.randrange(sessions)
+            started = time.perf_counter()
+            call(session)
+            latencies.append(time.perf_counter() - started)
+        result[name] = summarize_latencies(latencies)
+    return result
+
+
+def report(label: str, result: dict):
+    print(f"[{label}]")
+    print(f"  chat history plan:  {result['chat_history_plan']}")
+    print(f"  document list plan: {result['document_list_plan']}")
+    for name in ('get_chat_history', 'get_document_list'):
+        stats = result[name]
+        print(f"  {name:>18}: p50 {stats['p50_ms']:.2f} ms  p95 {stats['p95_ms']:.2f} ms  p99 {stats['p99_ms']:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000000, help='APPLICATION_LOGS rows to seed')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--documents', type=int, default=200000, help='DOCUMENTS rows to seed')
+    parser.add_argument('--queries', type=int, default=20, help='Queries per measurement (full scans are slow)')
+    args = parser.parse_args()
+
+    random.seed(0)
+    settings.sqlite_db_name = os.path.abspath('bench_indexes.db')
+    handler = SQLiteHandler()
+    sessions = max(1, args.rows // TURNS_PER_SESSION)
+
+    drop_migration_indexes(handler.db_name)
+    seconds = seed(handler.db_name, args.rows, args.users, args.documents)
+    print(f"seeded {args.rows} log rows and {args.documents} documents for {args.users} users in {seconds:.1f}s")
+
+    report('without indexes', measure(handler, sessions, args.users, args.queries))
+
+    conn = sqlite3.connect(handler.db_name)
+    started = time.perf_counter()
+    version = apply_migrations(conn)
+    conn.close()
+    print(f"applied {len(MIGRATIONS)} migrations (schema version {version}) in {time.perf_counter() - started:.1f}s")
+
+    report('with migration indexes', measure(handler, sessions, args.users, args.queries))
+
+
+if __name__ == '__main__':
+    main()
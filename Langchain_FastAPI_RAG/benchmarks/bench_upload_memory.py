@@ -0,0 +1,73 @@
+"""Peak Python heap while saving an upload, whole-file read vs. streamed copy
+
+Wraps on-disk files of increasing size in starlette UploadFiles (as the
+multipart parser hands them to the endpoints) and measures the tracemalloc
+peak of reading the whole body at once against DocumentLoader.save_temp_file.
+
+    python -m benchmarks.bench_upload_memory --sizes-mb 10,50,200
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+import tracemalloc
+
+from benchmarks.common import use_temp_workspace
+
+use_temp_workspace()
+
+from starlette.datastructures import UploadFile  # noqa: E402
+
+from app.config.settings import settings  # noqa: E402
+from app.utils.document_loader import DocumentLoader  # noqa: E402
+
+
+def write_payload(size_mb: int) -> str:
+    path = os.path.abspath(f"payload_{size_mb}.pdf")
+    block = os.urandom(1024 * 1024)
+    with open(path, 'wb') as payload:
+        for _ in range(size_mb):
+            payload.write(block)
+    return path
+
+
+async def read_whole(upload: UploadFile):
+    # What save_temp_file used to do
+    content = await upload.read()
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
+        temp_file.write(content)
+    return temp_file.name, hashlib.sha256(content).hexdigest()
+
+
+async def measure(path: str, save) -> float:
+    with open(path, 'rb') as source:
+        upload = UploadFile(file=source, filename=os.path.basename(path))
+        tracemalloc.start()
+        saved_path, _ = await save(upload)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    os.unlink(saved_path)
+    return peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes-mb', type=str, default='10,50,200')
+    args = parser.parse_args()
+
+    settings.max_upload_size_bytes = 0
+    loader = DocumentLoader()
+    print(f"chunk_size={settings.upload_chunk_size_bytes // 1024} KiB")
+    print(f"{'size MB':>8} {'whole read peak MB':>19} {'streamed peak MB':>17}")
+
+    for size_mb in [int(value) for value in args.sizes_mb.split(',')]:
+        path = write_payload(size_mb)
+        whole = asyncio.run(measure(path, read_whole))
+        streamed = asyncio.run(measure(path, loader.save_temp_file))
+        os.unlink(path)
+        print(f"{size_mb:>8} {whole:>19.1f} {streamed:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
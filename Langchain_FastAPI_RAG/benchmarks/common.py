@@ -0,0 +1,50 @@
+import logging
+import os
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def use_temp_workspace(prefix: str = "rag_bench_") -> str:
+    """Run the benchmark from a scratch directory
+
+    Settings use relative paths (rag_app.db, ./chroma_db, logs/), so changing
+    the working directory before importing the app keeps benchmark data away
+    from the real stores. Must be called before any `app` import.
+    """
+    if str(PROJECT_ROOT) not in sys.path:
+        sys.path.insert(0, str(PROJECT_ROOT))
+
+    workspace = tempfile.mkdtemp(prefix=prefix)
+    os.chdir(workspace)
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("LANGCHAIN_TRACING_V2", "false")
+
+    # Per-request INFO logs would dominate the measurements
+    logging.disable(logging.INFO)
+    return workspace
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize_latencies(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    return {
+        'count': len(samples),
+        'mean_ms': statistics.mean(samples) * 1000 if samples else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000 if samples else 0.0,
+    }
@@ -0,0 +1,191 @@
+"""Local stand-in for the OpenAI embeddings and chat completions APIs
+
+Serves `POST /v1/embeddings` with deterministic vectors after a simulated
+delay of `base_latency + per_item_latency * len(input)`. When more than
+`max_concurrent` embedding requests are in flight, the extra ones get a 429
+so client backoff can be exercised.
+
+`POST /v1/chat/completions` answers with a canned text after
+`chat_latency`; with `stream: true` the answer is sent as server-sent
+events, one word every `token_interval` after the first.
+
+    python -m benchmarks.fake_openai_server --port 8100 --base-latency 0.1 --chat-latency 0.5
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import multiprocessing
+import time
+from array import array
+from typing import List
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CHAT_RESPONSE = ("Based on the provided documents, the refund window is thirty days from delivery "
+                 "and the request has to include the order number.")
+
+
+def fake_embedding(text: str, dimension: int) -> List[float]:
+    """Deterministic pseudo-random unit-ish vector derived from the text"""
+    seed = hashlib.sha256(text.encode('utf-8')).digest()
+    values = array('B', (seed * (dimension // len(seed) + 1))[:dimension])
+    return [(value - 127.5) / 127.5 for value in values]
+
+
+def create_app(base_latency: float = 0.1, per_item_latency: float = 0.001,
+               dimension: int = 1536, max_concurrent: int = 0,
+               chat_latency: float = 0.5, token_interval: float = 0.01) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    app.state.in_flight = 0
+    app.state.requests = 0
+    app.state.rate_limited = 0
+    app.state.chat_requests = 0
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+        app.state.requests += 1
+
+        if max_concurrent and app.state.in_flight >= max_concurrent:
+            app.state.rate_limited += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after-ms": "50"},
+                content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+            )
+
+        app.state.in_flight += 1
+        try:
+            await asyncio.sleep(base_latency + per_item_latency * len(inputs))
+        finally:
+            app.state.in_flight -= 1
+
+        dims = body.get('dimensions') or dimension
+        as_base64 = body.get('encoding_format') == 'base64'
+        data = []
+        for index, text in enumerate(inputs):
+            vector = fake_embedding(str(text), dims)
+            if as_base64:
+                vector = base64.b64encode(array('f', vector).tobytes()).decode('ascii')
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+
+        # Pre-serialized: FastAPI's encoder is far slower than the simulated latency
+        return Response(content=json.dumps({
+            "object": "list",
+            "model": body.get('model', 'text-embedding-ada-002'),
+            "data": data,
+            "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)}
+        }), media_type="application/json")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.chat_requests += 1
+        model = body.get('model', 'gpt-4o-mini')
+        completion_id = f"chatcmpl-{app.state.chat_requests}"
+        words = CHAT_RESPONSE.split(' ')
+        usage = {"prompt_tokens": sum(len(str(message.get('content', ''))) // 4 for message in body['messages']),
+                 "completion_tokens": len(words)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not body.get('stream'):
+            await asyncio.sleep(chat_latency)
+            return Response(content=json.dumps({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": CHAT_RESPONSE},
+                             "finish_reason": "stop"}],
+                "usage": usage
+            }), media_type="application/json")
+
+        def event(delta: dict, finish_reason=None) -> str:
+            return "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }) + "\n\n"
+
+        async def stream():
+            await asyncio.sleep(chat_latency)
+            for index, word in enumerate(words):
+                if index:
+                    await asyncio.sleep(token_interval)
+                yield event({"role": "assistant", "content": word} if index == 0 else {"content": f" {word}"})
+            yield event({}, "stop")
+            if (body.get('stream_options') or {}).get('include_usage'):
+                yield "data: " + json.dumps({"id": completion_id, "object": "chat.completion.chunk",
+                                             "created": int(time.time()), "model": model,
+                                             "choices": [], "usage": usage}) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests, "rate_limited": app.state.rate_limited,
+                "chat_requests": app.state.chat_requests}
+
+    return app
+
+
+def _serve(port: int, app_options: dict):
+    uvicorn.run(create_app(**app_options), host="127.0.0.1", port=port, log_level="warning")
+
+
+class FakeOpenAIServer:
+    """Runs the fake API with uvicorn in a child process
+
+    A separate process keeps the server's JSON work off the benchmark's GIL,
+    like a real remote API.
+    """
+
+    def __init__(self, port: int = 8100, **app_options):
+        self.port = port
+        self._process = multiprocessing.Process(target=_serve, args=(port, app_options), daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def stats(self) -> dict:
+        return httpx.get(f"http://127.0.0.1:{self.port}/stats").json()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        self._process.start()
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                self.stats()
+                return self
+            except httpx.TransportError:
+                time.sleep(0.1)
+        raise RuntimeError("Fake OpenAI server did not start")
+
+    def __exit__(self, *exc_info):
+        self._process.terminate()
+        self._process.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--base-latency', type=float, default=0.1)
+    parser.add_argument('--per-item-latency', type=float, default=0.001)
+    parser.add_argument('--dimension', type=int, default=1536)
+    parser.add_argument('--max-concurrent', type=int, default=0, help='Return 429 above this many in-flight requests (0 = unlimited)')
+    parser.add_argument('--chat-latency', type=float, default=0.5, help='Seconds before the first answer token')
+    parser.add_argument('--token-interval', type=float, default=0.01, help='Seconds between streamed words')
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.base_latency, args.per_item_latency, args.dimension, args.max_concurrent,
+                           args.chat_latency, args.token_interval),
+                host="127.0.0.1", port=args.port)
@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import math
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeChatModel(BaseChatModel):
+    """Local stand-in for ChatOpenAI that answers after a fixed delay
+
+    The sync path sleeps the calling thread and the async path sleeps the
+    event loop, mirroring how a blocking vs awaited OpenAI call behaves.
+    Streaming waits `latency` for the first token and `token_interval`
+    between the following ones.
+    """
+
+    latency: float = 0.2
+    token_interval: float = 0.01
+    response: str = "This is a canned answer from the fake chat model."
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for index, token in enumerate(self._tokens()):
+            if index:
+                time.sleep(self.token_interval)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for index, token in enumerate(self._tokens()):
+            if index:
+                await asyncio.sleep(self.token_interval)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def _tokens(self) -> List[str]:
+        words = self.response.split(' ')
+        return [word if index == 0 else f" {word}" for index, word in enumerate(words)]
+
+
+class WordHashEmbeddings(Embeddings):
+    """Bag of alphabetic words hashed into a fixed number of dimensions"""
+
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for word in re.findall(r"[a-z]+", text.lower()):
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.size] += 1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._embed(text)
+
+
+def build_random_cross_encoder(path: str, words: List[str], layers: int = 6, hidden: int = 384) -> str:
+    """Save a randomly initialised BERT cross-encoder to a local directory
+
+    Shaped like the MiniLM-L6 rerankers by default, so it costs as much CPU
+    per pair as a real one; its scores carry no meaning.
+    """
+    import os
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    os.makedirs(path, exist_ok=True)
+    vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + sorted(set(word.lower() for word in words))
+    with open(os.path.join(path, 'vocab.txt'), 'w') as vocab_file:
+        vocab_file.write('\n'.join(vocab) + '\n')
+
+    config = BertConfig(vocab_size=len(vocab), hidden_size=hidden, num_hidden_layers=layers,
+                        num_attention_heads=max(1, hidden // 64), intermediate_size=hidden * 4, num_labels=1)
+    BertForSequenceClassification(config).save_pretrained(path)
+    BertTokenizerFast(vocab_file=os.path.join(path, 'vocab.txt')).save_pretrained(path)
+    return path
+
+
+def build_random_sentence_encoder(path: str, words: List[str], layers: int = 6, hidden: int = 384) -> str:
+    """Save a randomly initialised BERT encoder that sentence-transformers loads with mean pooling
+
+    MiniLM-L6 shaped by default, like the common local embedding models;
+    its vectors carry no meaning.
+    """
+    import os
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    os.makedirs(path, exist_ok=True)
+    vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + sorted(set(word.lower() for word in words))
+    with open(os.path.join(path, 'vocab.txt'), 'w') as vocab_file:
+        vocab_file.write('\n'.join(vocab) + '\n')
+
+    config = BertConfig(vocab_size=len(vocab), hidden_size=hidden, num_hidden_layers=layers,
+                        num_attention_heads=max(1, hidden // 64), intermediate_size=hidden * 4)
+    BertModel(config).save_pretrained(path)
+    BertTokenizerFast(vocab_file=os.path.join(path, 'vocab.txt')).save_pretrained(path)
+    return path
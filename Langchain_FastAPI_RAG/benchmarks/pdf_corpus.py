@@ -0,0 +1,49 @@
+"""Minimal text-only PDF writer for generating benchmark corpora"""
+from typing import List
+
+
+def _escape(line: str) -> bytes:
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)').encode('latin-1', 'replace')
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """Build a PDF with one Helvetica text block per page"""
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(b"")  # filled in once the page ids are known
+    page_ids = []
+    for lines in pages:
+        stream = b"BT /F1 9 Tf 40 800 Td 11 TL " + b" ".join(b"(" + _escape(line) + b") '" for line in lines) + b" ET"
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font_id, content_id)
+        ))
+    objects[pages_id - 1] = (b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+                             + b"] /Count %d >>" % len(page_ids))
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_offset)
+    return output
+
+
+def make_text_pdf(page_count: int, lines_per_page: int = 60, seed: int = 0) -> bytes:
+    """PDF of `page_count` pages filled with numbered policy-style sentences"""
+    return make_pdf([
+        [f"Doc {seed} page {page} line {line}: the refund window for part RX-{page * 100 + line} is {line % 30 + 1} days."
+         for line in range(lines_per_page)]
+        for page in range(page_count)
+    ])
@@ -0,0 +1,234 @@
+import asyncio
+import sqlite3
+import pytest
+from app.config.settings import settings
+from app.database.async_sqlite_handler import AsyncSQLiteHandler
+from app.database.sqlite_handler import SQLiteHandler, close_connection_pools
+
+
+class AsyncCaller:
+    """Calls AsyncSQLiteHandler methods like their blocking counterparts"""
+
+    def __init__(self, db_handler: SQLiteHandler):
+        self.async_db_handler = AsyncSQLiteHandler(db_handler)
+
+    def __getattr__(self, name):
+        method = getattr(self.async_db_handler, name)
+        return lambda *args, **kwargs: asyncio.run(method(*args, **kwargs))
+
+
+@pytest.fixture(params=['sync', 'async'])
+def db(request, tmp_path, monkeypatch):
+    """A handler on a fresh database, once as SQLiteHandler and once as AsyncSQLiteHandler"""
+    monkeypatch.setattr(settings, 'sqlite_db_name', str(tmp_path / 'test.db'))
+    db_handler = SQLiteHandler()
+    yield db_handler if request.param == 'sync' else AsyncCaller(db_handler)
+    close_connection_pools()
+
+
+@pytest.fixture
+def user_id(db):
+    return db.create_user('alice', 'alice@example.com', 'hash')
+
+
+def test_async_handler_covers_every_method():
+    public = {name for name in vars(SQLiteHandler) if not name.startswith('_')}
+    assert public - set(vars(AsyncSQLiteHandler)) == set()
+
+
+def test_pool_timeout_is_reported_as_failure(db, user_id, monkeypatch):
+    db_handler = db if isinstance(db, SQLiteHandler) else db.async_db_handler.db_handler
+
+    def timed_out():
+        raise sqlite3.OperationalError("Timed out waiting for a connection")
+
+    monkeypatch.setattr(db_handler, '_get_connection', timed_out)
+    assert not db.insert_conversation_log('s1', user_id, 'q', 'a', 'model')
+    assert db.get_user_by_id(user_id) is None
+    assert db.get_chat_history('s1', user_id) == []
+
+
+# User management methods
+def test_create_and_get_user(db):
+    user_id = db.create_user('alice', 'alice@example.com', 'hash')
+
+    assert user_id is not None
+    assert db.get_user_by_username('alice')['ID'] == user_id
+    assert db.get_user_by_email('alice@example.com')['USERNAME'] == 'alice'
+    assert db.get_user_by_id(user_id)['EMAIL'] == 'alice@example.com'
+    assert db.get_user_by_username('bob') is None
+
+
+def test_create_user_rejects_duplicates(db, user_id):
+    assert db.create_user('alice', 'other@example.com', 'hash') is None
+    assert db.create_user('other', 'alice@example.com', 'hash') is None
+
+
+def test_update_user_password(db, user_id):
+    assert db.update_user_password(user_id, 'new-hash')
+    assert db.get_user_by_id(user_id)['PASSWORD_HASH'] == 'new-hash'
+    assert not db.update_user_password(user_id + 1, 'new-hash')
+
+
+def test_set_user_active(db, user_id):
+    # Inactive users are not returned by ID
+    assert db.set_user_active(user_id, False)
+    assert db.get_user_by_id(user_id) is None
+    assert db.set_user_active(user_id, True)
+    assert db.get_user_by_id(user_id)['IS_ACTIVE']
+    assert not db.set_user_active(user_id + 1, False)
+
+
+def test_reset_tokens(db, user_id):
+    assert db.store_reset_token(user_id, 'first')
+    assert db.verify_reset_token(user_id, 'first')
+    assert not db.verify_reset_token(user_id, 'other')
+
+    # A new token replaces the previous one
+    assert db.store_reset_token(user_id, 'second')
+    assert not db.verify_reset_token(user_id, 'first')
+
+    assert db.delete_reset_token(user_id, 'second')
+    assert not db.verify_reset_token(user_id, 'second')
+
+
+# Conversation log methods
+def test_chat_history_is_scoped_to_session_and_user(db, user_id):
+    other_user_id = db.create_user('bob', 'bob@example.com', 'hash')
+    assert db.insert_conversation_log('s1', user_id, 'q1', 'a1', 'model')
+    assert db.insert_conversation_log('s1', user_id, 'q2', 'a2', 'model')
+    db.insert_conversation_log('s2', user_id, 'other session', 'a', 'model')
+    db.insert_conversation_log('s1', other_user_id, 'other user', 'a', 'model')
+
+    assert db.get_chat_history('s1', user_id) == [
+        {'role': 'human', 'content': 'q1'}, {'role': 'ai', 'content': 'a1'},
+        {'role': 'human', 'content': 'q2'}, {'role': 'ai', 'content': 'a2'}
+    ]
+
+
+def test_insert_conversation_logs(db, user_id):
+    logs = [
+        {'session_id': 's1', 'user_id': user_id, 'user_query': f'q{index}', 'gpt_response': f'a{index}',
+         'model': 'model', 'token_count': 10, 'created_at': f'2026-01-01 00:00:0{index}'}
+        for index in range(3)
+    ]
+    assert db.insert_conversation_logs(logs)
+    assert [message['content'] for message in db.get_chat_history('s1', user_id)][::2] == ['q0', 'q1', 'q2']
+
+
+def test_chat_history_windows(db, user_id):
+    for index in range(5):
+        db.insert_conversation_log('s1', user_id, f'q{index}', 'a' * 40, 'model')
+
+    def questions(**kwargs):
+        return [message['content'] for message in db.get_chat_history('s1', user_id, **kwargs)][::2]
+
+    assert questions(max_turns=2) == ['q3', 'q4']
+    assert questions(token_budget=1) == []
+    assert len(questions(token_budget=10_000, max_turns=3)) == 3
+    assert len(questions(token_budget=10_000)) == 5
+
+    first_id = db.get_turns_to_summarize('s1', user_id, 0, 4)[0]['ID']
+    assert questions(max_turns=10, after_id=first_id) == ['q1', 'q2', 'q3', 'q4']
+
+
+# Session summary methods
+def test_session_summaries(db, user_id):
+    for index in range(4):
+        db.insert_conversation_log('s1', user_id, f'q{index}', f'a{index}', 'model')
+
+    turns = db.get_turns_to_summarize('s1', user_id, 0, 1)
+    assert [turn['USER_QUERY'] for turn in turns] == ['q0', 'q1', 'q2']
+    assert db.get_session_summary('s1', user_id) is None
+
+    through_id = turns[-1]['ID']
+    assert db.save_session_summary('s1', user_id, 'summary', through_id, 0)
+    assert db.get_session_summary('s1', user_id)['SUMMARIZED_THROUGH_ID'] == through_id
+    assert db.get_turns_to_summarize('s1', user_id, through_id, 1) == []
+
+    # A concurrent update based on the old state loses
+    assert not db.save_session_summary('s1', user_id, 'stale', through_id, 0)
+    assert not db.save_session_summary('s1', user_id, 'stale', through_id + 1, through_id - 1)
+    assert db.save_session_summary('s1', user_id, 'newer', through_id + 1, through_id)
+    assert db.get_session_summary('s1', user_id)['SUMMARY'] == 'newer'
+
+
+# Document metadata methods
+def test_document_metadata(db, user_id):
+    assert db.insert_document_metadata('d1', user_id, 'a.pdf', 'pdf', 3, content_hash='h1')
+    assert not db.insert_document_metadata('d1', user_id, 'a.pdf', 'pdf', 3, content_hash='h1')
+
+    assert db.get_document_metadata('d1', user_id)['FILENAME'] == 'a.pdf'
+    assert db.get_document_metadata('d1', user_id + 1) is None
+    assert db.get_document_by_hash(user_id, 'h1')['DOCUMENT_ID'] == 'd1'
+    assert db.get_document_by_hash(user_id, 'h2') is None
+    assert db.get_document_owners() == {'d1': user_id}
+
+
+def test_document_list_and_pages(db, user_id):
+    other_user_id = db.create_user('bob', 'bob@example.com', 'hash')
+    for index in range(5):
+        db.insert_document_metadata(f'd{index}', user_id, f'{index}.pdf', 'pdf', 1)
+    db.insert_document_metadata('other', other_user_id, 'other.pdf', 'pdf', 1)
+
+    assert len(db.get_document_list(user_id, limit=3)) == 3
+    assert db.get_total_document_count(user_id) == 5
+
+    first_page, total_count = db.get_document_page(user_id, 2)
+    assert total_count == 5
+    assert [doc['DOCUMENT_ID'] for doc in first_page] == ['d4', 'd3']
+
+    last = first_page[-1]
+    next_page, _ = db.get_document_page(user_id, 2, after=(last['UPLOAD_TIMESTAMP'], last['ID']))
+    assert [doc['DOCUMENT_ID'] for doc in next_page] == ['d2', 'd1']
+
+    past_end, total_count = db.get_document_page(user_id, 2, offset=10)
+    assert past_end == [] and total_count == 5
+
+
+def test_delete_document_metadata(db, user_id):
+    db.insert_document_metadata('d1', user_id, 'a.pdf', 'pdf', 3)
+
+    assert not db.delete_document_metadata('d1', user_id + 1)
+    assert db.delete_document_metadata('d1', user_id)
+    assert db.get_document_metadata('d1', user_id) is None
+    assert db.get_total_document_count(user_id) == 0
+    assert not db.delete_document_metadata('d1', user_id)
+
+
+# Ingestion job methods
+def test_ingestion_jobs(db, user_id):
+    assert db.create_ingestion_job('j1', user_id, 'a.pdf', '/tmp/a.pdf', 'h1', document_id='d1')
+    assert db.create_ingestion_job('j2', user_id, 'b.pdf', '/tmp/b.pdf', 'h2', status='completed')
+
+    job = db.get_ingestion_job('j1', user_id)
+    assert (job['STATUS'], job['DOCUMENT_ID']) == ('queued', 'd1')
+    assert db.get_ingestion_job('j1', user_id + 1) is None
+    assert db.get_ingestion_job('j1')['JOB_ID'] == 'j1'
+
+    assert db.update_ingestion_job('j1', status='running', pages_parsed=2, chunks_written=5)
+    job = db.get_ingestion_job('j1')
+    assert (job['STATUS'], job['PAGES_PARSED'], job['CHUNKS_WRITTEN']) == ('running', 2, 5)
+    assert not db.update_ingestion_job('j1', unknown=1)
+
+    assert [job['JOB_ID'] for job in db.get_unfinished_ingestion_jobs()] == ['j1']
+
+
+def test_ingestion_job_claims(db, user_id):
+    db.create_ingestion_job('j1', user_id, 'a.pdf', '/tmp/a.pdf', 'h1', document_id='d1')
+
+    # Only one worker wins the claim
+    assert db.claim_ingestion_job('j1') == 1
+    assert db.claim_ingestion_job('j1') is None
+    assert db.heartbeat_ingestion_job('j1', 1)
+
+    # A live lease is not requeued
+    assert db.requeue_stale_ingestion_jobs(60) == 0
+    assert db.release_ingestion_job('j1', 1)
+    assert not db.heartbeat_ingestion_job('j1', 1)
+
+    # The next claim is a retry of an interrupted attempt
+    assert db.claim_ingestion_job('j1') == 2
+    assert not db.release_ingestion_job('j1', 1)
+    assert db.requeue_stale_ingestion_jobs(-60) == 1
+    assert db.get_ingestion_job('j1')['STATUS'] == 'queued'